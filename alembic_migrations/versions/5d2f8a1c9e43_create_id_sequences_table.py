@@ -0,0 +1,33 @@
+"""create id_sequences table
+
+Revision ID: 5d2f8a1c9e43
+Revises: 469139943c7f
+Create Date: 2026-10-18 11:20:41.318207
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d2f8a1c9e43"
+down_revision: str | Sequence[str] | None = "469139943c7f"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "id_sequences",
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("next_hi", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("id_sequences")
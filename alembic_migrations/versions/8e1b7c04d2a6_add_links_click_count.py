@@ -0,0 +1,30 @@
+"""add links.click_count
+
+Revision ID: 8e1b7c04d2a6
+Revises: 5d2f8a1c9e43
+Create Date: 2026-10-18 14:02:17.540913
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8e1b7c04d2a6"
+down_revision: str | Sequence[str] | None = "5d2f8a1c9e43"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("links") as batch_op:
+        batch_op.add_column(sa.Column("click_count", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("links") as batch_op:
+        batch_op.drop_column("click_count")
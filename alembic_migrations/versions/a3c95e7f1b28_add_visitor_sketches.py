@@ -0,0 +1,39 @@
+"""add visitor sketches
+
+Revision ID: a3c95e7f1b28
+Revises: 8e1b7c04d2a6
+Create Date: 2026-10-18 15:37:52.104466
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c95e7f1b28"
+down_revision: str | Sequence[str] | None = "8e1b7c04d2a6"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("links") as batch_op:
+        batch_op.add_column(sa.Column("visitors_hll", sa.LargeBinary(), nullable=True))
+    op.create_table(
+        "link_visitor_days",
+        sa.Column("link_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("sketch", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["link_id"], ["links.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("link_id", "day"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("link_visitor_days")
+    with op.batch_alter_table("links") as batch_op:
+        batch_op.drop_column("visitors_hll")
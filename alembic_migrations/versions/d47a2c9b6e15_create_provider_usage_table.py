@@ -0,0 +1,35 @@
+"""create provider_usage table
+
+Revision ID: d47a2c9b6e15
+Revises: a3c95e7f1b28
+Create Date: 2026-10-18 16:12:08.531907
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d47a2c9b6e15"
+down_revision: str | Sequence[str] | None = "a3c95e7f1b28"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "provider_usage",
+        sa.Column("provider", sa.String(length=64), nullable=False),
+        sa.Column("period", sa.String(length=8), nullable=False),
+        sa.Column("bucket", sa.String(length=16), nullable=False),
+        sa.Column("calls", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("provider", "period", "bucket"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("provider_usage")
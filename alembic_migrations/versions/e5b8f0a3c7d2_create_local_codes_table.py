@@ -0,0 +1,33 @@
+"""create local_codes table
+
+Revision ID: e5b8f0a3c7d2
+Revises: d47a2c9b6e15
+Create Date: 2026-10-18 19:40:52.117304
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b8f0a3c7d2"
+down_revision: str | Sequence[str] | None = "d47a2c9b6e15"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "local_codes",
+        sa.Column("base_url", sa.String(length=512), nullable=False),
+        sa.Column("code", sa.String(length=32), nullable=False),
+        sa.PrimaryKeyConstraint("base_url", "code"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("local_codes")
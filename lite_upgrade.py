@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import inspect
 import os
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from concurrent.futures import TimeoutError as _TimeoutError
 from types import SimpleNamespace
@@ -11,6 +12,14 @@ import pyshorteners
 
 import urlcutter.patches.fix_alembic_version  # noqa: F401
 from urlcutter import shorten_via_tinyurl_core as _shorten_core
+from urlcutter.connectivity import (
+    CONNECTIVITY_PROBE_URL,
+    CONNECTIVITY_TIMEOUT,
+    get_connectivity_monitor,
+)
+from urlcutter.hedging import get_hedger
+from urlcutter.http_client import get_client
+from urlcutter.latency import get_adaptive_timeouts
 from urlcutter.logging_utils import setup_logging
 from urlcutter.normalization import _url_fingerprint, normalize_url
 from urlcutter.protection import (
@@ -21,15 +30,19 @@ from urlcutter.protection import (
     CLIENT_RPM_LIMIT,
     RATE_LIMIT_WINDOW_SEC,
     AppState,
+    ProtectionEngine,
     _get_state,
     _reset_state,
     circuit_blocked,
     cooldown_left,
+    get_protection_engine,
     rate_limit_allow,
     record_failure,
     record_success,
 )
 from urlcutter.protection import internet_ok as _internet_ok_core
+from urlcutter.quota import get_quota_ledger
+from urlcutter.shorteners import get_result_cache
 
 # Публичные атрибуты для тестов:
 FutTimeout = _TimeoutError
@@ -54,6 +67,8 @@ __all__ = [
     "CIRCUIT_FAIL_THRESHOLD",
     "CLIENT_RPM_LIMIT",
     "RATE_LIMIT_WINDOW_SEC",
+    "CONNECTIVITY_PROBE_URL",
+    "CONNECTIVITY_TIMEOUT",
     "internet_ok",
 ]
 
@@ -61,10 +76,7 @@ __all__ = [
 # 2) Константы / Конфигурация
 REQUEST_TIMEOUT = 8.0
 RETRIES = 1
-
-# ---- Ограничения и защита от капов удалённых сервисов ----
-CONNECTIVITY_PROBE_URL = "https://www.google.com/generate_204"
-CONNECTIVITY_TIMEOUT = 2.0  # короткий таймаут для проверки сети
+PROVIDER_CHAIN = ("tinyurl", "isgd", "dagd", "clckru", "local")  # порядок failover; local — офлайн
 
 # ---- Логирование ----
 LOG_ENABLED = True
@@ -76,6 +88,9 @@ LOG_BACKUPS = 3
 
 # публичная функция, которую дергают тесты
 def internet_ok(logger):
+    # тесты подменяют lite_upgrade.AppState; без подмены читаем общий движок процесса
+    if AppState is ProtectionEngine:
+        return _internet_ok_core(logger)
     return _internet_ok_core(logger, AppState_cls=AppState)
 
 
@@ -112,6 +127,11 @@ def main(page):  # можно без аннотации, чтобы не дер
     logger = setup_logging(enabled=LOG_ENABLED, debug=LOG_DEBUG)
     U.configure_window_and_theme(page)
 
+    # прогреваем keep-alive соединение к провайдеру, пока строится UI
+    threading.Thread(target=get_client().warm, name="urlcutter-warm", daemon=True).start()
+    # первая проверка сети идёт в фоне; on_shorten дальше читает готовый вердикт
+    get_connectivity_monitor().start()
+
     # --- строим основной UI шортенера (как раньше) ---
     header_col = U.build_header()
     url_input_field, short_url_field = U.build_inputs()
@@ -130,7 +150,7 @@ def main(page):  # можно без аннотации, чтобы не дер
         shorten_button=shorten_button,
         shorten_btn=shorten_button,
     )
-    state = AppState()
+    state = get_protection_engine()  # тот же движок читают internet_ok и пакетные пути
 
     params = {
         "page": page,
@@ -144,6 +164,11 @@ def main(page):  # можно без аннотации, чтобы не дер
         "shorten_button": shorten_button,
         "shorten_btn": shorten_button,
         "ui": ui,
+        "providers": PROVIDER_CHAIN,
+        "hedger": get_hedger(),  # делит трекер задержек с адаптивными таймаутами
+        "timeouts": get_adaptive_timeouts(),
+        "cache": get_result_cache(),
+        "quota": get_quota_ledger(),  # суточные/часовые лимиты провайдеров, переживают перезапуск
     }
 
     # --- создаём handlers ДО title_bar, чтобы сразу передать его методы в меню ---
@@ -0,0 +1,113 @@
+# микробенчмарк ведра токенов и полного решения движка защиты (предохранитель + лимит):
+# решений в секунду при конкуренции потоков (без сети и БД)
+#
+#   PYTHONPATH=. python scripts/bench_rate_limiter.py --threads 1 2 4 8 16 --seconds 2
+#   PYTHONPATH=. python scripts/bench_rate_limiter.py --providers 4 --rate 1000000
+import argparse
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+from urlcutter.protection import BucketSpec, ProtectionEngine, RateLimiter
+
+
+def _deque_window(limit, window):
+    """Прежний лимитер (скользящее окно на deque, без блокировки) — для сравнения в одном потоке."""
+    ticks = deque()
+
+    def allow():
+        now = time.time()
+        while ticks and now - ticks[0] > window:
+            ticks.popleft()
+        if len(ticks) >= limit:
+            return False
+        ticks.append(now)
+        return True
+
+    return allow
+
+
+def _engine_decide(engine, logger):
+    """То, что делает Handlers.on_shorten перед вызовом провайдера."""
+
+    def allow(name):
+        return not engine.circuit_blocked(name) and engine.rate_limit_allow(logger, name)
+
+    return allow
+
+
+def run(threads, seconds, allow_fn, providers):
+    counts = [0] * threads
+    granted = [0] * threads
+    start = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(i):
+        allow = allow_fn
+        name = providers[i % len(providers)]
+        n = ok = 0
+        start.wait()
+        while not stop.is_set():
+            for _ in range(1000):
+                ok += allow(name)
+            n += 1000
+        counts[i], granted[i] = n, ok
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - t0
+    return sum(counts), sum(granted), wall
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--providers", type=int, default=1, help="distinct buckets the threads are spread over")
+    ap.add_argument("--burst", type=int, default=60)
+    ap.add_argument("--rate", type=float, default=100_000.0, help="refill, tokens/s (high = mix of allow/deny)")
+    args = ap.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"python {sys.version.split()[0]} gil={'on' if gil else 'off'} switchinterval={sys.getswitchinterval()}")
+
+    allow = _deque_window(60, 60)
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < args.seconds:
+        for _ in range(1000):
+            allow()
+        n += 1000
+    print(f"baseline deque window, 1 thread: {n / (time.perf_counter() - t0) / 1e6:.2f} M decisions/s")
+
+    names = [f"p{i}" for i in range(args.providers)]
+    for threads in args.threads:
+        limiter = RateLimiter({name: BucketSpec(args.burst, args.rate) for name in names}, default=None)
+        n, ok, wall = run(threads, args.seconds, limiter.allow, names)
+        print(
+            f"token bucket threads={threads:<3} buckets={len(names)}: {n / wall / 1e6:.2f} M decisions/s "
+            f"(allowed {100 * ok / n:.1f}%)"
+        )
+
+    quiet = logging.getLogger("bench.protection")
+    quiet.setLevel(logging.ERROR)  # отказы лимита пишутся warning'ом — в замер не включаем I/O логов
+    for threads in args.threads:
+        limiter = RateLimiter({name: BucketSpec(args.burst, args.rate) for name in names}, default=None)
+        engine = ProtectionEngine(limiter)
+        n, ok, wall = run(threads, args.seconds, _engine_decide(engine, quiet), names)
+        print(
+            f"engine decision threads={threads:<3} buckets={len(names)}: {n / wall / 1e6:.2f} M decisions/s "
+            f"(allowed {100 * ok / n:.1f}%)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# нагрузка на redirect-сервер: БД с N ссылками, сервер отдельным процессом, клиенты на keep-alive
+#
+#   PYTHONPATH=. python scripts/bench_redirect.py                      # 10k и 1M ссылок
+#   PYTHONPATH=. python scripts/bench_redirect.py --links 10000 -n 50000 -c 64 --hot 0.9
+#   PYTHONPATH=. python scripts/bench_redirect.py --snapshot --lru-size 0   # только mmap-снимок, без LRU
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from urlcutter.db.models import Base
+from urlcutter.link_snapshot import build_snapshot
+from urlcutter.local_shortener import encode_base62
+
+BASE_URL = "http://bench.local"
+
+
+def _pct(sorted_vals, q):
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[idx]
+
+
+def populate(db_file: Path, n: int) -> None:
+    engine = create_engine(f"sqlite:///{db_file}")
+    Base.metadata.create_all(engine)  # схема и индексы — как у приложения
+    engine.dispose()
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    batch = 50_000
+    for start in range(1, n + 1, batch):
+        rows = [
+            (f"https://example.com/article/{i}", f"{BASE_URL}/{encode_base62(i)}", "local", "2024-01-01 00:00:00", 0)
+            for i in range(start, min(n + 1, start + batch))
+        ]
+        conn.executemany(
+            "INSERT INTO links (long_url, short_url, service, created_at, copy_count) VALUES (?, ?, ?, ?, ?)", rows
+        )
+    conn.commit()
+    conn.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir: Path, port: int, lru_size: int, snapshot: Path | None) -> subprocess.Popen:
+    env = {**os.environ, "URLCUTTER_DATA_DIR": str(data_dir)}
+    cmd = [sys.executable, "-m", "urlcutter", "serve", "--port", str(port), "--base-url", BASE_URL]
+    cmd += ["--lru-size", str(lru_size)]
+    if snapshot is not None:
+        cmd += ["--snapshot", str(snapshot)]
+    proc = subprocess.Popen(cmd, env=env, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("redirect server did not start")
+
+
+def pick_codes(n_links: int, requests: int, hot: float, seed: int) -> list[str]:
+    # hot — доля запросов к «горячему» 1% ссылок, остальное равномерно по всей таблице
+    rnd = random.Random(seed)
+    hot_n = max(1, n_links // 100)
+    ids = [rnd.randint(1, hot_n) if rnd.random() < hot else rnd.randint(1, n_links) for _ in range(requests)]
+    return [encode_base62(i) for i in ids]
+
+
+async def drive(port: int, codes: list[str], concurrency: int) -> tuple[list[float], int, float]:
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(codes)
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for code in queue:
+            started = time.perf_counter()
+            writer.write(f"GET /{code} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            latencies.append(time.perf_counter() - started)
+            if not head.startswith(b"HTTP/1.1 302"):
+                errors += 1
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def bench(n_links: int, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        t0 = time.perf_counter()
+        populate(data_dir / "history.db", n_links)  # см. urlcutter.db.paths.db_path
+        print(f"== {n_links} links (populated in {time.perf_counter() - t0:.1f}s)")
+        snapshot = None
+        if args.snapshot:
+            snapshot = data_dir / "links.snap"
+            st = build_snapshot(snapshot, engine=create_engine(f"sqlite:///{data_dir / 'history.db'}"))
+            print(f"snapshot: {st.entries} links, {snapshot.stat().st_size >> 20} MiB, built in {st.elapsed:.1f}s")
+        port = _free_port()
+        proc = start_server(data_dir, port, args.lru_size, snapshot)
+        try:
+            codes = pick_codes(n_links, args.requests, args.hot, args.seed)
+            asyncio.run(drive(port, codes[: min(2000, len(codes))], args.concurrency))  # прогрев
+            lat, errors, wall = asyncio.run(drive(port, codes, args.concurrency))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        lat.sort()
+        print(f"requests={len(lat)} errors={errors} wall={wall:.2f}s throughput={len(lat) / wall:.0f} req/s")
+        print(
+            "latency ms: p50={:.2f} p99={:.2f} max={:.2f}".format(
+                *(1000 * v for v in (_pct(lat, 0.5), _pct(lat, 0.99), lat[-1]))
+            )
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--links", type=int, nargs="+", default=[10_000, 1_000_000])
+    ap.add_argument("-n", "--requests", type=int, default=20_000)
+    ap.add_argument("-c", "--concurrency", type=int, default=32)
+    ap.add_argument("--hot", type=float, default=0.8, help="доля запросов к горячему 1%% ссылок")
+    ap.add_argument("--lru-size", type=int, default=100_000)
+    ap.add_argument("--snapshot", action="store_true", help="собрать mmap-снимок и отдавать из него")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    for n in args.links:
+        bench(n, args)
+
+
+if __name__ == "__main__":
+    main()
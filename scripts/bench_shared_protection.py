@@ -0,0 +1,91 @@
+# бенчмарк общего для процессов состояния защиты (urlcutter.shared_protection):
+# N процессов одновременно принимают решения «лимит + предохранитель» через один файл.
+# Печатает пропускную способность, задержку решения (p50/p99/max), сколько решений
+# ушло в обход общего состояния (busy) и соблюдён ли общий лимит.
+#
+#   PYTHONPATH=. python scripts/bench_shared_protection.py --procs 8 16 32 --seconds 3
+#   PYTHONPATH=. python scripts/bench_shared_protection.py --procs 32 --rate 50 --burst 60
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from urlcutter.protection import BucketSpec
+from urlcutter.shared_protection import SharedCircuitBreaker, SharedRateLimiter, SharedStateStore
+
+
+def worker(path, barrier, seconds, burst, rate, lock_timeout, sample_every, out):  # noqa: PLR0913
+    store = SharedStateStore(path, lock_timeout=lock_timeout)
+    limiter = SharedRateLimiter(store, {"tinyurl": BucketSpec(burst, rate)}, default=None)
+    breaker = SharedCircuitBreaker(store)
+    store.connect()  # схема и соединение — до старта замера
+    barrier.wait()  # все процессы подняты и подключены — стартуем вместе
+    stop = time.time() + seconds
+    n = ok = 0
+    lat = []
+    perf = time.perf_counter
+    while time.time() < stop:
+        t0 = perf()
+        # то же, что делает failover перед вызовом провайдера
+        if breaker.try_acquire("tinyurl") and limiter.allow("tinyurl"):
+            ok += 1
+        if n % sample_every == 0:
+            lat.append(perf() - t0)
+        n += 1
+    out.put((n, ok, store.busy, lat))
+    store.close()
+
+
+def pct(sorted_vals, q):
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def run(procs, args):
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "protection.db")
+        SharedStateStore(path).connect()  # создаём файл и схему заранее
+        out = ctx.Queue()
+        barrier = ctx.Barrier(procs)
+        pool = [
+            ctx.Process(
+                target=worker,
+                args=(path, barrier, args.seconds, args.burst, args.rate, args.lock_timeout, args.sample_every, out),
+            )
+            for _ in range(procs)
+        ]
+        for p in pool:
+            p.start()
+        results = [out.get() for _ in pool]
+        for p in pool:
+            p.join()
+    n = sum(r[0] for r in results)
+    ok = sum(r[1] for r in results)
+    busy = sum(r[2] for r in results)
+    lat = sorted(x for r in results for x in r[3])
+    cap = args.burst + args.rate * args.seconds
+    print(
+        f"procs={procs:<3} {n / args.seconds:>9.0f} decisions/s  "
+        f"p50={pct(lat, 0.5) * 1e6:>7.0f}us p99={pct(lat, 0.99) * 1e6:>7.0f}us max={lat[-1] * 1e3:>6.1f}ms  "
+        f"granted={ok} (cap {cap:.0f}{', OK' if ok <= cap + 1 else ', EXCEEDED'})  busy={busy}"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, nargs="+", default=[8, 16, 32])
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--burst", type=int, default=60)
+    ap.add_argument("--rate", type=float, default=1.0, help="refill, tokens/s (TinyURL-like: 60 burst, 1/s)")
+    ap.add_argument("--lock-timeout", type=float, default=0.05)
+    ap.add_argument("--sample-every", type=int, default=10, help="record latency of every N-th decision")
+    args = ap.parse_args()
+    print(f"cpus={os.cpu_count()} lock_timeout={args.lock_timeout * 1e3:.0f}ms burst={args.burst} rate={args.rate}/s")
+    for procs in args.procs:
+        run(procs, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# нагрузочный прогон без сети: настоящее ядро / Handlers.on_shorten против локального стенда с отказами
+#
+#   PYTHONPATH=. python scripts/bench_shortening.py --mode core -n 2000 -c 32 --latency lognormal:0.05:0.7 --p5xx 0.05
+#   PYTHONPATH=. python scripts/bench_shortening.py --mode handler -n 200 -c 4 --p429 0.2 --hang 0.02 --timeout 1
+import argparse
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import urlcutter.handlers as handlers_mod
+from urlcutter.connectivity import ConnectivityMonitor, set_connectivity_monitor
+from urlcutter.handlers import Handlers
+from urlcutter.protection import AppState
+from urlcutter.retry import RetryPolicy
+from urlcutter.shorteners import ResultCache, shorten_via_tinyurl_core
+from urlcutter.stub_server import FaultProfile, StubTinyUrlServer
+
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return float("nan")
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[idx]
+
+
+def _report(title, latencies, outcomes, wall):
+    lat = sorted(latencies)
+    n = len(lat)
+    print(f"== {title}")
+    print(f"requests={n} wall={wall:.2f}s throughput={n / wall if wall else 0:.1f}/s")
+    print(
+        "latency ms: p50={:.1f} p90={:.1f} p99={:.1f} max={:.1f}".format(
+            *(1000 * v for v in (_pct(lat, 0.5), _pct(lat, 0.9), _pct(lat, 0.99), lat[-1] if lat else float("nan")))
+        )
+    )
+    for kind, cnt in outcomes.most_common():
+        print(f"  {kind:<28} {cnt:>7} ({100 * cnt / n:.1f}%)")
+
+
+def bench_core(stub, args):
+    get = stub.transport()
+    policy = RetryPolicy(max_attempts=1 + args.retries, deadline=args.deadline) if args.retries else None
+    latencies, outcomes, lock = [], Counter(), threading.Lock()
+
+    def one(i):
+        url = f"https://example.com/page/{i % args.unique}"
+        started = time.perf_counter()
+        try:
+            if policy is None:
+                shorten_via_tinyurl_core(url, args.timeout, _get=get)
+            else:
+                policy.call(shorten_via_tinyurl_core, url, args.timeout, _get=get)
+            kind = "ok"
+        except Exception as e:
+            kind = RetryPolicy.classify(e)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            outcomes[kind] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    _report("core", latencies, outcomes, time.perf_counter() - started)
+
+
+class _Page:
+    def __init__(self):
+        self.overlay = []
+        self.cursor = None
+
+    def update(self):
+        pass
+
+
+class _Field:
+    def __init__(self, value=""):
+        self.value = value
+        self.disabled = False
+
+
+class _NullHistory:
+    def add(self, rec):
+        return type("Stored", (), {"id": None})()
+
+
+def bench_handler(stub, args):
+    # UI-путь целиком: кэш, локальный лимит, предохранитель, ретраи, single-flight
+    handlers_mod.shorten_via_tinyurl = partial(shorten_via_tinyurl_core, _get=stub.transport())
+    # монитор без URL пробы всегда «онлайн»: стенд локальный, в интернет не ходим
+    set_connectivity_monitor(ConnectivityMonitor(url=None))
+    state = AppState()  # одно «приложение» на все клики
+    cache = ResultCache()
+    logger = logging.getLogger("bench")
+    latencies, outcomes, lock = [], Counter(), threading.Lock()
+
+    def one(i):
+        page = _Page()
+        h = Handlers(page, logger, state, _Field(f"https://example.com/page/{i % args.unique}"), _Field(), _Field())
+        h.cache = cache
+        h.history = _NullHistory()
+        started = time.perf_counter()
+        h.on_shorten(None)
+        elapsed = time.perf_counter() - started
+        toast = page.overlay[-1].content.value if page.overlay else "<no toast>"
+        with lock:
+            latencies.append(elapsed)
+            outcomes[toast.split(".")[0][:28]] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    _report("handler", latencies, outcomes, time.perf_counter() - started)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=("core", "handler"), default="core")
+    ap.add_argument("-n", "--requests", type=int, default=500)
+    ap.add_argument("-c", "--concurrency", type=int, default=16)
+    ap.add_argument("--unique", type=int, default=10**9, help="сколько разных URL (повторы бьют в кэш)")
+    ap.add_argument("--timeout", type=float, default=2.0)
+    ap.add_argument("--retries", type=int, default=0, help="только для --mode core")
+    ap.add_argument("--deadline", type=float, default=None)
+    ap.add_argument("--latency", default="lognormal:0.03:0.5")
+    ap.add_argument("--p429", type=float, default=0.0)
+    ap.add_argument("--p5xx", type=float, default=0.0)
+    ap.add_argument("--hang", type=float, default=0.0)
+    ap.add_argument("--malformed", type=float, default=0.0)
+    ap.add_argument("--quota", type=int, default=0)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    profile = FaultProfile(
+        latency=args.latency,
+        p429=args.p429,
+        p5xx=args.p5xx,
+        p_hang=args.hang,
+        p_malformed=args.malformed,
+        quota=args.quota,
+        hang_seconds=args.timeout * 3,
+    )
+    with StubTinyUrlServer(profile, seed=args.seed) as stub:
+        (bench_core if args.mode == "core" else bench_handler)(stub, args)
+        print("server:", stub.stats())
+
+
+if __name__ == "__main__":
+    main()
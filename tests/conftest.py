@@ -1,12 +1,16 @@
+import threading
 from concurrent.futures import TimeoutError
 from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from urlcutter.connectivity import ConnectivityMonitor, set_connectivity_monitor
 from urlcutter.db.models import Base
 from urlcutter.db.repo import history_sql
+from urlcutter.protection import _reset_state
 
 
 @pytest.fixture
@@ -153,3 +157,45 @@ def patch_get_session(monkeypatch, db_session):
         yield db_session
 
     monkeypatch.setattr(history_sql, "get_session", fake_get_session)
+
+
+@pytest.fixture(autouse=True)
+def fresh_protection_engine():
+    """Общий движок защиты процесса не должен тащить состояние между тестами."""
+    _reset_state()
+    yield
+    _reset_state()
+
+
+class _ProbeHandler(BaseHTTPRequestHandler):
+    # ведёт себя как generate_204; status можно переключить, чтобы изобразить сбой
+    def do_GET(self):
+        self.server.hits += 1
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *a):
+        pass
+
+
+@pytest.fixture(scope="session")
+def probe_server():
+    """Локальная замена CONNECTIVITY_PROBE_URL: тесты не ходят в интернет."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ProbeHandler)
+    server.status, server.hits = 204, 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/generate_204"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_connectivity_monitor(probe_server):
+    """Свой монитор сети на каждый тест, пробы — в локальный probe_server."""
+    probe_server.status = 204
+    monitor = set_connectivity_monitor(ConnectivityMonitor(probe_server.url))
+    yield monitor
+    monitor.stop(timeout=1)
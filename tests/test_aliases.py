@@ -0,0 +1,185 @@
+import argparse
+import io
+import threading
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from urlcutter.aliases import AliasRegistry, AliasTaken, validate_alias
+from urlcutter.bloom import BloomFilter
+from urlcutter.cli import run_alias
+from urlcutter.db.models import Base
+from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+from urlcutter.db.repo.schemas import LinkRecord
+from urlcutter.local_shortener import BlockAllocator, LocalShortener, decode_base62
+
+BASE = "http://sho.rt"
+
+
+@pytest.fixture
+def session_factory(db_session):
+    @contextmanager
+    def _factory():
+        yield db_session
+
+    return _factory
+
+
+@pytest.fixture
+def history(db_session):
+    return SqlAlchemyHistoryService()
+
+
+def _file_factory(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(engine)
+    maker = sessionmaker(bind=engine)
+
+    @contextmanager
+    def _factory():
+        s = maker()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    return _factory, engine
+
+
+def _store(history, code, base=BASE):
+    history.add(LinkRecord(None, f"https://example.com/{code}", f"{base}/{code}", "local", None))
+
+
+def test_bloom_has_no_false_negatives_and_bounded_fp_rate():
+    bloom = BloomFilter(10_000, 0.01)
+    for i in range(10_000):
+        bloom.add(f"in-{i}")
+    assert all(f"in-{i}" in bloom for i in range(10_000))
+    fp = sum(f"out-{i}" in bloom for i in range(20_000)) / 20_000
+    assert fp < 0.02
+    assert 0.005 < bloom.expected_fp_rate() < 0.02
+    assert bloom.memory_bytes < 12_500  # ~9.6 бит на элемент при p=1%
+    assert bloom.add("in-1") is False
+    assert 9_900 <= len(bloom) <= 10_000  # добавления, попавшие в ложное срабатывание, не считаются
+
+
+def test_bloom_rejects_bad_sizing():
+    with pytest.raises(ValueError):
+        BloomFilter(0)
+    with pytest.raises(ValueError):
+        BloomFilter(10, error_rate=1.5)
+
+
+def test_registry_built_from_db_answers_negatives_without_db(session_factory, history):
+    for code in ("sale", "promo-2026", "abc"):
+        _store(history, code)
+    _store(history, "sale", base="https://tinyurl.com")  # чужой домен не считается
+    reg = AliasRegistry(BASE, session_factory=session_factory)
+
+    assert reg.is_available("summer") is True
+    assert reg.is_available("sale") is False
+    assert reg.is_available("promo-2026") is False
+    st = reg.stats()
+    assert st.entries == 3
+    assert st.checks == 3
+    assert st.definite_negatives + st.false_positives == 1
+    assert st.db_checks == 2 + st.false_positives
+    assert st.memory_bytes > 0 and st.hashes >= 1
+
+
+def test_reserve_is_exclusive_and_updates_filter(session_factory, history):
+    reg = AliasRegistry(BASE, session_factory=session_factory)
+    assert reg.reserve("launch") == "launch"
+    with pytest.raises(AliasTaken):
+        reg.reserve("launch")  # строки в БД ещё нет, но алиас уже выдан
+    assert reg.is_available("launch") is False
+
+
+def test_reserve_is_exclusive_across_processes(tmp_path):
+    # отдельные движки над одним файлом — как разные процессы со своими фильтрами
+    path = tmp_path / "shared.db"
+    opened = [_file_factory(path) for _ in range(4)]
+    regs = [AliasRegistry(BASE, session_factory=factory) for factory, _ in opened]
+    for reg in regs:
+        reg.load()  # фильтры построены до гонки: каждый считает «race» свободным
+    results = []
+
+    def grab(reg):
+        for _ in range(2):
+            try:
+                results.append(reg.reserve("race"))
+            except AliasTaken:
+                results.append(None)
+
+    threads = [threading.Thread(target=grab, args=(reg,)) for reg in regs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count("race") == 1
+
+    regs[0].reserve("promo")
+    assert regs[1].claim_many(["xyz", "promo", "def"]) == ["xyz", "def"]  # устаревший фильтр не обманет
+    with pytest.raises(AliasTaken):
+        regs[2].reserve("xyz")
+    for _, engine in opened:
+        engine.dispose()
+
+
+def test_codes_issued_during_rebuild_are_kept(session_factory, history):
+    reg = AliasRegistry(BASE, session_factory=session_factory)
+    reg.load()
+    issue_now = []
+
+    @contextmanager
+    def factory():
+        if issue_now:
+            reg.add(issue_now.pop())  # код выдан, пока load() читает БД
+        with session_factory() as s:
+            yield s
+
+    reg._session_factory = factory
+    issue_now.append("late")
+    reg.load()
+    assert reg.is_taken("late") is False  # в БД его нет, но фильтр его помнит
+    assert reg.stats().definite_negatives == 0
+
+
+@pytest.mark.parametrize("bad", ["ab", "x" * 33, "has space", "slash/y", "ünï", ""])
+def test_validate_alias_rejects(bad):
+    with pytest.raises(ValueError):
+        validate_alias(bad)
+
+
+def test_local_shortener_alias_and_generated_codes_never_collide(session_factory, history):
+    allocator = BlockAllocator(block_size=10, session_factory=session_factory)
+    local = LocalShortener(BASE, allocator=allocator)
+    # алиас, совпадающий с будущим сгенерированным кодом «2»... — генератор должен его пропустить
+    _store(history, "2")
+    assert local.shorten("https://example.com/vanity", alias="vanity") == f"{BASE}/vanity"
+    codes = [local.shorten(f"https://example.com/{i}").rsplit("/", 1)[1] for i in range(3)]
+    assert "2" not in codes
+    assert [decode_base62(c) for c in codes] == [1, 3, 4]
+    with pytest.raises(AliasTaken):
+        local.shorten("https://example.com/other", alias="vanity")
+
+
+def test_cli_alias_check_and_create(session_factory, history, monkeypatch, capsys):
+    local = LocalShortener(BASE, allocator=BlockAllocator(session_factory=session_factory))
+    monkeypatch.setattr("urlcutter.local_shortener.get_local_shortener", lambda: local)
+
+    out = io.StringIO()
+    args = argparse.Namespace(alias="docs", url=None, base_url=None)
+    assert run_alias(args, stdout=out, history=history) == 0
+    assert out.getvalue() == "docs\tavailable\n"
+
+    out = io.StringIO()
+    args = argparse.Namespace(alias="docs", url="https://example.com/docs", base_url=None)
+    assert run_alias(args, stdout=out, history=history) == 0
+    assert out.getvalue() == f"{BASE}/docs\n"
+    assert history.find_long_urls([f"{BASE}/docs"]) == {f"{BASE}/docs": "https://example.com/docs"}
+
+    assert run_alias(args, stdout=io.StringIO(), history=history) == 1
+    assert "alias filter: codes=" in capsys.readouterr().err
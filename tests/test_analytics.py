@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from urlcutter.analytics import VisitorAnalytics
+from urlcutter.clicks import ClickCounter
+from urlcutter.db.models import Link, LinkVisitorDay
+from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+from urlcutter.db.repo.schemas import LinkRecord
+
+A, B = "http://s.rt/a", "http://s.rt/b"
+
+
+@pytest.fixture
+def session_factory(db_session):
+    @contextmanager
+    def _factory():
+        yield db_session
+
+    return _factory
+
+
+@pytest.fixture
+def links(db_session):
+    svc = SqlAlchemyHistoryService()
+    return {u: svc.add(LinkRecord(None, f"https://e.com/{u[-1]}", u, "local", None)).id for u in (A, B)}
+
+
+class Today:
+    def __init__(self, day):
+        self.day = day
+
+    def __call__(self):
+        return self.day
+
+
+def test_lifetime_uniques_accumulate_across_flushes(session_factory, links):
+    va = VisitorAnalytics(session_factory=session_factory)
+    for i in range(1000):
+        va.record(A, f"v{i}")
+    assert va.pending() == 1
+    assert va.flush() == 1
+    assert va.pending() == 0
+    for i in range(500, 1500):  # половина — уже знакомые посетители
+        va.record(A, f"v{i}")
+    va.flush()
+    assert abs(va.uniques(A) - 1500) < 75
+    assert va.uniques(B) == 0
+    assert va.uniques("http://unknown/x") == 0
+
+
+def test_daily_sketches_and_weekly_rollup(session_factory, links, db_session):
+    start = date(2026, 10, 5)
+    today = Today(start)
+    va = VisitorAnalytics(session_factory=session_factory, today=today)
+    for d in range(7):
+        today.day = start + timedelta(days=d)
+        for i in range(100):
+            va.record(A, f"daily-{d}-{i}")  # каждый день новые
+            va.record(A, "regular")  # и один постоянный
+        va.flush()
+
+    assert db_session.execute(select(LinkVisitorDay).where(LinkVisitorDay.link_id == links[A])).scalars().all()
+    daily = va.daily_uniques(A, start, start + timedelta(days=6))
+    assert len(daily) == 7
+    assert all(abs(n - 101) <= 5 for n in daily.values())
+    week = va.uniques_total([A], start, start + timedelta(days=6))
+    assert abs(week - 701) < 35
+    first_two = va.uniques_total([A], start, start + timedelta(days=1))
+    assert abs(first_two - 201) < 10
+
+
+def test_same_day_flushes_merge_into_one_row(session_factory, links, db_session):
+    va = VisitorAnalytics(session_factory=session_factory, today=Today(date(2026, 1, 1)))
+    va.record(A, "x")
+    va.flush()
+    va.record(A, "y")
+    va.flush()
+    rows = db_session.execute(select(LinkVisitorDay)).scalars().all()
+    assert len(rows) == 1
+    assert va.daily_uniques(A, date(2026, 1, 1), date(2026, 1, 1)) == {date(2026, 1, 1): 2}
+
+
+def test_union_across_links_counts_shared_visitors_once(session_factory, links):
+    va = VisitorAnalytics(session_factory=session_factory)
+    for i in range(300):
+        va.record(A, f"p{i}")
+    for i in range(200, 600):
+        va.record(B, f"p{i}")
+    va.flush()
+    assert va.uniques_many([A, B, A]) == {A: va.uniques(A), B: va.uniques(B)}
+    assert abs(va.uniques_total([A, B]) - 600) < 30
+
+
+def test_failed_flush_keeps_sketches(links):
+    @contextmanager
+    def broken():
+        raise RuntimeError("database is locked")
+        yield
+
+    va = VisitorAnalytics(session_factory=broken)
+    va.record(A, "x")
+    assert va.flush() == 0
+    assert va.pending() == 1
+
+
+def test_click_counter_feeds_visitors_and_link_stats(session_factory, links, db_session):
+    va = VisitorAnalytics(session_factory=session_factory)
+    clicks = ClickCounter(visitors=va)
+    for i in range(40):
+        clicks.record(A, f"ip{i % 10}|ua")
+    clicks.record(B)  # без посетителя — только клик
+    clicks.close()
+
+    db_session.expire_all()
+    assert db_session.get(Link, links[A]).click_count == 40
+    stats = {s.short_url: (s.clicks, s.uniques) for s in va.link_stats([A, B, "http://unknown/x"])}
+    assert stats == {A: (40, 10), B: (1, 0)}
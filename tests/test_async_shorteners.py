@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from urlcutter.async_shorteners import AsyncResponse, _http_get, ashorten_many, ashorten_via_tinyurl
+
+
+async def _serve(raw_response: bytes, *, delay: float = 0.0):
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        await asyncio.sleep(delay)
+        writer.write(raw_response)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def test_http_get_content_length():
+    async def scenario():
+        body = b"https://tinyurl.com/abc"
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+        server, base = await _serve(raw)
+        async with server:
+            return await _http_get(base + "/api-create.php?url=x", 1.0)
+
+    resp = asyncio.run(scenario())
+    assert resp.status_code == 200
+    assert resp.text == "https://tinyurl.com/abc"
+
+
+def test_http_get_chunked():
+    async def scenario():
+        raw = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n8\r\nhttps://\r\nf\r\ntinyurl.com/xyz\r\n0\r\n\r\n"
+        server, base = await _serve(raw)
+        async with server:
+            return await _http_get(base + "/", 1.0)
+
+    assert asyncio.run(scenario()).text == "https://tinyurl.com/xyz"
+
+
+def test_ashorten_timeout_against_slow_server(monkeypatch):
+    async def scenario():
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+        server, base = await _serve(raw, delay=1.0)
+
+        async def local_get(url, timeout):
+            return await _http_get(base + "/", timeout)
+
+        async with server:
+            return await ashorten_via_tinyurl("https://example.com", 0.05, _aget=local_get)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(scenario())
+
+
+def test_ashorten_success_and_normalizes():
+    seen = {}
+
+    async def fake_get(url, timeout):
+        seen["url"] = url
+        return AsyncResponse(200, "https://tinyurl.com/ok\n")
+
+    out = asyncio.run(ashorten_via_tinyurl("  https://Example.com/x  ", _aget=fake_get))
+    assert out == "https://tinyurl.com/ok"
+    assert "https%3A%2F%2Fexample.com%2Fx" in seen["url"]
+
+
+@pytest.mark.parametrize(
+    "resp,exc",
+    [
+        (AsyncResponse(503, "down"), RuntimeError),
+        (AsyncResponse(200, "NOT_A_URL"), ValueError),
+    ],
+)
+def test_ashorten_error_contract(resp, exc):
+    async def fake_get(url, timeout):
+        return resp
+
+    with pytest.raises(exc):
+        asyncio.run(ashorten_via_tinyurl("https://example.com", _aget=fake_get))
+
+
+def test_ashorten_network_error_is_runtime_error():
+    async def fake_get(url, timeout):
+        raise ConnectionResetError("reset")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ashorten_via_tinyurl("https://example.com", _aget=fake_get))
+
+
+def test_ashorten_rejects_bad_input_before_network():
+    async def fake_get(url, timeout):
+        raise AssertionError("must not be called")
+
+    for bad in ("", None, "ftp://x"):
+        with pytest.raises(ValueError):
+            asyncio.run(ashorten_via_tinyurl(bad, _aget=fake_get))
+
+
+def test_ashorten_cancellation_propagates():
+    async def scenario():
+        async def hang(url, timeout):
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(ashorten_via_tinyurl("https://example.com", 5, _aget=hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(scenario())
+
+
+def test_ashorten_many_bounded_and_complete():
+    state = {"now": 0, "peak": 0}
+
+    async def fake_get(url, timeout):
+        state["now"] += 1
+        state["peak"] = max(state["peak"], state["now"])
+        await asyncio.sleep(0.001)
+        state["now"] -= 1
+        if "bad" in url:
+            return AsyncResponse(500, "")
+        return AsyncResponse(200, "https://tinyurl.com/" + url[-1])
+
+    async def scenario():
+        urls = [f"https://example.com/{i}" for i in range(200)] + ["https://bad.example.com"]
+        return [r async for r in ashorten_many(urls, max_concurrency=16, _aget=fake_get)]
+
+    out = asyncio.run(scenario())
+    assert len(out) == 201
+    assert state["peak"] <= 16
+    assert sum(1 for r in out if not r.ok) == 1
@@ -1,16 +1,31 @@
+import math
+import threading
+
 import pytest
 
 from lite_upgrade import AppState
 from urlcutter.protection import (
     CB_COOLDOWN_SEC,
     CB_FAIL_THRESHOLD,
+    CIRCUIT_FAIL_THRESHOLD,
     CLIENT_RPM_LIMIT,
+    BucketSpec,
+    CircuitBreaker,
+    CircuitState,
+    ProtectionEngine,
+    RateLimiter,
+    TokenBucket,
+    _get_state,
     _reset_state,  # служебные, только для тестов
     circuit_blocked,
     cooldown_left,
+    get_protection_engine,
+    internet_ok,
+    parse_rate_limits,
     rate_limit_allow,
     record_failure,
     record_success,
+    set_protection_engine,
 )
 
 # --- ВСПОМОГАТЕЛЬНОЕ ---
@@ -40,7 +55,7 @@ def logger():
 
 @pytest.fixture
 def fake_time(monkeypatch):
-    # Контролируем time.time()
+    # Контролируем time.time() и time.monotonic()
     t = {"now": 1_000_000.0}
 
     def _time():
@@ -50,6 +65,7 @@ def fake_time(monkeypatch):
         t["now"] += dt
 
     monkeypatch.setattr("time.time", _time)
+    monkeypatch.setattr("time.monotonic", _time)  # ведро токенов живёт по монотонным часам
     monkeypatch.setattr("time.sleep", _sleep)  # на случай, если используется
     return t
 
@@ -230,3 +246,186 @@ def test_mixed_rate_limit_and_circuit_independent():
     clk.tick(max(61, CB_COOLDOWN_SEC + 1))
     assert rate_limit_allow(now_fn=clk.now)
     assert not circuit_blocked(now_fn=clk.now)
+
+
+# --- TOKEN BUCKET ---
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(burst=3, rate=0.5)
+    assert [bucket.try_acquire(now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.peek(now=1.0) == pytest.approx(0.5)
+    assert bucket.retry_after(now=1.0) == pytest.approx(1.0)
+    assert bucket.peek(now=1.0) == pytest.approx(0.5)  # peek ничего не тратит
+    assert bucket.try_acquire(now=2.0)
+    assert bucket.peek(now=100.0) == 3  # не копим сверх burst
+
+
+def test_token_bucket_ignores_clock_going_backwards():
+    bucket = TokenBucket(burst=1, rate=1.0)
+    assert bucket.try_acquire(now=10.0)
+    assert not bucket.try_acquire(now=5.0)
+    assert bucket.try_acquire(now=6.0)
+
+
+def test_token_bucket_is_thread_safe():
+    bucket = TokenBucket(burst=1000, rate=0.0)
+    granted = []
+
+    def worker():
+        n = sum(bucket.try_acquire(now=1.0) for _ in range(500))
+        granted.append(n)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(granted) == 1000
+    assert bucket.retry_after(now=2.0) == math.inf
+
+
+def test_rate_limiter_per_provider_buckets():
+    limiter = RateLimiter({"isgd": BucketSpec(burst=2, rate=1.0)}, default=None)
+    assert limiter.allow("isgd", now=0.0) and limiter.allow("isgd", now=0.0)
+    assert not limiter.allow("isgd", now=0.0)
+    assert limiter.retry_after("isgd", now=0.5) == pytest.approx(0.5)
+    assert all(limiter.allow("tinyurl", now=0.0) for _ in range(100))  # без спеки — без лимита
+    assert limiter.peek("tinyurl") == math.inf
+    limiter.configure("tinyurl", BucketSpec(burst=1, rate=0.0))
+    assert limiter.allow("tinyurl", now=0.0) and not limiter.allow("tinyurl", now=0.0)
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("isgd=10:0.5; tinyurl=30:1") == {
+        "isgd": BucketSpec(10, 0.5),
+        "tinyurl": BucketSpec(30, 1.0),
+    }
+    assert parse_rate_limits("") == {}
+    with pytest.raises(ValueError):
+        parse_rate_limits("isgd=10")
+
+
+def test_app_state_peek_and_provider_limits(logger):
+    st = AppState(limiter=RateLimiter({"isgd": BucketSpec(burst=1, rate=0.0)}))
+    assert st.rate_limit_peek() == CLIENT_RPM_LIMIT
+    assert st.rate_limit_allow(logger, "isgd")
+    assert not st.rate_limit_allow(logger, "isgd")
+    assert st.rate_limit_peek() == CLIENT_RPM_LIMIT  # общее ведро отдельно
+    assert st.rate_limit_retry_after("isgd") == math.inf
+    assert any("provider=isgd" in a[0] % a[1:] for _, a, _ in logger.messages)
+
+
+# --- ENGINE ---
+
+
+def test_module_functions_and_internet_ok_share_the_process_engine(logger):
+    engine = get_protection_engine()
+    for _ in range(CIRCUIT_FAIL_THRESHOLD):
+        engine.record_failure()
+    assert circuit_blocked()  # модульные функции видят тот же предохранитель
+    assert internet_ok(logger) is False
+    record_success()  # успех вызова, начатого до открытия, кулдаун не отменяет
+    assert internet_ok(logger) is False
+    _reset_state()
+    assert internet_ok(logger) is True
+    assert _get_state() is engine
+
+
+def test_internet_ok_does_not_consume_rate_tokens(logger):
+    engine = AppState(limiter=RateLimiter(default=BucketSpec(burst=1, rate=0.0)))
+    assert internet_ok(logger, engine=engine)
+    assert internet_ok(logger, engine=engine)
+    assert engine.rate_limit_peek() == 1
+
+
+def test_engine_strategies_are_pluggable(logger):
+    class AlwaysOpen:
+        def blocked(self, provider="*", *, now=None):
+            return True
+
+        def cooldown_left(self, provider="*", *, now=None):
+            return 1.5
+
+        def record_failure(self, provider="*", *, now=None):
+            pass
+
+        def record_success(self, provider="*", *, now=None):
+            pass
+
+        def reset(self):
+            pass
+
+    engine = ProtectionEngine(breaker=AlwaysOpen())
+    assert engine.circuit_blocked() and engine.cooldown_left() == 2
+    previous = get_protection_engine()
+    try:
+        assert set_protection_engine(engine) is get_protection_engine()
+        assert internet_ok(logger) is False
+    finally:
+        set_protection_engine(previous)
+
+
+def test_breaker_keys_are_independent():
+    breaker = CircuitBreaker(threshold=2, cooldown=10)
+    breaker.record_failure("isgd", now=0.0)
+    breaker.record_failure("isgd", now=0.0)
+    breaker.record_failure("isgd", now=1.0)  # открыт — не считается
+    assert breaker.blocked("isgd", now=5.0) and not breaker.blocked("tinyurl", now=5.0)
+    assert breaker.try_acquire("tinyurl", now=5.0)
+    assert breaker.cooldown_left("isgd", now=5.0) == 5.0
+    assert not breaker.blocked("isgd", now=10.0)
+
+
+# --- HALF-OPEN BREAKER ---
+
+
+def test_half_open_admits_limited_probes_and_closes_on_success():
+    events = []
+    breaker = CircuitBreaker(threshold=1, cooldown=10, probes=2)
+    breaker.subscribe(events.append)
+    breaker.record_failure("tinyurl", now=0.0)
+    assert not breaker.try_acquire("tinyurl", now=9.0)
+    assert [breaker.try_acquire("tinyurl", now=10.0) for _ in range(3)] == [True, True, False]
+    assert breaker.blocked("tinyurl", now=10.0)  # оба пробных слота заняты
+    assert breaker.state("tinyurl", now=10.0) is CircuitState.HALF_OPEN
+    breaker.record_success("tinyurl", now=11.0)
+    assert breaker.state("tinyurl") is CircuitState.CLOSED
+    assert [(e.old, e.new) for e in events] == [
+        (CircuitState.CLOSED, CircuitState.OPEN),
+        (CircuitState.OPEN, CircuitState.HALF_OPEN),
+        (CircuitState.HALF_OPEN, CircuitState.CLOSED),
+    ]
+    stats = breaker.stats("tinyurl")
+    assert (stats.trips, stats.consecutive_trips, stats.rejected) == (1, 0, 2)
+
+
+def test_cooldown_grows_with_consecutive_trips_and_resets_after_close():
+    breaker = CircuitBreaker(threshold=1, cooldown=10, max_cooldown=35)
+    now = 0.0
+    cooldowns = []
+    for _ in range(4):
+        breaker.record_failure("isgd", now=now)
+        cooldowns.append(breaker.stats("isgd", now=now).cooldown)
+        now += cooldowns[-1]
+        assert breaker.try_acquire("isgd", now=now)  # проба...
+        # ...и снова ошибка (следующая итерация)
+    assert cooldowns == [10, 20, 35, 35]
+    breaker.record_success("isgd", now=now)
+    breaker.record_failure("isgd", now=now)
+    assert breaker.stats("isgd", now=now).cooldown == 10
+
+
+def test_lost_probe_slot_is_reclaimed_after_lease():
+    breaker = CircuitBreaker(threshold=1, cooldown=1, probe_timeout=5)
+    breaker.record_failure("dagd", now=0.0)
+    assert breaker.try_acquire("dagd", now=1.0)
+    assert not breaker.try_acquire("dagd", now=3.0)
+    assert breaker.try_acquire("dagd", now=6.5)
+
+
+def test_listener_errors_do_not_break_decisions():
+    breaker = CircuitBreaker(threshold=1, cooldown=1)
+    breaker.subscribe(lambda ev: 1 / 0)
+    breaker.record_failure("x", now=0.0)
+    assert breaker.blocked("x", now=0.5)
@@ -0,0 +1,282 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from urlcutter import cli
+from urlcutter.cli import Checkpoint, build_parser, run_shorten
+from urlcutter.protection import AppState, CircuitBreaker, RateLimiter
+from urlcutter.shorteners import ResultCache
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Resp:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+
+class CountingGet:
+    def __init__(self, fail_on=None, interrupt_at=None):
+        self.calls = []
+        self.fail_on = fail_on or set()
+        self.interrupt_at = interrupt_at
+
+    def __call__(self, api, timeout):
+        self.calls.append(api)
+        if self.interrupt_at is not None and len(self.calls) == self.interrupt_at:
+            raise KeyboardInterrupt
+        n = api.rsplit("%2F", 1)[-1]
+        if n in self.fail_on:
+            return type("R", (), {"status_code": 503, "text": "", "headers": {}})()
+        return Resp(f"https://tiny.one/{n}")
+
+
+class FakeHistory:
+    def __init__(self):
+        self.batches = []
+
+    def add_many(self, records):
+        self.batches.append(list(records))
+        return len(records)
+
+
+class OpenState:
+    def __init__(self):
+        self.success = self.failure = 0
+
+    def circuit_blocked(self):
+        return False
+
+    def cooldown_left(self):
+        return 0
+
+    def rate_limit_allow(self, logger):
+        return True
+
+    def record_success(self):
+        self.success += 1
+
+    def record_failure(self):
+        self.failure += 1
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(cli, "get_result_cache", ResultCache)
+
+
+def _input(tmp_path, n, extra=()):
+    p = tmp_path / "urls.txt"
+    lines = [f"https://example.com/{i}" for i in range(1, n + 1)]
+    p.write_text("\n".join([*lines, *extra]) + "\n", encoding="utf-8")
+    return p
+
+
+def _args(*argv):
+    return build_parser().parse_args(["shorten", *argv])
+
+
+def _rows(path):
+    return [json.loads(x) for x in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_jsonl_file_with_history_batches(tmp_path):
+    src = _input(tmp_path, 5, extra=("", "# comment"))
+    out = tmp_path / "out.jsonl"
+    hist = FakeHistory()
+    get = CountingGet()
+    code = run_shorten(
+        _args(str(src), "-o", str(out), "--history-batch", "2", "-c", "2"), history=hist, state=OpenState(), _get=get
+    )
+    assert code == 0
+    rows = _rows(out)
+    assert sorted(r["line"] for r in rows) == [1, 2, 3, 4, 5]
+    assert all(r["short_url"] == f"https://tiny.one/{r['line']}" for r in rows)
+    assert sum(len(b) for b in hist.batches) == 5
+    assert max(len(b) for b in hist.batches) <= 2
+    ckpt = Checkpoint.load(tmp_path / "out.jsonl.ckpt")
+    assert ckpt.watermark == 8 and not ckpt.done  # с пустой строкой и комментарием
+
+
+def test_csv_to_stdout_and_failures(tmp_path):
+    src = _input(tmp_path, 3)
+    buf = io.StringIO()
+    state = OpenState()
+    code = run_shorten(
+        _args(str(src), "-f", "csv", "--no-history", "--retries", "0"),
+        stdout=buf,
+        state=state,
+        _get=CountingGet(fail_on={"2"}),
+    )
+    assert code == 1
+    lines = buf.getvalue().splitlines()
+    assert lines[0] == "line,url,short_url,provider,error"
+    assert len(lines) == 4
+    assert any("HTTP 503" in x for x in lines)
+    assert (state.success, state.failure) == (2, 1)
+
+
+def test_resume_after_interrupt_does_not_reshorten(tmp_path):
+    src = _input(tmp_path, 20)
+    out = tmp_path / "out.jsonl"
+    first = CountingGet(interrupt_at=8)
+    code = run_shorten(_args(str(src), "-o", str(out), "-c", "1", "--no-history"), state=OpenState(), _get=first)
+    assert code == 130
+    done_before = {r["line"] for r in _rows(out)}
+    assert 7 <= len(done_before) <= 8  # строка 9 могла успеть в окне упреждения
+
+    second = CountingGet()
+    code = run_shorten(_args(str(src), "-o", str(out), "-c", "1", "--no-history"), state=OpenState(), _get=second)
+    assert code == 0
+    lines = [r["line"] for r in _rows(out)]
+    assert sorted(lines) == list(range(1, 21))  # каждая строка ровно один раз
+    assert len(second.calls) == 20 - len(done_before)
+
+
+def test_resume_recovers_rows_after_stale_checkpoint_and_torn_line(tmp_path):
+    src = _input(tmp_path, 6)
+    out = tmp_path / "out.jsonl"
+    run_shorten(_args(str(src), "-o", str(out), "-c", "1", "--no-history"), state=OpenState(), _get=CountingGet())
+    content = out.read_bytes()
+    first_three = b"".join(content.splitlines(keepends=True)[:3])
+    # «убили» процесс: чекпоинт сохранился после 1 строки, в выводе ещё 2 строки и обрывок
+    out.write_bytes(first_three + b'{"line": 4, "url": "https://exa')
+    one_line = len(content.splitlines(keepends=True)[0])
+    Checkpoint(input=str(src), output_bytes=one_line, watermark=2).save(tmp_path / "out.jsonl.ckpt")
+
+    hist = FakeHistory()
+    get = CountingGet()
+    assert run_shorten(_args(str(src), "-o", str(out), "-c", "1"), history=hist, state=OpenState(), _get=get) == 0
+    assert len(get.calls) == 3  # строки 4..6
+    assert sorted(r["line"] for r in _rows(out)) == [1, 2, 3, 4, 5, 6]
+    stored = sorted(rec.long_url for b in hist.batches for rec in b)
+    # строки 2-3 не успели в историю до «падения» — дописаны при восстановлении
+    assert stored == [f"https://example.com/{i}" for i in (2, 3, 4, 5, 6)]
+
+
+def test_resume_after_kill_stores_each_row_in_history_once(tmp_path, monkeypatch):
+    class Killed(BaseException):
+        pass
+
+    src = _input(tmp_path, 10)
+    out = tmp_path / "out.jsonl"
+    hist = FakeHistory()
+    monkeypatch.setattr(cli, "CHECKPOINT_EVERY", 4)  # не кратно --history-batch
+    real_save, saves = cli._BulkJob.save, []
+
+    def dying_save(job, out_stream):
+        saves.append(1)
+        if len(saves) >= 2:
+            out_stream.flush()
+            raise Killed  # «kill -9» между сохранениями: ни истории, ни чекпоинта
+        real_save(job, out_stream)
+
+    monkeypatch.setattr(cli._BulkJob, "save", dying_save)
+    with pytest.raises(Killed):
+        run_shorten(
+            _args(str(src), "-o", str(out), "-c", "1", "--history-batch", "3"),
+            history=hist,
+            state=OpenState(),
+            _get=CountingGet(),
+        )
+    monkeypatch.setattr(cli._BulkJob, "save", real_save)
+
+    code = run_shorten(
+        _args(str(src), "-o", str(out), "-c", "1", "--history-batch", "3"),
+        history=hist,
+        state=OpenState(),
+        _get=CountingGet(),
+    )
+    assert code == 0
+    stored = sorted(rec.long_url for b in hist.batches for rec in b)
+    assert stored == sorted(f"https://example.com/{i}" for i in range(1, 11))  # ни дублей, ни потерь
+
+
+def test_checkpoint_of_other_input_is_refused(tmp_path):
+    src = _input(tmp_path, 1)
+    out = tmp_path / "out.jsonl"
+    Checkpoint(input="other.txt").save(tmp_path / "out.jsonl.ckpt")
+    assert run_shorten(_args(str(src), "-o", str(out), "--no-history"), state=OpenState(), _get=CountingGet()) == 2
+
+
+def test_gate_waits_for_circuit_and_rate_limit():
+    class FlakyState(OpenState):
+        def __init__(self):
+            super().__init__()
+            self.blocked = [True, False]
+            self.allow = [False, True]
+
+        def circuit_blocked(self):
+            return self.blocked.pop(0) if self.blocked else False
+
+        def cooldown_left(self):
+            return 3
+
+        def rate_limit_allow(self, logger):
+            return self.allow.pop(0) if self.allow else True
+
+    slept = []
+    items = list(cli._gated([(1, "u")], FlakyState(), cli.log, sleep=slept.append))
+    assert items == [(1, "u")]
+    assert slept == [3, 1.0]
+
+
+def test_gate_holds_the_half_open_probe_slot_until_the_outcome():
+    clock = [0.0]
+    engine = AppState(RateLimiter(default=None), CircuitBreaker(threshold=1, cooldown=10, clock=lambda: clock[0]))
+    engine.record_failure()
+    clock[0] = 10.0  # полуоткрыт: один пробный вызов
+
+    slept = []
+
+    def sleep(d):
+        slept.append(d)
+        engine.record_success()  # проба удалась, пока вторая строка ждала
+
+    gate = cli._gated([(1, "a"), (2, "b")], engine, cli.log, sleep=sleep)
+    assert next(gate) == (1, "a")
+    assert slept == []
+    assert next(gate) == (2, "b")  # вторая — только после исхода первой
+    assert slept == [1]
+
+
+def test_checkpoint_watermark_compacts():
+    c = Checkpoint(input="x")
+    for line in (3, 1, 4):
+        c.mark(line)
+    assert (c.watermark, c.done) == (2, {3, 4})
+    c.mark(2)
+    assert (c.watermark, c.done) == (5, set())
+    assert c.is_done(4) and not c.is_done(5)
+
+
+@pytest.mark.parametrize(
+    ("argv", "code"),
+    [
+        (["quota"], 0),
+        (["alias", "my-alias"], 0),
+        (["stats", "http://127.0.0.1:8080/abc"], 1),  # 1 — ссылки нет, но и падения нет
+        (["snapshot"], 0),
+    ],
+)
+def test_cli_migrates_fresh_data_dir(tmp_path, argv, code):
+    # отдельный процесс: движок БД привязывается к каталогу данных при импорте
+    env = {**os.environ, "URLCUTTER_DATA_DIR": str(tmp_path / "data")}
+    proc = subprocess.run(
+        [sys.executable, "-m", "urlcutter", *argv],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=False,
+    )
+    assert proc.returncode == code, proc.stderr
+    assert "no such table" not in proc.stderr
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from urlcutter.clicks import ClickCounter
+
+
+class Sink:
+    def __init__(self, fail=0):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, deltas):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("db is locked")
+        self.calls.append(dict(deltas))
+
+
+def test_flush_aggregates_per_link_deltas_into_one_call():
+    sink = Sink()
+    c = ClickCounter(sink, capacity=4)  # кольцо переполнится несколько раз
+    for u in ["a", "b", "a", "a", "c", "b", "a", "a", "a"]:
+        c.record(u)
+    assert c.pending() == 9
+    assert c.flush() == 9
+    assert sink.calls == [{"a": 6, "b": 2, "c": 1}]
+    assert c.flush() == 0  # пусто — в хранилище не ходим
+    assert len(sink.calls) == 1
+    assert c.snapshot().flushed == 9
+
+
+def test_failed_flush_keeps_deltas_for_next_try():
+    sink = Sink(fail=1)
+    c = ClickCounter(sink)
+    c.record("a")
+    c.record("a")
+    assert c.flush() == 0
+    c.record("b")
+    assert c.flush() == 3
+    assert sink.calls == [{"a": 2, "b": 1}]
+    st = c.snapshot()
+    assert (st.failures, st.flushes, st.pending) == (1, 1, 0)
+
+
+def test_background_flusher_and_graceful_close():
+    sink = Sink()
+    with ClickCounter(sink, flush_interval=0.05) as c:
+        c.record("a")
+        deadline = time.monotonic() + 2
+        while not sink.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sink.calls == [{"a": 1}]
+        c.record("b")
+        c.record("b")
+    # выход из with == close(): остаток дописан
+    assert sink.calls[-1] == {"b": 2}
+    assert c.pending() == 0
+
+
+def test_max_unflushed_wakes_flusher_early():
+    sink = Sink()
+    c = ClickCounter(sink, flush_interval=60, max_unflushed=10).start()
+    try:
+        for _ in range(10):
+            c.record("hot")
+        deadline = time.monotonic() + 2
+        while not sink.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sink.calls == [{"hot": 10}]
+    finally:
+        c.close()
+
+
+def test_concurrent_records_are_not_lost():
+    sink = Sink()
+    c = ClickCounter(sink, capacity=64, flush_interval=0.01).start()
+
+    def burst():
+        for i in range(2000):
+            c.record(f"l{i % 7}")
+
+    threads = [threading.Thread(target=burst) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    c.close()
+    total = sum(n for call in sink.calls for n in call.values())
+    assert total == 8000
+    assert len(sink.calls) < 8000  # пачками, а не по транзакции на клик
+
+
+def test_invalid_config():
+    with pytest.raises(ValueError):
+        ClickCounter(Sink(), capacity=0)
+    with pytest.raises(ValueError):
+        ClickCounter(Sink(), flush_interval=0)
+
+
+def test_default_sink_writes_click_counts(db_session):
+    from urlcutter.db.models import Link
+    from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+    from urlcutter.db.repo.schemas import LinkRecord
+
+    stored = SqlAlchemyHistoryService().add(LinkRecord(None, "https://e.com/x", "http://s.rt/x", "local", None))
+    c = ClickCounter()
+    for _ in range(3):
+        c.record("http://s.rt/x")
+    c.close()
+    db_session.expire_all()
+    assert db_session.get(Link, stored.id).click_count == 3
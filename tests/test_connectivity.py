@@ -0,0 +1,154 @@
+import logging
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+from urlcutter.connectivity import ConnectivityMonitor, get_connectivity_monitor, is_network_error
+from urlcutter.protection import ProtectionEngine, internet_ok
+from urlcutter.retry import ProviderUnavailable
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("test.connectivity")
+
+
+@pytest.fixture
+def closed_url():
+    # порт, который только что освободили: соединение будет отвергнуто
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/generate_204"
+
+
+def test_probe_against_local_stand_in(probe_server, closed_url):
+    assert ConnectivityMonitor(probe_server.url).probe().online
+
+    probe_server.status = 503
+    verdict = ConnectivityMonitor(probe_server.url).probe()
+    assert not verdict.online and "503" in verdict.error
+
+    verdict = ConnectivityMonitor(closed_url, timeout=0.5).probe()
+    assert not verdict.online and "ConnectionError" in verdict.error
+
+
+def test_is_online_is_optimistic_and_refreshes_in_background(closed_url):
+    monitor = ConnectivityMonitor(closed_url, timeout=0.5)
+    try:
+        assert monitor.is_online() is True  # вердикта ещё нет — не блокируем
+        assert monitor.wait(timeout=5, probes=0).online is False
+        assert monitor.is_online() is False
+    finally:
+        monitor.stop(timeout=1)
+
+
+def test_verdict_is_cached_for_ttl_then_reprobed():
+    clock = Clock()
+    calls = []
+    monitor = ConnectivityMonitor("http://probe.test", ttl=30, down_ttl=5, probe=lambda: calls.append(1), clock=clock)
+    try:
+        monitor.probe()
+        for _ in range(100):
+            assert monitor.is_online()
+        assert len(calls) == 1
+
+        clock.now += 31
+        assert monitor.is_online()  # устаревший ответ отдаётся сразу, проба уходит в фон
+        assert monitor.wait(timeout=5, probes=1) is not None
+        assert len(calls) == 2
+    finally:
+        monitor.stop(timeout=1)
+
+
+def test_invalidate_reprobes_now_and_offline_verdict_expires_sooner():
+    clock = Clock()
+    up = threading.Event()
+    up.set()
+
+    def probe():
+        if not up.is_set():
+            raise requests.ConnectionError("no route")
+
+    monitor = ConnectivityMonitor("http://probe.test", ttl=30, down_ttl=5, probe=probe, clock=clock)
+    try:
+        monitor.probe()
+        up.clear()
+        monitor.invalidate()  # вызов упал по сети — не ждём 30 с
+        assert monitor.wait(timeout=5, probes=1).online is False
+        assert monitor.is_online() is False
+
+        up.set()
+        clock.now += 6  # офлайн-вердикт живёт down_ttl
+        monitor.is_online()
+        assert monitor.wait(timeout=5, probes=2).online is True
+    finally:
+        monitor.stop(timeout=1)
+
+
+def test_internet_ok_answers_from_cache_without_blocking(logger):
+    release = threading.Event()
+    monitor = ConnectivityMonitor("http://probe.test", probe=lambda: release.wait(5))
+    try:
+        t0 = time.perf_counter()
+        assert internet_ok(logger, engine=ProtectionEngine(), monitor=monitor) is True
+        assert time.perf_counter() - t0 < 0.5  # медленная проба не держит вызывающего
+    finally:
+        release.set()
+        monitor.stop(timeout=1)
+
+
+def test_internet_ok_false_when_shared_monitor_is_offline(logger, probe_server, caplog):
+    monitor = get_connectivity_monitor()
+    assert monitor.url == probe_server.url
+    probe_server.status = 503
+    monitor.probe()
+    with caplog.at_level(logging.WARNING):
+        assert internet_ok(logger) is False
+    assert "offline: skip network" in caplog.text
+
+    probe_server.status = 204
+    monitor.probe()
+    assert internet_ok(logger) is True
+
+
+def test_empty_url_disables_probing():
+    monitor = ConnectivityMonitor("", probe=lambda: pytest.fail("must not probe"))
+    assert monitor.is_online()
+    monitor.invalidate()
+    monitor.start()
+    assert monitor.probes == 0
+
+
+def _wrapped(outer, cause):
+    try:
+        raise outer from cause
+    except type(outer) as e:
+        return e
+
+
+def test_is_network_error():
+    assert is_network_error(requests.ConnectionError("refused"))
+    assert is_network_error(requests.ConnectTimeout())
+    assert is_network_error(ConnectionResetError())
+    assert is_network_error(_wrapped(RuntimeError("tinyurl request failed"), requests.ConnectionError("refused")))
+    assert is_network_error(_wrapped(TimeoutError("tinyurl request timed out"), requests.ConnectTimeout()))
+    # соединение было — сеть ни при чём
+    assert not is_network_error(TimeoutError())
+    assert not is_network_error(requests.ReadTimeout())
+    assert not is_network_error(_wrapped(TimeoutError("tinyurl request timed out"), requests.ReadTimeout()))
+    assert not is_network_error(requests.TooManyRedirects())
+    assert not is_network_error(requests.HTTPError("500"))
+    assert not is_network_error(ProviderUnavailable("503", status_code=503))
+    assert not is_network_error(ValueError("bad url"))
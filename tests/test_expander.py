@@ -0,0 +1,120 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+from urlcutter.db.repo.schemas import LinkRecord
+from urlcutter.expander import expand_many, expand_url
+from urlcutter.http_client import ProviderClient
+from urlcutter.retry import ProviderError
+from urlcutter.shorteners import ResultCache
+
+
+class _RedirectHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, status, location=None):
+        self.server.hits.append((self.command, self.path))
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path.startswith("/nohead/"):
+            self._send(405)
+        else:
+            self._route()
+
+    def do_GET(self):
+        self._route()
+
+    def _route(self):
+        if self.path.startswith(("/r/", "/nohead/")):
+            self._send(301, "https://target.example/" + self.path.rsplit("/", 1)[-1])
+        elif self.path == "/chain":
+            self._send(302, "/r/final")  # относительный Location
+        elif self.path == "/ok":
+            self._send(200)
+        else:
+            self._send(404)
+
+
+@pytest.fixture
+def stand_in():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _RedirectHandler)
+    srv.daemon_threads = True
+    srv.hits = []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    yield base, srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client():
+    c = ProviderClient()
+    yield c
+    c.close()
+
+
+def test_expand_url_head_redirect(stand_in, client):
+    base, srv = stand_in
+    assert expand_url(f"{base}/r/abc", client=client) == ("https://target.example/abc", 301)
+    assert srv.hits == [("HEAD", "/r/abc")]
+
+
+def test_expand_url_falls_back_to_get(stand_in, client):
+    base, srv = stand_in
+    assert expand_url(f"{base}/nohead/x", client=client)[0] == "https://target.example/x"
+    assert [m for m, _ in srv.hits] == ["HEAD", "GET"]
+
+
+def test_expand_url_hops_and_errors(stand_in, client):
+    base, _ = stand_in
+    assert expand_url(f"{base}/chain", client=client) == (f"{base}/r/final", 302)
+    assert expand_url(f"{base}/chain", max_hops=2, client=client)[0] == "https://target.example/final"
+    with pytest.raises(ValueError):
+        expand_url(f"{base}/ok", client=client)
+    with pytest.raises(ProviderError):
+        expand_url(f"{base}/missing", client=client)
+    with pytest.raises(ValueError):
+        expand_url("not a url", client=client)
+
+
+def test_expand_many_tiers_and_order(stand_in, client):
+    base, srv = stand_in
+    SqlAlchemyHistoryService().add(LinkRecord(None, "https://mine.example/page", f"{base}/r/mine", "tinyurl", None))
+    cache = ResultCache()
+    cache.put("expand", f"{base}/r/cached", "https://cached.example/")
+    urls = [f"{base}/r/mine", f"{base}/r/cached", f"{base}/r/one", f"{base}/missing", f"{base}/r/one"]
+
+    res = list(expand_many(urls, max_concurrency=4, cache=cache, client=client))
+
+    assert [r.index for r in res] == [0, 1, 2, 3, 4]
+    assert [r.source for r in res] == ["history", "cache", "remote", None, "remote"]
+    assert res[0].long_url == "https://mine.example/page"
+    assert res[2].long_url == "https://target.example/one"
+    assert not res[3].ok
+    # из БД и кэша — без сети
+    assert not any(p in ("/r/mine", "/r/cached") for _, p in srv.hits)
+
+    again = list(expand_many([f"{base}/r/one"], cache=cache, client=client))
+    assert again[0].source == "cache"
+
+
+def test_expand_many_survives_history_errors(stand_in, client):
+    base, _ = stand_in
+
+    class BrokenHistory:
+        def find_long_urls(self, urls):
+            raise RuntimeError("db down")
+
+    res = list(expand_many([f"{base}/r/z"], history=BrokenHistory(), cache=ResultCache(), client=client))
+    assert res[0].long_url == "https://target.example/z"
@@ -0,0 +1,213 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+from urlcutter import shorteners
+from urlcutter.handlers import Handlers
+from urlcutter.protection import BucketSpec, CircuitBreaker, CircuitState, RateLimiter
+from urlcutter.shorteners import (
+    FunctionProvider,
+    HttpProvider,
+    available_providers,
+    get_provider,
+    register_provider,
+    shorten_with_failover,
+    unregister_provider,
+)
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """/ok/<name>?url=... → короткая ссылка; /fail → 503; /junk → мусор."""
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path.startswith("/ok/"):
+            code, body = 200, f"https://{path[4:]}.local/abc"
+        elif path == "/junk":
+            code, body = 200, "NOT_A_URL"
+        else:
+            code, body = 503, "unavailable"
+        data = body.encode()
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *a):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    names = []
+
+    def add(name, path):
+        register_provider(HttpProvider(name, f"{base}{path}?url="), replace=True)
+        names.append(name)
+        return name
+
+    yield add
+    for n in names:
+        unregister_provider(n)
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_builtin_providers_registered():
+    assert {"tinyurl", "isgd", "dagd", "clckru"} <= set(available_providers())
+    assert get_provider("isgd").endpoint.startswith("https://is.gd/")
+
+
+def test_duplicate_registration_rejected():
+    with pytest.raises(ValueError):
+        register_provider(FunctionProvider("tinyurl", lambda u, t: u))
+
+
+def test_unknown_provider():
+    with pytest.raises(KeyError):
+        get_provider("nope")
+
+
+def test_http_provider_against_stand_in(stand_in):
+    stand_in("alpha", "/ok/alpha")
+    assert get_provider("alpha").shorten("https://example.com", 1.0) == "https://alpha.local/abc"
+
+
+def test_failover_skips_broken_providers(stand_in):
+    chain = (stand_in("down", "/fail"), stand_in("junk", "/junk"), stand_in("beta", "/ok/beta"))
+    out = shorten_with_failover("https://example.com", 1.0, chain=chain)
+    assert out.short_url == "https://beta.local/abc"
+    assert out.provider == "beta"
+    assert [name for name, _ in out.failures] == ["down", "junk"]
+
+
+def test_failover_reraises_last_error(stand_in):
+    chain = (stand_in("down", "/fail"), stand_in("junk", "/junk"))
+    with pytest.raises(ValueError) as ei:
+        shorten_with_failover("https://example.com", 1.0, chain=chain)
+    assert any("down" in note for note in ei.value.__notes__)
+
+
+def test_failover_validates_input_first():
+    def boom(url, timeout):
+        raise AssertionError("must not be called")
+
+    with pytest.raises(ValueError):
+        shorten_with_failover("ftp://bad", chain=("x",), overrides={"x": boom})
+
+
+def test_failover_overrides_take_precedence():
+    out = shorten_with_failover(
+        "https://example.com", chain=("tinyurl",), overrides={"tinyurl": lambda u, t: "https://tiny.one/o"}
+    )
+    assert out.provider == "tinyurl" and out.short_url == "https://tiny.one/o"
+
+
+class _Page:
+    def __init__(self):
+        self.overlay = []
+        self.cursor = None
+
+    def update(self):
+        pass
+
+
+class _Field:
+    def __init__(self, value=""):
+        self.value = value
+        self.disabled = False
+
+
+class _State:
+    def circuit_blocked(self):
+        return False
+
+    def rate_limit_allow(self, logger):
+        return True
+
+    def record_success(self):
+        pass
+
+    def record_failure(self):
+        pass
+
+
+def test_handler_records_serving_provider(monkeypatch, stand_in):
+    import logging
+
+    chain = ("tinyurl", stand_in("gamma", "/ok/gamma"))
+    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda logger, **_kw: True)
+    monkeypatch.setattr(
+        "urlcutter.handlers.shorten_via_tinyurl", lambda u, t: (_ for _ in ()).throw(RuntimeError("503"))
+    )
+    out = _Field()
+    h = Handlers(_Page(), logging.getLogger("test"), _State(), _Field("https://example.com"), out, _Field(), chain)
+    stored = {}
+
+    def fake_add(rec):
+        stored["service"] = rec.service
+        return type("S", (), {"id": 7})()
+
+    monkeypatch.setattr(h.history, "add", fake_add)
+    h.on_shorten(None)
+    assert out.value == "https://gamma.local/abc"
+    assert stored["service"] == "gamma"
+
+
+def test_default_chain_is_tinyurl_only():
+    assert shorteners.DEFAULT_PROVIDER_CHAIN[0] == "tinyurl"
+    h = Handlers(_Page(), None, None, None, None, None)
+    assert h.providers == ("tinyurl",)
+
+
+def test_failover_skips_provider_with_empty_bucket():
+    limiter = RateLimiter({"isgd": BucketSpec(burst=1, rate=0.0)}, default=None)
+    overrides = {"isgd": lambda u, t: "https://is.gd/a", "tinyurl": lambda u, t: "https://tiny.one/a"}
+    first = shorten_with_failover(
+        "https://example.com", chain=("isgd", "tinyurl"), overrides=overrides, limiter=limiter
+    )
+    second = shorten_with_failover(
+        "https://example.com", chain=("isgd", "tinyurl"), overrides=overrides, limiter=limiter
+    )
+    assert (first.provider, second.provider) == ("isgd", "tinyurl")
+    assert "local rate limit" in second.failures[0][1]
+
+
+def test_failover_releases_probe_slot_when_rate_limit_refuses():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure("isgd")
+    now[0] = 11.0  # полуоткрыт: один пробный слот
+    limiter = RateLimiter({"isgd": BucketSpec(burst=1, rate=0.0)}, default=None)
+    assert limiter.allow("isgd")  # ведро пустое
+    overrides = {"isgd": lambda u, t: "https://is.gd/a", "tinyurl": lambda u, t: "https://tiny.one/a"}
+    out = shorten_with_failover(
+        "https://example.com", chain=("isgd", "tinyurl"), overrides=overrides, limiter=limiter, breaker=breaker
+    )
+    assert out.provider == "tinyurl" and "local rate limit" in out.failures[0][1]
+    assert breaker.try_acquire("isgd")  # слот не утёк вместе с отказом лимита
+
+
+def test_failover_isolates_providers_with_per_provider_breakers():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    calls = []
+
+    def down(u, t):
+        calls.append("isgd")
+        raise RuntimeError("503")
+
+    overrides = {"isgd": down, "tinyurl": lambda u, t: calls.append("tinyurl") or "https://tiny.one/a"}
+    for _ in range(3):
+        out = shorten_with_failover(
+            "https://example.com", chain=("isgd", "tinyurl"), overrides=overrides, breaker=breaker
+        )
+        assert out.provider == "tinyurl"
+    assert calls == ["isgd", "tinyurl", "tinyurl", "tinyurl"]  # больной isgd после первой ошибки не трогаем
+    assert breaker.state("isgd") is CircuitState.OPEN
+    assert breaker.state("tinyurl") is CircuitState.CLOSED
+    assert "CircuitOpen" in out.failures[0][1]
@@ -189,7 +189,7 @@ def test_on_shorten_no_internet(monkeypatch):
     state = FakeState()
 
     # патчим internet_ok → False
-    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda logger: False)
+    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda logger, **_kw: False)
 
     h = Handlers(page, FakeLogger(), state, field_in, field_out, FakeField())
     h.on_shorten(None)
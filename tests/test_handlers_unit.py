@@ -1,9 +1,12 @@
 import types
 
 import pytest
+import requests
 
 import urlcutter.handlers as H
 from urlcutter.handlers import Handlers
+from urlcutter.protection import CircuitBreaker, CircuitState, ProtectionEngine, RateLimiter, internet_ok
+from urlcutter.retry import RetryPolicy
 
 
 class FakeState:
@@ -109,7 +112,7 @@ class MockPyperclip:
 
 def make_handlers(monkeypatch, *, net_ok=True, short_value="https://tinyurl.com/x", mock_validation=False):
     # подменим функции внутри модуля handlers
-    monkeypatch.setattr(H, "internet_ok", lambda _logger: net_ok, raising=False)
+    monkeypatch.setattr(H, "internet_ok", lambda _logger, **_kw: net_ok, raising=False)
     monkeypatch.setattr(H, "shorten_via_tinyurl", lambda url, timeout=None: short_value, raising=False)
 
     # Создаем mock для pyperclip
@@ -283,7 +286,7 @@ def test_on_shorten_rate_limited(monkeypatch):
 
 def test_on_shorten_provider_error(monkeypatch):
     # internet_ok True, но провайдер падает
-    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda _lg: True, raising=False)
+    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda _lg, **_kw: True, raising=False)
 
     def boom(url, timeout=None):
         raise RuntimeError("provider down")
@@ -297,3 +300,125 @@ def test_on_shorten_provider_error(monkeypatch):
     h.on_shorten(None)
     # Никаких исключений, кнопка вернулась, значения не перезаписаны «мусором»
     assert btn.disabled is False
+
+
+def test_on_shorten_network_error_invalidates_connectivity(monkeypatch, fresh_connectivity_monitor):
+    invalidated = []
+    monkeypatch.setattr(fresh_connectivity_monitor, "invalidate", lambda: invalidated.append(1))
+    h, page, url_inp, short_out, btn, _ = make_handlers(monkeypatch)
+
+    def refused(url, timeout=None):
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr("urlcutter.handlers.shorten_via_tinyurl", refused, raising=False)
+    h.toast = lambda *_a, **_k: None
+    url_inp.value = "https://example.com/offline"
+    h.on_shorten(None)
+    assert invalidated  # монитор перепроверит сеть, не дожидаясь TTL
+    assert btn.disabled is False
+
+
+def test_on_shorten_read_timeout_keeps_connectivity_verdict(monkeypatch, fresh_connectivity_monitor):
+    invalidated = []
+    monkeypatch.setattr(fresh_connectivity_monitor, "invalidate", lambda: invalidated.append(1))
+    h, page, url_inp, short_out, btn, _ = make_handlers(monkeypatch)
+    h.retry = RetryPolicy(max_attempts=1)
+
+    def slow(url, timeout=None):
+        raise TimeoutError("tinyurl request timed out") from requests.ReadTimeout("read timed out")
+
+    monkeypatch.setattr("urlcutter.handlers.shorten_via_tinyurl", slow, raising=False)
+    h.toast = lambda *_a, **_k: None
+    h.on_shorten(None)
+    assert invalidated == []  # соединение было — медленный провайдер, а не пропавшая сеть
+
+
+def test_on_shorten_coalesces_on_normalized_fingerprint(monkeypatch):
+    keys = []
+
+    class RecordingFlight:
+        def do(self, key, fn, *args, **kwargs):
+            keys.append(key)
+            return fn(*args, **kwargs)
+
+    monkeypatch.setattr(H, "get_single_flight", lambda: RecordingFlight())
+    h, page, url_inp, short_out, btn, _ = make_handlers(monkeypatch)
+    h.toast = lambda *_a, **_k: None
+    for url in ("https://Example.com/a", "HTTPS://example.com:443/a#frag"):
+        url_inp.value = url
+        h.cache = H.ResultCache()  # без кэша — каждый клик доходит до single-flight
+        h.on_shorten(None)
+    assert len(keys) == 2 and keys[0] == keys[1]
+    assert keys[0][2] == H._url_fingerprint("https://example.com/a")
+
+
+def _engine_state(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=clock)
+    return ProtectionEngine(RateLimiter(default=None), breaker)
+
+
+def test_on_shorten_takes_global_probe_slot_when_half_open(monkeypatch):
+    now = [0.0]
+    h, page, url_inp, short_out, btn, _ = make_handlers(monkeypatch)
+    h.state = _engine_state(lambda: now[0])
+    h.toast = lambda *_a, **_k: None
+    h.state.record_failure()  # «*» открыт
+    now[0] = 11.0  # полуоткрыт
+    seen = []
+
+    def shorten(url, timeout=None):
+        seen.append(h.state.circuit_blocked())  # пока идёт пробный вызов, другие клики не проходят
+        return "https://tinyurl.com/probe"
+
+    monkeypatch.setattr(H, "shorten_via_tinyurl", shorten, raising=False)
+    h.on_shorten(None)
+    assert seen == [True]
+    assert short_out.value == "https://tinyurl.com/probe"
+    assert h.state.breaker.state() is CircuitState.CLOSED
+
+
+def test_half_open_probe_reaches_the_provider_through_real_internet_ok(monkeypatch):
+    now = [0.0]
+    h, page, url_inp, short_out, btn, _ = make_handlers(monkeypatch)
+    h.state = _engine_state(lambda: now[0])
+    monkeypatch.setattr("urlcutter.protection._engine", h.state)  # internet_ok смотрит общий движок
+    monkeypatch.setattr(H, "internet_ok", internet_ok)  # без заглушки make_handlers
+    h.toast = lambda *_a, **_k: None
+    h.state.record_failure()
+    now[0] = 11.0  # полуоткрыт, пробный слот один
+    called = []
+
+    def shorten(url, timeout=None):
+        called.append(url)
+        return "https://tinyurl.com/probe"
+
+    monkeypatch.setattr(H, "shorten_via_tinyurl", shorten, raising=False)
+    h.on_shorten(None)
+    assert len(called) == 1  # свой же слот не принят за «занято» — проба дошла до провайдера
+    assert short_out.value == "https://tinyurl.com/probe"
+    assert h.state.breaker.state() is CircuitState.CLOSED
+
+
+def test_on_shorten_does_not_count_global_failure_when_every_provider_was_skipped(monkeypatch):
+    now = [0.0]
+    h, page, url_inp, short_out, btn, _ = make_handlers(monkeypatch)
+    h.state = _engine_state(lambda: now[0])
+    h.retry = RetryPolicy(max_attempts=1)
+    toasts = []
+    h.toast = lambda msg, *_a, **_k: toasts.append(msg)
+    h.state.record_failure("tinyurl")  # открыт только у провайдера
+    called = []
+    monkeypatch.setattr(H, "shorten_via_tinyurl", lambda url, timeout=None: called.append(url), raising=False)
+
+    h.on_shorten(None)
+    assert called == [] and toasts  # вызова не было, пользователю сказали об ошибке
+    assert h.state.breaker.state() is CircuitState.CLOSED  # «*» не сработал от локального отказа
+
+    def down(url, timeout=None):
+        raise RuntimeError("503")
+
+    monkeypatch.setattr(H, "shorten_via_tinyurl", down, raising=False)
+    now[0] = 11.0  # tinyurl полуоткрыт — вызов состоится и упадёт
+    url_inp.value = "https://example.com/other"
+    h.on_shorten(None)
+    assert h.state.breaker.state() is CircuitState.OPEN
@@ -0,0 +1,236 @@
+import threading
+import time
+
+import pytest
+
+from urlcutter.hedging import Hedger
+from urlcutter.protection import BucketSpec, CircuitBreaker, CircuitState, RateLimiter
+from urlcutter.provider_executor import ProviderExecutor
+from urlcutter.shorteners import shorten_with_failover
+
+
+def _fixed(result, delay=0.0):
+    def fn(url, timeout):
+        time.sleep(delay)
+        return result
+
+    return fn
+
+
+def _failing(delay=0.0, msg="503"):
+    def fn(url, timeout):
+        time.sleep(delay)
+        raise RuntimeError(msg)
+
+    return fn
+
+
+@pytest.fixture
+def hedger():
+    return Hedger(executor=ProviderExecutor(max_workers=4), default_delay=0.05)
+
+
+def test_fast_primary_no_hedge(hedger):
+    out = hedger.race("u", 1.0, ("a", _fixed("https://a/1")), ("b", _fixed("https://b/1")))
+    assert out == ("https://a/1", "a")
+    st = hedger.stats()
+    assert st.requests == 1 and st.hedged == 0 and st.primary_wins == 1
+
+
+def test_slow_primary_is_hedged_and_hedge_wins(hedger):
+    out = hedger.race("u", 2.0, ("a", _fixed("https://a/1", delay=0.4)), ("b", _fixed("https://b/1")))
+    assert out == ("https://b/1", "b")
+    st = hedger.stats()
+    assert st.hedged == 1 and st.hedge_wins == 1
+    assert st.hedge_rate == 1.0 and st.win_rate == 1.0
+    # экономия засчитывается, когда primary всё же ответит
+    deadline = time.monotonic() + 2
+    while hedger.stats().saved_seconds == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert hedger.stats().saved_seconds > 0.2
+
+
+def test_primary_can_still_win_after_hedge(hedger):
+    out = hedger.race("u", 2.0, ("a", _fixed("https://a/1", delay=0.1)), ("b", _fixed("https://b/1", delay=1.0)))
+    assert out == ("https://a/1", "a")
+    st = hedger.stats()
+    assert st.hedged == 1 and st.hedge_wins == 0 and st.primary_wins == 1
+
+
+def test_fast_primary_failure_falls_over_without_hedge(hedger):
+    out = hedger.race("u", 1.0, ("a", _failing()), ("b", _fixed("https://b/1")))
+    assert out == ("https://b/1", "b")
+    assert hedger.stats().hedged == 0
+
+
+def test_both_fail_raises_last_error(hedger):
+    with pytest.raises(RuntimeError):
+        hedger.race("u", 1.0, ("a", _failing(delay=0.1)), ("b", _failing(msg="429")))
+
+
+def test_neither_answers_in_time(hedger):
+    gate = threading.Event()
+
+    def hang(url, timeout):
+        gate.wait(5)
+        return "https://late/1"
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        hedger.race("u", 0.2, ("a", hang), ("b", hang))
+    assert time.monotonic() - started < 1.0
+    gate.set()
+
+
+def test_running_loser_is_abandoned_and_frees_the_pool():
+    ex = ProviderExecutor(max_workers=2)
+    hedger = Hedger(executor=ex, default_delay=0.05)
+    release = threading.Event()
+
+    def stuck(url, timeout):
+        release.wait(5)
+        return "https://a/late"
+
+    try:
+        assert hedger.race("u", 2.0, ("a", stuck), ("b", _fixed("https://b/1"))) == ("https://b/1", "b")
+        g = ex.gauges()
+        assert g.orphaned == 1 and g.abandoned_total == 1
+        # проигравший всё ещё висит, но пул добирает воркер взамен: два вызова идут параллельно
+        barrier = threading.Barrier(2, timeout=2)
+        futs = [ex.submit(barrier.wait) for _ in range(2)]
+        assert sorted(f.result(timeout=3) for f in futs) == [0, 1]
+    finally:
+        release.set()
+    deadline = time.monotonic() + 2
+    while ex.gauges().orphaned and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ex.gauges().orphaned == 0
+
+
+def test_hedge_delay_tracks_p95():
+    h = Hedger(default_delay=1.0, min_delay=0.01, max_delay=5.0)
+    assert h.hedge_delay("a") == 1.0  # мало данных
+    for i in range(100):
+        h.observe("a", 0.1 if i < 90 else 0.5)
+    assert h.hedge_delay("a") == pytest.approx(0.5, rel=0.2)
+
+
+def test_failover_uses_hedger_for_first_two(hedger):
+    out = shorten_with_failover(
+        "https://example.com",
+        2.0,
+        chain=("a", "b", "c"),
+        overrides={"a": _failing(), "b": _failing(), "c": _fixed("https://c/1")},
+        hedger=hedger,
+    )
+    assert out.provider == "c"
+    assert out.failures[0][0] == "a+b"
+
+
+def test_race_asks_admit_only_when_secondary_launches(hedger):
+    asked, reported = [], []
+    out = hedger.race(
+        "u",
+        1.0,
+        ("a", _fixed("https://a/1")),
+        ("b", _fixed("https://b/1")),
+        admit=asked.append,
+        report=lambda name, ok: reported.append((name, ok)),
+    )
+    assert out == ("https://a/1", "a")
+    assert asked == [] and reported == [("a", True)]
+
+
+def test_race_without_admitted_secondary_waits_for_primary(hedger):
+    reported = []
+    out = hedger.race(
+        "u",
+        2.0,
+        ("a", _fixed("https://a/1", delay=0.2)),
+        ("b", _failing()),
+        admit=lambda name: False,
+        report=lambda name, ok: reported.append((name, ok)),
+    )
+    assert out == ("https://a/1", "a")
+    assert reported == [("a", True)] and hedger.stats().hedged == 0
+
+
+def test_race_reports_loser_as_unknown(hedger):
+    reported = []
+    out = hedger.race(
+        "u",
+        2.0,
+        ("a", _fixed("https://a/1", delay=0.4)),
+        ("b", _fixed("https://b/1")),
+        report=lambda name, ok: reported.append((name, ok)),
+    )
+    assert out == ("https://b/1", "b")
+    assert sorted(reported) == [("a", None), ("b", True)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _half_open(*names):
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=clock)
+    for name in names:
+        breaker.record_failure(name)
+    clock.now = 11.0
+    return breaker
+
+
+def test_failover_charges_secondary_only_when_hedge_fires(hedger):
+    limiter = RateLimiter({"b": BucketSpec(1, 0.0)}, default=None)
+    breaker = _half_open("a", "b")
+    out = shorten_with_failover(
+        "https://example.com",
+        2.0,
+        chain=("a", "b"),
+        overrides={"a": _fixed("https://a/1"), "b": _fixed("https://b/1")},
+        hedger=hedger,
+        limiter=limiter,
+        breaker=breaker,
+    )
+    assert out.provider == "a"
+    assert limiter.peek("b") == 1  # токен второго не тронут
+    assert breaker.stats("b").probes == 0 and breaker.state("b") is CircuitState.HALF_OPEN
+    assert breaker.state("a") is CircuitState.CLOSED
+
+
+def test_failover_releases_losers_probe_and_records_only_who_ran(hedger):
+    breaker = _half_open("a", "b")
+    out = shorten_with_failover(
+        "https://example.com",
+        2.0,
+        chain=("a", "b"),
+        overrides={"a": _fixed("https://a/1", delay=0.4), "b": _fixed("https://b/1")},
+        hedger=hedger,
+        breaker=breaker,
+    )
+    assert out.provider == "b"
+    assert breaker.state("b") is CircuitState.CLOSED
+    # проигравший остаётся полуоткрытым, но его пробный слот свободен
+    assert breaker.state("a") is CircuitState.HALF_OPEN and breaker.try_acquire("a")
+
+
+def test_failover_records_failure_only_for_providers_that_ran(hedger):
+    breaker = CircuitBreaker(threshold=2, cooldown=10, clock=Clock())
+    breaker.record_failure("b")
+    breaker.record_failure("b")  # у второго цепь открыта — в гонку его не пустят
+    with pytest.raises(RuntimeError):
+        shorten_with_failover(
+            "https://example.com",
+            1.0,
+            chain=("a", "b"),
+            overrides={"a": _failing(), "b": _fixed("https://b/1")},
+            hedger=hedger,
+            breaker=breaker,
+        )
+    assert breaker.stats("a").failures == 1
+    assert breaker.stats("b").trips == 1  # открыт той же, первой поездкой: лишней ошибки нет
@@ -2,8 +2,10 @@ import csv
 from datetime import UTC, date, datetime
 
 import pytest
+from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 
+from urlcutter.db.models import Link
 from urlcutter.db.repo.errors import NotFoundError, StorageError, ValidationError
 from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService, _utc_boundaries_from_local_dates
 from urlcutter.db.repo.schemas import ExportSpec, HistoryFilters, LinkRecord, PageSpec, SortSpec
@@ -444,3 +446,48 @@ def test_methods_raise_storage_error(monkeypatch, method, args):
 
     with pytest.raises(StorageError):
         getattr(svc, method)(*args)
+
+
+def test_add_many_single_transaction(db_session):
+    svc = SqlAlchemyHistoryService()
+    recs = [LinkRecord(None, f"https://e.com/{i}", f"https://t/{i}", "tinyurl", None) for i in range(3)]
+    assert svc.add_many(recs) == 3
+    assert svc.add_many([]) == 0
+    page = svc.list(HistoryFilters(), SortSpec(), PageSpec(page=1, page_size=10))
+    assert page.total == 3
+
+    with pytest.raises(ValidationError):
+        svc.add_many([LinkRecord(None, "", "x", "s", None)])
+
+
+def test_find_long_urls(db_session):
+    svc = SqlAlchemyHistoryService()
+    svc.add(LinkRecord(None, "https://e.com/a", "https://t/a", "tinyurl", None))
+    svc.add(LinkRecord(None, "https://e.com/b", "https://t/b", "isgd", None))
+    assert svc.find_long_urls(["https://t/a", "https://t/b", "https://t/zzz", ""]) == {
+        "https://t/a": "https://e.com/a",
+        "https://t/b": "https://e.com/b",
+    }
+
+
+def test_find_long_urls_prefers_latest_row_for_reissued_short_url(db_session):
+    svc = SqlAlchemyHistoryService()
+    svc.add(LinkRecord(None, "https://e.com/old", "https://t/a", "local", None))
+    svc.add(LinkRecord(None, "https://e.com/new", "https://t/a", "local", None))
+    assert svc.find_long_urls(["https://t/a"]) == {"https://t/a": "https://e.com/new"}
+
+
+def test_add_clicks_batches_deltas_onto_latest_row(db_session):
+    svc = SqlAlchemyHistoryService()
+    svc.add(LinkRecord(None, "https://e.com/old", "https://t/a", "local", None))
+    latest = svc.add(LinkRecord(None, "https://e.com/a", "https://t/a", "local", None))
+    other = svc.add(LinkRecord(None, "https://e.com/b", "https://t/b", "local", None))
+
+    assert svc.add_clicks({"https://t/a": 3, "https://t/b": 1, "https://t/zzz": 5, "": 1}) == 2
+    assert svc.add_clicks({"https://t/a": 2}) == 1
+    assert svc.add_clicks({}) == 0
+
+    counts = dict(db_session.execute(select(Link.id, Link.click_count)).all())
+    assert counts[latest.id] == 5
+    assert counts[other.id] == 1
+    assert sorted(counts.values()) == [0, 1, 5]
@@ -0,0 +1,45 @@
+import pytest
+
+from urlcutter.hll import HyperLogLog
+
+
+@pytest.mark.parametrize("n", [0, 1, 50, 1000, 20000, 200000])
+def test_estimate_within_error_bounds(n):
+    h = HyperLogLog()
+    h.update(f"visitor-{i}" for i in range(n))
+    h.update(f"visitor-{i}" for i in range(n // 2))  # повторы не считаются
+    assert abs(h.count() - n) <= max(1, 0.05 * n)
+
+
+def test_merge_equals_sketch_of_union():
+    a, b, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(3000):
+        a.add(f"u{i}")
+        both.add(f"u{i}")
+    for i in range(2000, 6000):
+        b.add(f"u{i}")
+        both.add(f"u{i}")
+    merged = HyperLogLog.union([a, b])
+    assert merged == both
+    assert abs(merged.count() - 6000) < 300
+    assert a.merge(a.__class__().merge(a)) == a  # идемпотентно
+
+
+def test_serialization_is_compact_and_roundtrips():
+    h = HyperLogLog()
+    h.update(str(i) for i in range(500))
+    blob = h.to_bytes()
+    assert len(blob) < 4096
+    assert HyperLogLog.from_bytes(blob) == h
+    assert HyperLogLog.from_bytes(HyperLogLog().to_bytes()).is_empty()
+
+
+def test_invalid_inputs():
+    with pytest.raises(ValueError):
+        HyperLogLog(p=3)
+    with pytest.raises(ValueError):
+        HyperLogLog(p=10).merge(HyperLogLog(p=12))
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(b"junk")
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(b"H\x01\x0cnot-zlib")
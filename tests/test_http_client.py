@@ -0,0 +1,107 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from urlcutter import http_client
+from urlcutter.http_client import ProviderClient
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _reply(self, body=b"https://tinyurl.com/local"):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_HEAD(self):
+        self._reply()
+
+    def log_message(self, *a):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_client_reuses_connections(local_server):
+    client = ProviderClient(pool_maxsize=2)
+    for _ in range(5):
+        assert client.get(local_server + "/api-create.php").text == "https://tinyurl.com/local"
+    st = client.stats()
+    assert st.requests == 5
+    assert st.connections_opened == 1
+    assert st.reused == 4
+    client.close()
+
+
+def test_client_warm_opens_connection_before_first_get(local_server):
+    client = ProviderClient()
+    assert client.warm([local_server + "/"]) == 1
+    client.get(local_server + "/x")
+    assert client.stats().connections_opened == 1
+    client.close()
+
+
+def test_client_warm_is_best_effort():
+    client = ProviderClient(timeout=0.2)
+    # порт 9 (discard) на localhost обычно закрыт — прогрев не должен падать
+    assert client.warm(["http://127.0.0.1:9/"]) == 0
+    client.close()
+
+
+def test_pyshortener_goes_through_shared_session(local_server):
+    client = ProviderClient()
+    tiny = client.pyshortener("tinyurl")
+    assert client.pyshortener("tinyurl") is tiny  # кешируется
+    tiny.api_url = local_server + "/api-create.php"
+    assert tiny.short("https://example.com") == "https://tinyurl.com/local"
+    assert tiny.short("https://example.com") == "https://tinyurl.com/local"
+    assert client.stats().reused == 1
+    client.close()
+
+
+def test_warm_targets_the_origin_the_backend_calls():
+    client = ProviderClient()
+    tiny = client.pyshortener("tinyurl")
+    assert tiny.api_url == "https://tinyurl.com/api-create.php"
+    assert client.warm_urls() == ("https://tinyurl.com/",)  # тот же ключ пула, что у первого вызова
+    client.close()
+
+
+def test_stats_survive_close(local_server):
+    client = ProviderClient()
+    client.get(local_server + "/a")
+    client.close()
+    client.get(local_server + "/b")
+    st = client.stats()
+    assert st.requests == 2
+    assert st.connections_opened == 2
+
+
+def test_bad_pool_size():
+    with pytest.raises(ValueError):
+        ProviderClient(pool_maxsize=0)
+
+
+def test_process_wide_client_lifecycle():
+    http_client.close_client()
+    a = http_client.get_client()
+    assert http_client.get_client() is a
+    b = http_client.configure_client(pool_maxsize=16)
+    assert b is not a and b.pool_maxsize == 16
+    http_client.close_client()
+    assert http_client.get_client() is not b
@@ -0,0 +1,94 @@
+import pytest
+
+from urlcutter.latency import AdaptiveTimeouts, LatencyTracker
+from urlcutter.shorteners import shorten_with_failover
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_tracker_quantiles_within_bucket_error():
+    tr = LatencyTracker()
+    for i in range(1, 1001):
+        tr.observe(i / 1000)  # 1 ms .. 1 s равномерно
+    assert tr.quantile(0.5) == pytest.approx(0.5, rel=0.16)
+    assert tr.quantile(0.99) == pytest.approx(0.99, rel=0.16)
+
+
+def test_tracker_empty():
+    assert LatencyTracker().quantile(0.99) is None
+
+
+def test_tracker_decays_old_samples():
+    clk = FakeClock()
+    tr = LatencyTracker(half_life=10.0, clock=clk)
+    for _ in range(100):
+        tr.observe(5.0)  # старая «медленная» эпоха
+    clk.t = 200.0  # 20 периодов полураспада
+    for _ in range(100):
+        tr.observe(0.1)
+    assert tr.quantile(0.99) == pytest.approx(0.1, rel=0.16)
+
+
+def test_tracker_rescale_keeps_distribution():
+    clk = FakeClock()
+    tr = LatencyTracker(half_life=1.0, clock=clk)
+    tr.observe(0.2)
+    clk.t = 400.0  # вес 2**400 > порога → пересчёт
+    tr.observe(0.2)
+    assert tr.quantile(0.5) == pytest.approx(0.2, rel=0.16)
+
+
+def test_timeout_for_cold_start_uses_ceiling():
+    at = AdaptiveTimeouts(ceiling=8.0)
+    assert at.timeout_for("tinyurl") == 8.0
+
+
+def test_timeout_follows_p99_with_floor_and_ceiling():
+    at = AdaptiveTimeouts(factor=2.0, floor=1.0, ceiling=8.0, min_samples=10)
+    for _ in range(50):
+        at.observe("fast", 0.05)
+        at.observe("mid", 1.5)
+        at.observe("slow", 30.0)
+    assert at.timeout_for("fast") == 1.0  # floor
+    assert at.timeout_for("mid") == pytest.approx(3.0, rel=0.16)
+    assert at.timeout_for("slow") == 8.0  # ceiling
+    snap = at.snapshot()
+    assert snap["mid"].samples == 50
+    assert snap["mid"].p99 == pytest.approx(1.5, rel=0.16)
+
+
+def test_bad_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveTimeouts(floor=5.0, ceiling=1.0)
+
+
+def test_failover_passes_adaptive_timeout_and_records():
+    at = AdaptiveTimeouts(floor=0.5, ceiling=8.0, min_samples=5)
+    for _ in range(10):
+        at.observe("a", 0.01)
+    seen = {}
+
+    def fn(url, timeout):
+        seen["timeout"] = timeout
+        return "https://a/1"
+
+    shorten_with_failover("https://example.com", 8.0, chain=("a",), overrides={"a": fn}, timeouts=at)
+    assert seen["timeout"] == 0.5
+    assert at.tracker("a").count == 11
+
+
+def test_failover_records_timeouts_as_censored_samples():
+    at = AdaptiveTimeouts(ceiling=2.0)
+
+    def hang(url, timeout):
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        shorten_with_failover("https://example.com", 8.0, chain=("a",), overrides={"a": hang}, timeouts=at)
+    assert at.tracker("a").quantile(0.5) == pytest.approx(2.0, rel=0.16)
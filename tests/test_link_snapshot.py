@@ -0,0 +1,201 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, delete, insert
+
+from urlcutter import link_snapshot
+from urlcutter.db.models import Base, Link
+from urlcutter.expander import expand_many
+from urlcutter.http_client import ProviderClient
+from urlcutter.link_snapshot import LinkSnapshot, SnapshotHolder, build_snapshot
+from urlcutter.redirect_server import LinkResolver
+from urlcutter.shorteners import ResultCache
+
+
+@pytest.fixture
+def engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    Base.metadata.create_all(eng)
+    yield eng
+    eng.dispose()
+
+
+def _add(engine, *pairs):
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Link),
+            [
+                {"short_url": s, "long_url": lng, "service": "local", "created_at": datetime(2024, 1, 1)}
+                for s, lng in pairs
+            ],
+        )
+
+
+def test_build_and_lookup(engine, tmp_path):
+    _add(engine, *[(f"http://s.rt/{i}", f"https://example.com/{i}") for i in range(500)])
+    st = build_snapshot(tmp_path / "links.snap", engine=engine)
+    assert (st.entries, st.new_rows, st.watermark) == (500, 500, 500)
+
+    snap = LinkSnapshot(tmp_path / "links.snap")
+    assert len(snap) == 500
+    assert snap.get("http://s.rt/123") == "https://example.com/123"
+    assert snap.get("http://s.rt/1234") is None
+    assert snap.get("http://s.rt/12") == "https://example.com/12"  # префикс другого ключа — не путаем
+    assert sorted(snap.items())[:1] == [("http://s.rt/0", "https://example.com/0")]
+
+
+def test_newest_row_wins_and_unicode(engine, tmp_path):
+    _add(engine, ("http://s.rt/a", "https://old.example"), ("http://s.rt/a", "https://new.example/путь"))
+    build_snapshot(tmp_path / "s", engine=engine)
+    assert LinkSnapshot(tmp_path / "s").get("http://s.rt/a") == "https://new.example/путь"
+
+
+def test_hash_collisions_are_resolved_by_key(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(link_snapshot, "_hash", lambda key: 7)  # все ключи в одном «ведре»
+    _add(engine, ("http://s.rt/x", "https://x"), ("http://s.rt/y", "https://y"), ("http://s.rt/z", "https://z"))
+    build_snapshot(tmp_path / "s", engine=engine)
+    snap = LinkSnapshot(tmp_path / "s")
+    assert [snap.get(f"http://s.rt/{k}") for k in "xyzw"] == ["https://x", "https://y", "https://z", None]
+
+
+def test_incremental_build_reads_only_new_rows(engine, tmp_path):
+    path = tmp_path / "s"
+    _add(engine, ("http://s.rt/1", "https://one"))
+    build_snapshot(path, engine=engine)
+    _add(engine, ("http://s.rt/2", "https://two"), ("http://s.rt/1", "https://uno"))
+
+    st = build_snapshot(path, engine=engine)
+    assert (st.entries, st.new_rows, st.watermark) == (2, 2, 3)
+    snap = LinkSnapshot(path)
+    assert snap.get("http://s.rt/1") == "https://uno"
+    assert snap.get("http://s.rt/2") == "https://two"
+
+
+def test_deleted_rows_vanish_on_full_build_and_reset_db_is_detected(engine, tmp_path):
+    path = tmp_path / "s"
+    _add(engine, ("http://s.rt/1", "https://one"), ("http://s.rt/2", "https://two"))
+    build_snapshot(path, engine=engine)
+    with engine.begin() as conn:
+        conn.execute(delete(Link).where(Link.short_url == "http://s.rt/1"))
+
+    assert build_snapshot(path, engine=engine).entries == 2  # инкремент удаления не видит
+    assert build_snapshot(path, engine=engine, full=True).entries == 1
+
+    with engine.begin() as conn:
+        conn.execute(delete(Link))
+    assert build_snapshot(path, engine=engine).entries == 0  # max(id) < watermark — строим заново
+
+
+def test_holder_swaps_while_old_snapshot_keeps_serving(engine, tmp_path):
+    path = tmp_path / "s"
+    _add(engine, ("http://s.rt/1", "https://one"))
+    build_snapshot(path, engine=engine)
+    holder = SnapshotHolder(path)
+    old = holder.current
+    assert holder.reload() is False  # файл не менялся
+
+    _add(engine, ("http://s.rt/2", "https://two"))
+    build_snapshot(path, engine=engine)
+    assert holder.get("http://s.rt/2") is None  # до reload — старый снимок
+    assert holder.reload() is True
+    assert holder.get("http://s.rt/2") == "https://two"
+    assert old.get("http://s.rt/1") == "https://one"  # старое отображение по-прежнему читается
+
+
+def test_close_and_context_manager(engine, tmp_path):
+    _add(engine, ("http://s.rt/1", "https://one"))
+    build_snapshot(tmp_path / "s", engine=engine)
+    with LinkSnapshot(tmp_path / "s") as snap:
+        assert snap.get("http://s.rt/1") == "https://one"
+    assert snap.closed
+    with pytest.raises(ValueError):
+        snap.get("http://s.rt/1")
+    snap.close()  # повторно — без ошибки
+
+    with SnapshotHolder(tmp_path / "s") as holder:
+        snap = holder.current
+    assert snap.closed and holder.get("http://s.rt/1") is None
+
+
+def test_replace_refused_publishes_version_and_holder_reopens_it(engine, tmp_path, monkeypatch):
+    path = tmp_path / "s"
+    _add(engine, ("http://s.rt/1", "https://one"))
+    build_snapshot(path, engine=engine)
+    holder = SnapshotHolder(path)
+    real_replace = link_snapshot.os.replace
+
+    def mapped_replace(src, dst):
+        # как на Windows: файл, отображённый читателем, заменить нельзя
+        if dst == path:
+            raise PermissionError(13, "The process cannot access the file", str(dst))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(link_snapshot.os, "replace", mapped_replace)
+    _add(engine, ("http://s.rt/2", "https://two"))
+    build_snapshot(path, engine=engine)
+    assert link_snapshot.snapshot_file(path) == tmp_path / "s.1"
+    _add(engine, ("http://s.rt/3", "https://three"))
+    st = build_snapshot(path, engine=engine)  # инкремент читает из последней версии
+    assert (st.new_rows, st.entries) == (1, 3)
+    assert link_snapshot.snapshot_file(path) == tmp_path / "s.2"
+
+    assert holder.reload() is True
+    assert holder.current.path == tmp_path / "s.2"
+    assert holder.get("http://s.rt/3") == "https://three"
+
+    monkeypatch.setattr(link_snapshot.os, "replace", real_replace)
+    _add(engine, ("http://s.rt/4", "https://four"))
+    build_snapshot(path, engine=engine)
+    assert link_snapshot.snapshot_file(path) == path
+    assert not list(tmp_path.glob("s.[0-9]*"))  # версии убраны
+    assert holder.reload() is True
+    assert holder.get("http://s.rt/4") == "https://four"
+    holder.close()
+
+
+def test_missing_or_bad_files(tmp_path):
+    assert SnapshotHolder(tmp_path / "nope").get("http://s.rt/1") is None
+    bad = tmp_path / "bad"
+    bad.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        LinkSnapshot(bad)
+
+
+def test_redirect_resolver_answers_from_snapshot_first(engine, tmp_path):
+    _add(engine, ("http://s.rt/a1", "https://example.com/a"))
+    build_snapshot(tmp_path / "s", engine=engine)
+    _add(engine, ("http://s.rt/b2", "https://example.com/b"))  # новее снимка
+    r = LinkResolver("http://s.rt", engine=engine, snapshot=SnapshotHolder(tmp_path / "s"))
+
+    assert r.resolve("a1") == "https://example.com/a"
+    assert r.resolve("b2") == "https://example.com/b"
+    assert (r.stats.snapshot_hits, r.stats.db_lookups) == (1, 1)
+
+
+def test_expand_many_uses_snapshot_before_history(engine, tmp_path):
+    _add(engine, ("http://s.rt/a1", "https://example.com/a"))
+    build_snapshot(tmp_path / "s", engine=engine)
+
+    class History:
+        def __init__(self):
+            self.asked = []
+
+        def find_long_urls(self, urls):
+            self.asked.append(list(urls))
+            return {"http://s.rt/b2": "https://example.com/b"}
+
+    history = History()
+    out = list(
+        expand_many(
+            ["http://s.rt/a1", "http://s.rt/b2"],
+            history=history,
+            snapshot=LinkSnapshot(tmp_path / "s"),
+            cache=ResultCache(),
+            client=ProviderClient(),  # в сеть не пойдёт: всё найдётся локально
+        )
+    )
+    assert [(r.long_url, r.source) for r in out] == [
+        ("https://example.com/a", "history"),
+        ("https://example.com/b", "history"),
+    ]
+    assert history.asked == [["http://s.rt/b2"]]
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from urlcutter import local_shortener
+from urlcutter.db.models import Base, IdSequence
+from urlcutter.handlers import Handlers
+from urlcutter.local_shortener import BlockAllocator, LocalShortener, decode_base62, encode_base62
+from urlcutter.shorteners import get_provider
+
+
+@pytest.fixture
+def session_factory(db_session):
+    @contextmanager
+    def _factory():
+        yield db_session
+
+    return _factory
+
+
+def _file_factory(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(engine)
+    maker = sessionmaker(bind=engine)
+
+    @contextmanager
+    def _factory():
+        s = maker()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    return _factory, engine
+
+
+@pytest.mark.parametrize("n", [0, 1, 61, 62, 3843, 10**12])
+def test_base62_roundtrip(n):
+    assert decode_base62(encode_base62(n)) == n
+
+
+def test_base62_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_base62("ab-c")
+    with pytest.raises(ValueError):
+        encode_base62(-1)
+
+
+def test_allocator_reserves_blocks_lazily(session_factory, db_session):
+    alloc = BlockAllocator(block_size=1000, session_factory=session_factory)
+    ids = [alloc.next_id() for _ in range(2500)]
+    assert len(set(ids)) == 2500
+    assert ids[0] == 1
+    assert alloc.blocks_reserved == 3  # один поход в БД на тысячу кодов
+    assert db_session.get(IdSequence, "local").next_hi == 3
+
+
+def test_allocators_on_one_db_never_overlap(tmp_path):
+    # отдельные движки = отдельные соединения, как у разных процессов
+    path = tmp_path / "shared.db"
+    allocs = []
+    engines = []
+    for _ in range(4):
+        factory, engine = _file_factory(path)
+        engines.append(engine)
+        allocs.append(BlockAllocator(block_size=50, session_factory=factory))
+    out = [[] for _ in allocs]
+
+    def run(i):
+        for _ in range(500):
+            out[i].append(allocs[i].next_id())
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(allocs))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for e in engines:
+        e.dispose()
+    all_ids = [x for part in out for x in part]
+    assert len(all_ids) == len(set(all_ids)) == 2000
+
+
+def test_local_shortener_is_fast_and_offline(session_factory):
+    short = LocalShortener("https://s.example/", allocator=BlockAllocator(session_factory=session_factory))
+    n = 5000
+    started = time.perf_counter()
+    urls = {short.shorten(f"https://example.com/{i}") for i in range(n)}
+    elapsed = time.perf_counter() - started
+    assert len(urls) == n
+    assert n / elapsed > 2000
+    first = next(iter(urls))
+    assert first.startswith("https://s.example/")
+    assert short.code_of(first)
+    assert short.code_of("https://other/abc") is None
+    with pytest.raises(ValueError):
+        short.shorten("ftp://nope")
+
+
+def test_registered_as_provider(monkeypatch, session_factory):
+    local = LocalShortener("https://s.example", allocator=BlockAllocator(session_factory=session_factory))
+    monkeypatch.setattr(local_shortener, "_local", local)
+    assert get_provider("local").shorten("https://example.com") == "https://s.example/1"
+
+
+class _Page:
+    def __init__(self):
+        self.overlay = []
+        self.cursor = None
+
+    def update(self):
+        pass
+
+
+class _Field:
+    def __init__(self, value=""):
+        self.value = value
+        self.disabled = False
+
+
+class _OpenCircuit:
+    def circuit_blocked(self):
+        return True
+
+    def cooldown_left(self):
+        return 42
+
+
+def test_handler_falls_back_to_local_when_circuit_open(monkeypatch, session_factory):
+    local = LocalShortener("https://s.example", allocator=BlockAllocator(session_factory=session_factory))
+    monkeypatch.setattr(local_shortener, "_local", local)
+    monkeypatch.setattr("urlcutter.handlers.shorten_via_tinyurl", lambda u, t: pytest.fail("network used"))
+    out = _Field()
+    h = Handlers(
+        _Page(),
+        logging.getLogger("test"),
+        _OpenCircuit(),
+        _Field("https://example.com"),
+        out,
+        _Field(),
+        ("tinyurl", "local"),
+    )
+    stored = {}
+    monkeypatch.setattr(h.history, "add", lambda rec: stored.setdefault("rec", rec) and type("S", (), {"id": 1})())
+    h.on_shorten(None)
+    assert out.value == "https://s.example/1"
+    assert stored["rec"].service == "local"
+
+
+def test_handler_without_local_still_blocks(monkeypatch):
+    page = _Page()
+    h = Handlers(page, logging.getLogger("test"), _OpenCircuit(), _Field("https://example.com"), _Field(), _Field())
+    h.on_shorten(None)
+    assert any("cooling down" in getattr(c.content, "value", "") for c in page.overlay)
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from urlcutter.provider_executor import ProviderExecutor
+from urlcutter.shorteners import shorten_via_tinyurl_core
+
+
+def test_call_returns_result_and_reuses_worker():
+    ex = ProviderExecutor(max_workers=2)
+    assert ex.call(lambda x: x * 2, 21, timeout=1) == 42
+    assert ex.call(lambda: "again", timeout=1) == "again"
+    g = ex.gauges()
+    assert g.workers == 1
+    assert g.active == 0 and g.queued == 0 and g.orphaned == 0
+
+
+def test_call_propagates_exception():
+    ex = ProviderExecutor()
+
+    def boom():
+        raise ValueError("bad payload")
+
+    with pytest.raises(ValueError):
+        ex.call(boom, timeout=1)
+
+
+def test_timeout_abandons_without_joining():
+    ex = ProviderExecutor(max_workers=1, max_orphans=2)
+    release = threading.Event()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        ex.call(release.wait, 5, timeout=0.05)
+    # не ждали зависший вызов
+    assert time.monotonic() - started < 1.0
+
+    g = ex.gauges()
+    assert g.orphaned == 1
+    assert g.abandoned_total == 1
+
+    # брошенный поток не занимает слот: новый вызов получает свежего воркера
+    assert ex.call(lambda: "ok", timeout=1) == "ok"
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while ex.gauges().orphaned and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ex.gauges().orphaned == 0
+
+
+def test_orphan_cap_rejects_new_work():
+    ex = ProviderExecutor(max_workers=1, max_orphans=2)
+    release = threading.Event()
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            ex.call(release.wait, 5, timeout=0.02)
+
+    with pytest.raises(RuntimeError, match="abandoned"):
+        ex.submit(lambda: None)
+    assert ex.gauges().rejected_total == 1
+    release.set()
+
+
+def test_gauges_report_active_and_queued():
+    ex = ProviderExecutor(max_workers=1)
+    gate = threading.Event()
+    running = threading.Event()
+
+    def blocker():
+        running.set()
+        gate.wait(2)
+
+    f1 = ex.submit(blocker)
+    running.wait(1)
+    f2 = ex.submit(lambda: "second")
+    g = ex.gauges()
+    assert g.active == 1
+    assert g.queued == 1
+    gate.set()
+    f1.result(1)
+    assert f2.result(1) == "second"
+
+
+def test_shutdown_refuses_new_work():
+    ex = ProviderExecutor()
+    ex.call(lambda: None, timeout=1)
+    ex.shutdown()
+    with pytest.raises(RuntimeError):
+        ex.submit(lambda: None)
+
+
+def test_core_uses_shared_executor_and_does_not_block(monkeypatch):
+    release = threading.Event()
+
+    class SlowTiny:
+        def short(self, url):
+            release.wait(5)
+            return "https://tinyurl.com/late"
+
+    class FakeShortener:
+        tinyurl = SlowTiny()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        shorten_via_tinyurl_core("https://example.com", 0.05, _shortener_factory=FakeShortener)
+    assert time.monotonic() - started < 1.0
+    release.set()
+
+
+def test_job_submitted_while_idle_worker_times_out_is_not_stranded():
+    # submit попадает в окно, когда простаивающий воркер уже вышел из get по таймауту
+    ex = ProviderExecutor(max_workers=1, idle_timeout=0.002)
+    for i in range(300):
+        time.sleep(0.002 + (i % 5) * 0.0002)
+        assert ex.call(lambda n=i: n, timeout=1) == i
+    ex.shutdown()
+
+
+def test_idle_worker_rechecks_queue_before_exiting():
+    # детерминированно воспроизводим гонку: задача приходит между таймаутом get и выходом воркера
+    ex = ProviderExecutor(max_workers=1, idle_timeout=0.01)
+    timed_out, submitted = threading.Event(), threading.Event()
+    real_queue = ex._queue
+
+    class RacyQueue:
+        def put(self, item):
+            real_queue.put(item)
+
+        def get_nowait(self):
+            return real_queue.get_nowait()
+
+        def get(self, timeout=None):
+            try:
+                return real_queue.get(timeout=timeout)
+            except queue.Empty:
+                timed_out.set()
+                submitted.wait(1)
+                raise
+
+    ex._queue = RacyQueue()
+    assert ex.call(lambda: "warm", timeout=1) == "warm"
+    assert timed_out.wait(1)
+    fut = ex.submit(lambda: "late")  # воркер ещё числится простаивающим — новый не заводится
+    submitted.set()
+    assert fut.result(timeout=1) == "late"
+    ex.shutdown()
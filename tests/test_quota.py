@@ -0,0 +1,284 @@
+import io
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from urlcutter import cli
+from urlcutter.cli import _quota_paced, build_parser, run_quota, run_shorten
+from urlcutter.db.models import Base, ProviderUsage
+from urlcutter.protection import BucketSpec, CircuitBreaker, RateLimiter
+from urlcutter.quota import QuotaExhausted, QuotaLedger, QuotaLimits, parse_quota_spec
+from urlcutter.retry import RateLimited
+from urlcutter.shorteners import ResultCache, shorten_many, shorten_with_failover
+
+NOON = datetime(2026, 10, 18, 12, 30, tzinfo=UTC).timestamp()
+
+
+class Clock:
+    def __init__(self, now=NOON):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def factory(db_session):
+    @contextmanager
+    def _factory():
+        yield db_session
+
+    return _factory
+
+
+@pytest.fixture
+def file_factory(tmp_path):
+    # файловая БД: батч ходит в неё из рабочих потоков
+    engine = create_engine(f"sqlite:///{tmp_path / 'quota.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def _factory():
+        with Session() as s:
+            yield s
+
+    yield _factory
+    engine.dispose()
+
+
+def _ledger(factory, clock=None, **limits):
+    return QuotaLedger(
+        {name: QuotaLimits(*caps) for name, caps in limits.items()}, session_factory=factory, clock=clock or Clock()
+    )
+
+
+def test_parse_quota_spec():
+    limits = parse_quota_spec(" tinyurl=500/h,5000/d ; isgd=200/H ;")
+    assert limits == {"tinyurl": QuotaLimits(500, 5000), "isgd": QuotaLimits(per_hour=200)}
+    assert parse_quota_spec(None) == {}
+    for bad in ("tinyurl", "tinyurl=5/w", "=5/h", "tinyurl=x/h"):
+        with pytest.raises(ValueError):
+            parse_quota_spec(bad)
+
+
+def test_acquire_stops_at_hourly_cap_and_counts_nothing_on_refusal(factory):
+    ledger = _ledger(factory, tinyurl=(3, 10))
+    assert [ledger.try_acquire("tinyurl") for _ in range(5)] == [True, True, True, False, False]
+    st = ledger.status("tinyurl")
+    assert (st.hour_used, st.day_used, st.remaining) == (3, 3, 0)
+    assert st.reset_in == 30 * 60
+
+
+def test_hour_rollover_restores_budget_until_daily_cap(factory):
+    clock = Clock()
+    ledger = _ledger(factory, clock, tinyurl=(3, 5))
+    assert sum(ledger.try_acquire("tinyurl") for _ in range(4)) == 3
+    clock.now += 3600
+    assert sum(ledger.try_acquire("tinyurl") for _ in range(4)) == 2  # день упёрся раньше часа
+    with pytest.raises(QuotaExhausted) as ei:
+        ledger.acquire("tinyurl")
+    assert ei.value.period == "day"
+    assert ei.value.retry_after == 10.5 * 3600  # до полуночи UTC
+    assert isinstance(ei.value, RateLimited)
+
+
+def test_uncapped_provider_is_counted(factory):
+    ledger = _ledger(factory)
+    ledger.acquire("isgd", 4)
+    ledger.record("isgd")
+    st = ledger.status("isgd")
+    assert (st.hour_used, st.day_used, st.remaining, st.sustainable_rate) == (5, 5, None, None)
+
+
+def test_usage_persists_across_ledgers(factory):
+    _ledger(factory, tinyurl=(2, None)).acquire("tinyurl", 2)
+    assert not _ledger(factory, tinyurl=(2, None)).try_acquire("tinyurl")
+
+
+def test_pace_spreads_remaining_budget_until_reset(factory):
+    ledger = _ledger(factory, tinyurl=(None, 4000), isgd=(180, None))
+    ledger.acquire("tinyurl", 400)
+    # tinyurl: 3600 за 11.5 ч; isgd: 180 за 30 мин
+    assert ledger.pace(["tinyurl"]) == pytest.approx(3600 / (11.5 * 3600))
+    assert ledger.pace(["tinyurl", "isgd"]) == pytest.approx(3600 / (11.5 * 3600) + 180 / 1800)
+    assert ledger.pace(["tinyurl", "dagd"]) is None
+
+
+def test_prune_drops_old_buckets(factory, db_session):
+    clock = Clock()
+    ledger = _ledger(factory, clock)
+    ledger.acquire("tinyurl")
+    clock.now += 10 * 86400
+    ledger.acquire("tinyurl")
+    assert ledger.prune(keep_days=7) == 2
+    assert db_session.query(ProviderUsage).count() == 2
+
+
+def test_concurrent_acquire_never_exceeds_cap(file_factory):
+    ledger = _ledger(file_factory, tinyurl=(25, None))
+    granted = []
+
+    def worker():
+        granted.extend(ok for _ in range(10) if (ok := ledger.try_acquire("tinyurl")))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(granted) == 25
+    assert ledger.status("tinyurl").hour_used == 25
+
+
+def test_failover_reroutes_when_quota_is_spent(factory):
+    ledger = _ledger(factory, tinyurl=(0, None))
+    calls = []
+
+    def ok(name):
+        return lambda url, t: calls.append(name) or f"https://{name}.local/x"
+
+    out = shorten_with_failover(
+        "https://example.com",
+        chain=("tinyurl", "isgd"),
+        overrides={"tinyurl": ok("tinyurl"), "isgd": ok("isgd")},
+        quota=ledger,
+    )
+    assert out.provider == "isgd" and calls == ["isgd"]
+    assert out.failures[0][0] == "tinyurl" and "QuotaExhausted" in out.failures[0][1]
+    assert ledger.status("isgd").hour_used == 1
+
+
+def test_failover_raises_quota_error_when_every_provider_is_spent(factory):
+    ledger = _ledger(factory, tinyurl=(0, None))
+    with pytest.raises(QuotaExhausted):
+        shorten_with_failover("https://example.com", chain=("tinyurl",), overrides={"tinyurl": None}, quota=ledger)
+
+
+def test_failover_skips_hedge_when_one_provider_is_spent(factory):
+    class SlowPrimaryRace:
+        # хедж стартует, но второй провайдер квоту не проходит — отвечает первый
+        def race(self, url, timeout, primary, secondary, **hooks):
+            assert hooks["admit"](secondary[0]) is False
+            short = primary[1](url, timeout)
+            hooks["report"](primary[0], True)
+            return short, primary[0]
+
+    ledger = _ledger(factory, isgd=(0, None))
+    out = shorten_with_failover(
+        "https://example.com",
+        chain=("tinyurl", "isgd"),
+        overrides={"tinyurl": lambda u, t: "https://tiny.one/a", "isgd": None},
+        hedger=SlowPrimaryRace(),
+        quota=ledger,
+    )
+    assert out.provider == "tinyurl"
+    assert out.failures[0][0] == "isgd" and "QuotaExhausted" in out.failures[0][1]
+    assert ledger.status("tinyurl").hour_used == 1  # допущен один раз, не дважды
+    assert ledger.status("isgd").hour_used == 0
+
+
+def test_quota_refusal_returns_token_and_probe_slot(factory):
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure("isgd")
+    now[0] = 11.0
+    limiter = RateLimiter({"isgd": BucketSpec(burst=1, rate=0.0)}, default=None)
+    out = shorten_with_failover(
+        "https://example.com",
+        chain=("isgd", "tinyurl"),
+        overrides={"isgd": None, "tinyurl": lambda u, t: "https://tiny.one/a"},
+        quota=_ledger(factory, isgd=(0, None)),
+        limiter=limiter,
+        breaker=breaker,
+    )
+    assert out.provider == "tinyurl" and "QuotaExhausted" in out.failures[0][1]
+    assert limiter.peek("isgd") == 1  # токен вернули
+    assert breaker.try_acquire("isgd")  # и пробный слот тоже
+
+
+@pytest.fixture
+def broken_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")  # без таблиц: любой запрос учёта падает
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def _factory():
+        with Session() as s:
+            yield s
+
+    yield _factory
+    engine.dispose()
+
+
+def test_ledger_error_admits_call_and_logs(broken_factory, caplog):
+    ledger = _ledger(broken_factory, tinyurl=(1, None))
+    with caplog.at_level(logging.WARNING, logger="urlcutter.quota"):
+        out = shorten_with_failover(
+            "https://example.com",
+            chain=("tinyurl", "local"),
+            overrides={"tinyurl": lambda u, t: "https://tiny.one/a", "local": None},
+            quota=ledger,
+        )
+    assert out.provider == "tinyurl" and out.failures == ()
+    assert "quota_unknown provider=tinyurl" in caplog.text
+    assert ledger.try_acquire("tinyurl") is True
+
+
+def test_shorten_many_survives_ledger_errors(broken_factory):
+    ledger = _ledger(broken_factory, tinyurl=(1, None))
+    get = lambda api, timeout: type("R", (), {"status_code": 200, "text": "https://tiny.one/z"})()  # noqa: E731
+    urls = [f"https://example.com/{i}" for i in range(3)]
+    results = list(shorten_many(urls, max_concurrency=1, coalesce=False, quota=ledger, _get=get))
+    assert all(r.ok for r in results)
+
+
+def test_shorten_many_reports_quota_errors(file_factory):
+    ledger = _ledger(file_factory, tinyurl=(2, None))
+    get = lambda api, timeout: type("R", (), {"status_code": 200, "text": "https://tiny.one/z"})()  # noqa: E731
+    urls = [f"https://example.com/{i}" for i in range(4)]
+    results = list(shorten_many(urls, max_concurrency=1, coalesce=False, quota=ledger, _get=get))
+    assert sum(r.ok for r in results) == 2
+    assert all(isinstance(r.error, QuotaExhausted) for r in results if not r.ok)
+
+
+def test_quota_paced_spaces_items_and_stops_when_spent(factory):
+    ledger = _ledger(factory, tinyurl=(None, 10))
+    ledger.acquire("tinyurl", 8)
+    sleeps = []
+    clock = Clock(0.0)
+
+    def sleep(s):
+        sleeps.append(s)
+        clock.now += s
+
+    items = [(i, f"https://example.com/{i}") for i in range(5)]
+    out = list(_quota_paced(items, ledger, "tinyurl", cli.log, pace=True, sleep=sleep, clock=clock))
+    assert len(out) == 5  # остаток перечитывается раз в QUOTA_RECHECK строк
+    assert sleeps == [pytest.approx(11.5 * 3600 / 2)] * 4
+
+    ledger.acquire("tinyurl", 2)
+    assert list(_quota_paced(items, ledger, "tinyurl", cli.log, sleep=sleep, clock=clock)) == []
+
+
+def test_cli_defers_lines_over_quota(file_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, "get_result_cache", ResultCache)
+    src = tmp_path / "urls.txt"
+    src.write_text("".join(f"https://example.com/{i}\n" for i in range(5)), encoding="utf-8")
+    out = tmp_path / "out.jsonl"
+    ledger = _ledger(file_factory, tinyurl=(3, None))
+    get = lambda api, timeout: type("R", (), {"status_code": 200, "text": "https://tiny.one/q"})()  # noqa: E731
+
+    args = build_parser().parse_args(["shorten", str(src), "-o", str(out), "-c", "1", "--no-history", "--quota"])
+    code = run_shorten(args, quota=ledger, sleep=lambda s: None, _get=get)
+    assert code == 0
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 3
+
+    buf = io.StringIO()
+    assert run_quota(build_parser().parse_args(["quota"]), stdout=buf, ledger=ledger) == 0
+    assert buf.getvalue().startswith("tinyurl\thour=3/3\tday=3/-\tremaining=0\t")
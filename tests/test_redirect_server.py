@@ -0,0 +1,219 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from urlcutter.cli import build_parser
+from urlcutter.db.models import Base, Link
+from urlcutter.redirect_server import LinkResolver, RedirectServer
+
+BASE = "http://sho.rt"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'links.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(eng)
+    rows = [
+        {"long_url": f"https://example.com/{i}", "short_url": f"{BASE}/{code}", "service": "local"}
+        for i, code in enumerate(["a1", "b2", "c3"])
+    ]
+    rows.append({"long_url": "https://other.example/x", "short_url": "https://tinyurl.com/zz", "service": "tinyurl"})
+    with eng.begin() as conn:
+        conn.execute(insert(Link), [{**r, "created_at": datetime(2024, 1, 1), "copy_count": 0} for r in rows])
+    yield eng
+    eng.dispose()
+
+
+async def _request(port, raw: bytes, responses: int = 1):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    heads = [(await reader.readuntil(b"\r\n\r\n")).decode() for _ in range(responses)]
+    writer.close()
+    await writer.wait_closed()
+    return heads
+
+
+def _serve(resolver, scenario, **kw):
+    async def run():
+        server = await RedirectServer(resolver, port=0, **kw).start()
+        try:
+            return await scenario(server.port)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_resolver_uses_lru_after_first_db_lookup(engine):
+    r = LinkResolver(BASE, engine=engine)
+    assert r.resolve("b2") == "https://example.com/1"
+    assert r.resolve("b2") == "https://example.com/1"
+    assert r.stats.db_lookups == 1
+    assert r.stats.lru_hits == 1
+
+
+def test_resolver_remembers_missing_codes_and_respects_lru_size(engine):
+    r = LinkResolver(BASE, engine=engine, lru_size=2, negative_size=1)
+    assert r.resolve("nope") is None
+    assert r.resolve("nope") is None
+    assert r.stats.db_lookups == 1
+    assert r.resolve("gone") is None  # лимит отрицательных записей исчерпан — не кэшируем
+    assert r.resolve("gone") is None
+    assert r.stats.db_lookups == 3
+
+    r.resolve("a1")
+    r.resolve("b2")  # вытесняет самый старый ("nope")
+    r.resolve("nope")
+    assert r.stats.db_lookups == 6
+
+
+def test_resolver_ignores_foreign_short_urls(engine):
+    # код сверяется с нашим префиксом целиком — tinyurl.com/zz нам не принадлежит
+    assert LinkResolver(BASE, engine=engine).resolve("zz") is None
+
+
+def test_lookup_goes_through_short_url_index(engine):
+    with engine.connect() as conn:
+        plan = conn.execute(
+            text("EXPLAIN QUERY PLAN SELECT long_url FROM links WHERE short_url = :u ORDER BY id DESC LIMIT 1"),
+            {"u": f"{BASE}/a1"},
+        ).all()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_links_short_like" in details
+    assert "SCAN links" not in details.replace("USING INDEX", "")
+
+
+def test_server_redirects_known_code(engine):
+    heads = _serve(
+        LinkResolver(BASE, engine=engine), lambda port: _request(port, b"GET /c3 HTTP/1.1\r\nHost: x\r\n\r\n")
+    )
+    assert heads[0].startswith("HTTP/1.1 302 Found")
+    assert "Location: https://example.com/2\r\n" in heads[0]
+
+
+def test_server_301_and_query_string(engine):
+    heads = _serve(
+        LinkResolver(BASE, engine=engine),
+        lambda port: _request(port, b"GET /a1?utm=1 HTTP/1.1\r\n\r\n"),
+        status=301,
+    )
+    assert heads[0].startswith("HTTP/1.1 301 Moved Permanently")
+    assert "Location: https://example.com/0" in heads[0]
+
+
+def test_server_percent_encodes_non_ascii_location(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Link),
+            [
+                {
+                    "long_url": "https://example.com/путь/ü?q=日本&x=a%20b",
+                    "short_url": f"{BASE}/u1",
+                    "service": "local",
+                    "created_at": datetime(2024, 1, 1),
+                    "copy_count": 0,
+                }
+            ],
+        )
+    heads = _serve(LinkResolver(BASE, engine=engine), lambda port: _request(port, b"GET /u1 HTTP/1.1\r\n\r\n"))
+    # UTF-8 в процентах, а не «?» на месте каждого символа; готовое %20 не кодируется повторно
+    assert "Location: https://example.com/%D0%BF%D1%83%D1%82%D1%8C/%C3%BC?q=%E6%97%A5%E6%9C%AC&x=a%20b\r\n" in heads[0]
+
+
+def test_server_404_bad_codes_and_methods(engine):
+    raw = (
+        b"GET /missing HTTP/1.1\r\n\r\n"
+        b"GET / HTTP/1.1\r\n\r\n"
+        b"GET /../../etc HTTP/1.1\r\n\r\n"
+        b"POST /a1 HTTP/1.1\r\nContent-Length: 0\r\n\r\n"
+        b"HEAD /a1 HTTP/1.1\r\n\r\n"
+    )
+    resolver = LinkResolver(BASE, engine=engine)
+    heads = _serve(resolver, lambda port: _request(port, raw, responses=5))
+    assert [h.split("\r\n", 1)[0] for h in heads] == [
+        "HTTP/1.1 404 Not Found",
+        "HTTP/1.1 404 Not Found",
+        "HTTP/1.1 404 Not Found",
+        "HTTP/1.1 405 Method Not Allowed",
+        "HTTP/1.1 302 Found",
+    ]
+    assert resolver.stats.requests == 5
+    assert resolver.stats.redirects == 1
+    assert resolver.stats.db_lookups == 2  # "/" и путь с точками в БД не ходят
+
+
+def test_server_keep_alive_and_connection_close(engine):
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /a1 HTTP/1.1\r\n\r\nGET /b2 HTTP/1.1\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        data = await reader.read()  # сервер сам закрывает соединение после второго ответа
+        writer.close()
+        return data.decode()
+
+    data = _serve(LinkResolver(BASE, engine=engine), scenario)
+    assert data.count("HTTP/1.1 302 Found") == 2
+    assert data.rstrip().endswith(
+        "Connection: close\r\nCache-Control: private, max-age=90\r\nLocation: https://example.com/1"
+    )
+
+
+def test_server_rejects_unsupported_status():
+    with pytest.raises(ValueError):
+        RedirectServer(LinkResolver(BASE), status=307)
+
+
+def test_cli_serve_arguments():
+    args = build_parser().parse_args(["serve", "--port", "0", "--base-url", BASE, "--status", "301"])
+    assert (args.command, args.port, args.base_url, args.status) == ("serve", 0, BASE, 301)
+
+
+def test_server_counts_clicks_for_get_redirects_only(engine):
+    from urlcutter.clicks import ClickCounter
+
+    deltas = []
+    clicks = ClickCounter(lambda d: deltas.append(dict(d)))
+    raw = b"GET /a1 HTTP/1.1\r\n\r\nGET /a1 HTTP/1.1\r\n\r\nHEAD /a1 HTTP/1.1\r\n\r\nGET /nope HTTP/1.1\r\n\r\n"
+    _serve(LinkResolver(BASE, engine=engine), lambda port: _request(port, raw, responses=4), clicks=clicks)
+    clicks.close()
+    assert deltas == [{f"{BASE}/a1": 2}]
+
+
+def test_resolver_negative_entry_expires_after_insert(engine):
+    now = [0.0]
+    r = LinkResolver(BASE, engine=engine, negative_ttl=5.0, clock=lambda: now[0])
+    assert r.resolve("new1") is None  # промах: кода ещё нет
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Link),
+            [
+                {
+                    "long_url": "https://example.com/new",
+                    "short_url": f"{BASE}/new1",
+                    "service": "local",
+                    "created_at": datetime(2024, 1, 2),
+                    "copy_count": 0,
+                }
+            ],
+        )
+    now[0] = 4.0
+    assert r.resolve("new1") is None  # в пределах TTL отвечает кэш
+    assert r.stats.db_lookups == 1
+
+    now[0] = 5.0
+    assert r.resolve("new1") == "https://example.com/new"
+    assert r.stats.db_lookups == 2
+    assert r.resolve("new1") == "https://example.com/new"  # положительный ответ живёт без TTL
+    assert r.stats.db_lookups == 2
+
+
+def test_resolver_forget_drops_cached_miss(engine):
+    r = LinkResolver(BASE, engine=engine, negative_size=1)
+    assert r.resolve("nope") is None
+    r.forget("nope")
+    assert r.resolve("gone") is None  # место под отрицательную запись освободилось
+    assert r.resolve("gone") is None
+    assert r.stats.db_lookups == 2
@@ -0,0 +1,161 @@
+import logging
+import time
+
+import pytest
+
+from urlcutter.handlers import Handlers
+from urlcutter.shorteners import ResultCache, shorten_many
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_hit_miss_and_normalized_key():
+    c = ResultCache()
+    assert c.get("tinyurl", "https://example.com/?b=2&a=1") is None
+    c.put("tinyurl", "https://example.com/?b=2&a=1", "https://tiny.one/x")
+    # тот же отпечаток после нормализации
+    assert c.get("tinyurl", "HTTPS://Example.com:443/?a=1&b=2") == "https://tiny.one/x"
+    assert c.get("isgd", "https://example.com/?a=1&b=2") is None
+    st = c.stats()
+    assert (st.hits, st.misses, st.entries) == (1, 2, 1)
+    assert st.hit_ratio == pytest.approx(1 / 3)
+
+
+def test_ttl_expiry():
+    clk = FakeClock()
+    c = ResultCache(ttl=10, clock=clk)
+    c.put("p", "https://a.com", "https://s/1")
+    clk.t = 9.9
+    assert c.get("p", "https://a.com") == "https://s/1"
+    clk.t = 10.0
+    assert c.get("p", "https://a.com") is None
+    assert c.stats().expirations == 1
+    assert len(c) == 0
+
+
+def test_lru_eviction_by_entries():
+    c = ResultCache(max_entries=2)
+    c.put("p", "https://a.com", "https://s/a")
+    c.put("p", "https://b.com", "https://s/b")
+    c.get("p", "https://a.com")  # a стал свежее b
+    c.put("p", "https://c.com", "https://s/c")
+    assert c.get("p", "https://b.com") is None
+    assert c.get("p", "https://a.com") == "https://s/a"
+    assert c.stats().evictions == 1
+
+
+def test_eviction_by_bytes():
+    c = ResultCache(max_bytes=600)
+    for i in range(10):
+        c.put("p", f"https://site{i}.com", f"https://s/{i}")
+    st = c.stats()
+    assert st.bytes <= 600
+    assert st.entries < 10
+    assert st.evictions == 10 - st.entries
+
+
+def test_invalid_url_is_a_miss():
+    c = ResultCache()
+    c.put("p", "", "https://s/1")
+    assert c.get("p", "  ") is None
+    assert len(c) == 0
+
+
+def test_lookup_follows_chain_order():
+    c = ResultCache()
+    c.put("isgd", "https://a.com", "https://is.gd/a")
+    c.put("dagd", "https://a.com", "https://da.gd/a")
+    assert c.lookup("https://a.com", ("tinyurl", "dagd", "isgd")) == ("https://da.gd/a", "dagd")
+
+
+def test_hit_is_sub_millisecond():
+    c = ResultCache()
+    c.put("tinyurl", "https://example.com/landing?utm=1", "https://tiny.one/x")
+    n = 2000
+    started = time.perf_counter()
+    for _ in range(n):
+        c.get("tinyurl", "https://example.com/landing?utm=1")
+    assert (time.perf_counter() - started) / n < 0.001
+
+
+def test_shorten_many_uses_cache():
+    calls = []
+
+    class Resp:
+        status_code = 200
+        text = "https://tiny.one/z"
+
+    def get(api, timeout):
+        calls.append(api)
+        return Resp()
+
+    c = ResultCache()
+    list(shorten_many(["https://example.com"], cache=c, _get=get))
+    res = list(shorten_many(["https://example.com"], cache=c, _get=get))
+    assert res[0].short_url == "https://tiny.one/z"
+    assert len(calls) == 1
+
+
+class _Page:
+    def __init__(self):
+        self.overlay = []
+        self.cursor = None
+
+    def update(self):
+        pass
+
+
+class _Field:
+    def __init__(self, value=""):
+        self.value = value
+        self.disabled = False
+
+
+class _ExplodingState:
+    """На попадании в кэш защита не должна даже вызываться."""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"state.{name} called on cache hit")
+
+
+def test_handler_cache_hit_skips_protection_and_network(monkeypatch):
+    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda logger, **_kw: pytest.fail("internet_ok called"))
+    monkeypatch.setattr("urlcutter.handlers.shorten_via_tinyurl", lambda u, t: pytest.fail("provider called"))
+    cache = ResultCache()
+    cache.put("tinyurl", "https://example.com", "https://tiny.one/cached")
+    out = _Field()
+    h = Handlers(
+        _Page(), logging.getLogger("test"), _ExplodingState(), _Field("https://example.com"), out, _Field(), cache=cache
+    )
+    monkeypatch.setattr(h.history, "add", lambda rec: type("S", (), {"id": 1})())
+    h.on_shorten(None)
+    assert out.value == "https://tiny.one/cached"
+    assert h._last_history_id == 1
+
+
+def test_handler_fills_cache_on_success(monkeypatch):
+    class _State:
+        def circuit_blocked(self):
+            return False
+
+        def rate_limit_allow(self, logger):
+            return True
+
+        def record_success(self):
+            pass
+
+    monkeypatch.setattr("urlcutter.handlers.internet_ok", lambda logger, **_kw: True)
+    monkeypatch.setattr("urlcutter.handlers.shorten_via_tinyurl", lambda u, t: "https://tiny.one/new")
+    cache = ResultCache()
+    h = Handlers(
+        _Page(), logging.getLogger("test"), _State(), _Field("https://example.com"), _Field(), _Field(), cache=cache
+    )
+    monkeypatch.setattr(h.history, "add", lambda rec: type("S", (), {"id": 1})())
+    h.on_shorten(None)
+    assert cache.get("tinyurl", "https://example.com") == "https://tiny.one/new"
@@ -0,0 +1,161 @@
+import random
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+
+from urlcutter.protection import CircuitOpen, LocalRateLimited
+from urlcutter.quota import QuotaExhausted
+from urlcutter.retry import (
+    ProviderError,
+    ProviderUnavailable,
+    RateLimited,
+    RetryPolicy,
+    error_for_status,
+    parse_retry_after,
+)
+from urlcutter.shorteners import _http_shorten, shorten_many
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, d):
+        self.slept.append(d)
+        self.t += d
+
+
+def _policy(clock, **kw):
+    return RetryPolicy(rng=random.Random(1), sleep=clock.sleep, clock=clock, **kw)
+
+
+def test_error_for_status_types():
+    assert isinstance(error_for_status("X", 429), RateLimited)
+    e = error_for_status("X", 503, {"Retry-After": "7"})
+    assert isinstance(e, ProviderUnavailable)
+    assert isinstance(e, RuntimeError)
+    assert (e.status_code, e.retry_after, str(e)) == (503, 7.0, "X HTTP 503")
+    assert type(error_for_status("X", 404)) is ProviderError
+
+
+def test_parse_retry_after_http_date():
+    now = datetime(2024, 1, 1, tzinfo=UTC)
+    value = format_datetime(now + timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after(value, now=now) == 30.0
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after(None) is None
+
+
+@pytest.mark.parametrize(
+    "exc,kind",
+    [
+        (TimeoutError(), "timeout"),
+        (RateLimited("x", status_code=429), "rate"),
+        (ProviderError("x", status_code=502), "unavailable"),
+        (ProviderError("x", status_code=403), "rejected"),
+        (ValueError("bad payload"), "invalid"),
+        (RuntimeError("pyshorteners: 429 Too Many Requests"), "rate"),
+        (RuntimeError("503"), "unavailable"),
+        (RuntimeError("boom"), "unknown"),
+        (CircuitOpen("tinyurl: circuit open", retry_after=30.0), "rejected"),
+        (LocalRateLimited("tinyurl: local rate limit", retry_after=0.5), "rejected"),
+        (QuotaExhausted("tinyurl", "day", 80000.0), "rejected"),
+    ],
+)
+def test_classify(exc, kind):
+    assert RetryPolicy.classify(exc) == kind
+
+
+def test_decorrelated_jitter_bounds():
+    clock = FakeClock()
+    policy = _policy(clock, max_attempts=10, base_delay=0.1, max_delay=1.0)
+    state = policy.start()
+    prev = 0.1
+    for _ in range(9):
+        d = state.next_delay(TimeoutError())
+        assert 0.1 <= d <= min(1.0, prev * 3)
+        prev = d
+    assert state.next_delay(TimeoutError()) is None  # попытки кончились
+
+
+def test_retry_after_is_respected_and_deadline_enforced():
+    clock = FakeClock()
+    policy = _policy(clock, max_attempts=5, deadline=10.0)
+    state = policy.start()
+    assert state.next_delay(RateLimited("x", status_code=429, retry_after=3.0)) == 3.0
+    clock.t = 8.0
+    # сервер просит 5 с, а бюджета осталось 2 — сдаёмся сразу
+    assert state.next_delay(RateLimited("x", status_code=429, retry_after=5.0)) is None
+    assert state.cap(8.0) == 2.0
+
+
+def test_retry_after_beyond_max_delay_gives_up_without_deadline():
+    state = RetryPolicy(max_delay=4.0).start()
+    assert state.next_delay(RateLimited("x", status_code=429, retry_after=3600.0)) is None
+    assert RetryPolicy().start().next_delay(QuotaExhausted("tinyurl", "day", 80000.0)) is None
+
+
+def test_non_retryable_errors_fail_fast():
+    clock = FakeClock()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ProviderError("nope", status_code=400)
+
+    with pytest.raises(ProviderError):
+        _policy(clock, max_attempts=3).call(fn)
+    assert len(calls) == 1
+    assert clock.slept == []
+
+
+def test_call_retries_until_success():
+    clock = FakeClock()
+    answers = iter([ProviderUnavailable("x", status_code=503), TimeoutError(), "https://t/1"])
+
+    def fn():
+        a = next(answers)
+        if isinstance(a, Exception):
+            raise a
+        return a
+
+    assert _policy(clock, max_attempts=3).call(fn) == "https://t/1"
+    assert len(clock.slept) == 2
+
+
+class Resp:
+    def __init__(self, status, text="", headers=None):
+        self.status_code = status
+        self.text = text
+        self.headers = headers or {}
+
+
+def test_http_shorten_raises_typed_error_with_retry_after():
+    with pytest.raises(RateLimited) as ei:
+        _http_shorten(
+            "TinyURL",
+            "https://t/?u=",
+            "https://example.com",
+            1,
+            lambda *a, **k: Resp(429, headers={"Retry-After": "2"}),
+        )
+    assert ei.value.retry_after == 2.0
+
+
+def test_shorten_many_uses_retry_policy():
+    clock = FakeClock()
+    seen = []
+
+    def get(api, timeout):
+        seen.append(api)
+        return Resp(503) if len(seen) == 1 else Resp(200, "https://tiny.one/x")
+
+    res = list(shorten_many(["https://example.com"], retry=_policy(clock, max_attempts=2), _get=get))
+    assert res[0].ok
+    assert len(seen) == 2
+    assert len(clock.slept) == 1
@@ -0,0 +1,160 @@
+import logging
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+from urlcutter import protection
+from urlcutter.protection import BucketSpec, CircuitState, ProtectionEngine
+from urlcutter.shared_protection import (
+    SharedCircuitBreaker,
+    SharedRateLimiter,
+    SharedStateStore,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return tmp_path / "protection.db"
+
+
+@pytest.fixture
+def stores(state_file):
+    # два хранилища над одним файлом — как два процесса
+    opened = [SharedStateStore(state_file), SharedStateStore(state_file)]
+    yield opened
+    for store in opened:
+        store.close()
+
+
+def test_bucket_is_shared_between_stores(stores):
+    a, b = (SharedRateLimiter(s, {"tinyurl": BucketSpec(5, 1.0)}, default=None) for s in stores)
+    granted = [lim.allow("tinyurl", now=100.0) for _ in range(4) for lim in (a, b)]
+    assert sum(granted) == 5
+    assert a.peek("tinyurl", now=100.0) == 0
+    assert b.retry_after("tinyurl", now=100.0) == pytest.approx(1.0)
+
+    assert b.allow("tinyurl", now=102.0) and a.allow("tinyurl", now=102.0)  # за 2 с пришло 2 токена
+    assert not a.allow("tinyurl", now=102.0)
+    assert a.allow("isgd") and a.peek("isgd") == float("inf")  # без спецификации — не ограничен
+
+
+def test_bucket_refuses_more_than_burst_and_survives_clock_skew(stores):
+    lim = SharedRateLimiter(stores[0], {"p": BucketSpec(2, 1.0)}, default=None)
+    assert not lim.allow("p", n=3, now=0.0)
+    assert lim.allow("p", n=2, now=50.0)
+    assert not lim.allow("p", now=40.0)  # часы другого процесса отстают — токенов это не даёт
+    assert lim.allow("p", now=51.0)
+
+
+def test_breaker_state_is_shared(stores):
+    a, b = (SharedCircuitBreaker(s, threshold=2, cooldown=10) for s in stores)
+    events = []
+    b.subscribe(events.append)
+
+    a.record_failure("tinyurl", now=0.0)
+    b.record_failure("tinyurl", now=1.0)
+    assert a.blocked("tinyurl", now=2.0) and b.blocked("tinyurl", now=2.0)
+    assert a.cooldown_left("tinyurl", now=2.0) == pytest.approx(9.0)
+    assert not a.blocked("isgd", now=2.0)
+    assert [e.new for e in events] == [CircuitState.OPEN]
+
+    # после кулдауна пробный слот один на все процессы
+    assert a.try_acquire("tinyurl", now=12.0)
+    assert not b.try_acquire("tinyurl", now=12.0)
+    assert b.blocked("tinyurl", now=12.0)
+    b.record_success("tinyurl", now=13.0)
+    assert a.state("tinyurl", now=13.0) is CircuitState.CLOSED
+    assert a.stats("tinyurl", now=13.0).trips == 1
+
+
+def test_failed_probe_reopens_with_longer_cooldown_for_everyone(stores):
+    a, b = (SharedCircuitBreaker(s, threshold=1, cooldown=10) for s in stores)
+    a.record_failure("tinyurl", now=0.0)
+    assert b.try_acquire("tinyurl", now=10.0)
+    b.record_failure("tinyurl", now=11.0)
+    assert a.cooldown_left("tinyurl", now=11.0) == pytest.approx(20.0)
+
+
+def test_decisions_stay_bounded_when_the_file_is_locked(state_file):
+    store = SharedStateStore(state_file, lock_timeout=0.05)
+    limiter = SharedRateLimiter(store)
+    breaker = SharedCircuitBreaker(store, threshold=1)
+    breaker.record_failure("tinyurl", now=0.0)
+    holder = sqlite3.connect(state_file, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        t0 = time.perf_counter()
+        assert limiter.allow() is False  # лимит при сомнении не пускает
+        assert breaker.try_acquire("tinyurl", now=100.0) is True  # предохранитель — пускает
+        breaker.record_failure("isgd")
+        assert time.perf_counter() - t0 < 1.0
+        assert store.busy == 3
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+        store.close()
+
+
+def test_engine_from_env_uses_shared_state(monkeypatch, state_file):
+    monkeypatch.setenv(protection.SHARED_STATE_ENV, str(state_file))
+    engine = protection._default_engine()
+    assert isinstance(engine.limiter, SharedRateLimiter)
+    assert isinstance(engine.breaker, SharedCircuitBreaker)
+    assert engine.rate_limit_allow(logging.getLogger("test.shared"))
+    engine.limiter.store.close()
+
+    monkeypatch.setenv(protection.SHARED_STATE_ENV, "0")
+    assert not isinstance(protection._default_engine().limiter, SharedRateLimiter)
+
+
+def test_cap_holds_across_processes(state_file):
+    # настоящие процессы: в сумме пропускаем ровно ёмкость ведра
+    code = textwrap.dedent(
+        f"""
+        from urlcutter.protection import BucketSpec
+        from urlcutter.shared_protection import SharedRateLimiter, SharedStateStore
+        lim = SharedRateLimiter(SharedStateStore({str(state_file)!r}, lock_timeout=5), {{"p": BucketSpec(30, 0)}})
+        print(sum(lim.allow("p") for _ in range(20)))
+        """
+    )
+    procs = [
+        subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE, text=True) for _ in range(4)
+    ]
+    granted = [int(p.communicate(timeout=60)[0]) for p in procs]
+    assert sum(granted) == 30
+
+
+def test_shared_engine_plugs_into_protection_engine(stores):
+    engine = ProtectionEngine(SharedRateLimiter(stores[0]), SharedCircuitBreaker(stores[0], threshold=1))
+    other = ProtectionEngine(SharedRateLimiter(stores[1]), SharedCircuitBreaker(stores[1], threshold=1))
+    engine.record_failure("tinyurl")
+    assert other.circuit_blocked("tinyurl")
+    assert other.cooldown_left("tinyurl") > 0
+    other.reset()
+    assert not engine.circuit_blocked("tinyurl")
+
+
+def test_released_probe_slot_is_free_for_other_processes(stores):
+    a, b = (SharedCircuitBreaker(s, threshold=1, cooldown=10) for s in stores)
+    a.record_failure("tinyurl", now=0.0)
+    assert a.try_acquire("tinyurl", now=11.0)
+    assert not b.try_acquire("tinyurl", now=11.0)
+    a.release("tinyurl")  # вызов так и не состоялся
+    assert b.try_acquire("tinyurl", now=11.0)
+
+
+def test_refunded_token_is_shared(stores):
+    a, b = (SharedRateLimiter(s, {"p": BucketSpec(1, 0)}, default=None) for s in stores)
+    assert a.allow("p", now=0.0)
+    assert not b.allow("p", now=0.0)
+    a.refund("p")  # вызов не состоялся — токен возвращается всем
+    assert b.allow("p", now=0.0)
+    b.refund("p", n=5)
+    assert a.peek("p", now=0.0) == 1  # не больше ёмкости
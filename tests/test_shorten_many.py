@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from urlcutter.shorteners import BatchStats, shorten_many
+
+
+class DummyResp:
+    def __init__(self, status_code=200, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+def _ok_get(url, timeout=None):
+    # короткая ссылка = хвост исходного URL, чтобы проверить порядок
+    tail = url.rsplit("%2F", 1)[-1]
+    return DummyResp(200, f"https://tinyurl.com/{tail}")
+
+
+def test_shorten_many_ordered_results():
+    urls = [f"https://example.com/{i}" for i in range(20)]
+    out = list(shorten_many(urls, max_concurrency=4, _get=_ok_get))
+    assert [r.index for r in out] == list(range(20))
+    assert [r.short_url for r in out] == [f"https://tinyurl.com/{i}" for i in range(20)]
+    assert all(r.ok for r in out)
+
+
+def test_shorten_many_unordered_yields_everything():
+    def slow_first(url, timeout=None):
+        if url.endswith("%2F0"):
+            time.sleep(0.05)
+        return _ok_get(url)
+
+    urls = [f"https://example.com/{i}" for i in range(5)]
+    out = list(shorten_many(urls, max_concurrency=5, ordered=False, _get=slow_first))
+    assert sorted(r.index for r in out) == list(range(5))
+    # медленный первый URL не держит остальных
+    assert out[-1].index == 0
+
+
+def test_shorten_many_per_url_errors_do_not_abort():
+    def flaky(url, timeout=None):
+        if "bad" in url:
+            return DummyResp(503, "down")
+        if "slow" in url:
+            raise requests.Timeout("read timed out")
+        return _ok_get(url)
+
+    urls = ["https://example.com/a", "ftp://nope", "https://bad.example.com", "https://slow.example.com"]
+    stats = BatchStats()
+    out = list(shorten_many(urls, max_concurrency=2, _get=flaky, stats=stats))
+
+    assert out[0].ok
+    assert isinstance(out[1].error, ValueError)
+    assert isinstance(out[2].error, RuntimeError)
+    assert isinstance(out[3].error, TimeoutError)
+    assert stats.submitted == 4
+    assert stats.succeeded == 1
+    assert stats.failed == 3
+    assert stats.throughput > 0
+
+
+def test_shorten_many_respects_max_concurrency():
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    def tracking_get(url, timeout=None):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.01)
+        with lock:
+            state["now"] -= 1
+        return _ok_get(url)
+
+    urls = (f"https://example.com/{i}" for i in range(30))
+    out = list(shorten_many(urls, max_concurrency=3, _get=tracking_get))
+    assert len(out) == 30
+    assert state["peak"] <= 3
+
+
+def test_shorten_many_pulls_input_lazily():
+    pulled = []
+
+    def source():
+        for i in range(1000):
+            pulled.append(i)
+            yield f"https://example.com/{i}"
+
+    it = shorten_many(source(), max_concurrency=2, _get=_ok_get)
+    first = next(it)
+    it.close()
+    assert first.index == 0
+    assert len(pulled) < 10
+
+
+def test_shorten_many_rejects_bad_concurrency():
+    with pytest.raises(ValueError):
+        list(shorten_many(["https://example.com"], max_concurrency=0))
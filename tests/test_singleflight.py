@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from urlcutter.shorteners import shorten_many
+from urlcutter.singleflight import SingleFlight, get_single_flight
+
+
+def test_concurrent_callers_share_one_call():
+    sf = SingleFlight()
+    calls = {"n": 0}
+    gate = threading.Event()
+
+    def slow():
+        calls["n"] += 1
+        gate.wait(2)
+        return "https://tinyurl.com/one"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.do("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    # ждём, пока все пятеро встанут в очередь за лидером
+    deadline = time.monotonic() + 2
+    while sf.stats().calls < 5 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    gate.set()
+    for t in threads:
+        t.join(2)
+
+    assert results == ["https://tinyurl.com/one"] * 5
+    assert calls["n"] == 1
+    st = sf.stats()
+    assert st.executed == 1 and st.coalesced == 4 and st.in_flight == 0
+    assert st.coalesced_ratio == pytest.approx(0.8)
+
+
+def test_followers_get_leaders_exception():
+    sf = SingleFlight()
+    gate = threading.Event()
+
+    def boom():
+        gate.wait(2)
+        raise RuntimeError("503")
+
+    errors = []
+
+    def worker():
+        try:
+            sf.do("k", boom)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 2
+    while sf.stats().calls < 3 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    gate.set()
+    for t in threads:
+        t.join(2)
+    assert errors == ["503"] * 3
+    assert sf.stats().executed == 1
+
+
+def test_sequential_calls_are_not_coalesced():
+    sf = SingleFlight()
+    assert sf.do("k", lambda: 1) == 1
+    assert sf.do("k", lambda: 2) == 2
+    assert sf.stats().coalesced == 0
+
+
+def test_different_keys_run_independently():
+    sf = SingleFlight()
+    assert sf.do("a", lambda: "a") == "a"
+    assert sf.do("b", lambda: "b") == "b"
+    assert sf.stats().executed == 2
+
+
+def test_follower_wait_timeout():
+    sf = SingleFlight()
+    gate = threading.Event()
+    t = threading.Thread(target=lambda: sf.do("k", gate.wait, 2))
+    t.start()
+    while sf.stats().in_flight == 0:
+        time.sleep(0.005)
+    with pytest.raises(TimeoutError):
+        sf.do("k", lambda: None, wait_timeout=0.05)
+    gate.set()
+    t.join(2)
+
+
+def test_batch_duplicates_coalesce():
+    calls = {"n": 0}
+    lock = threading.Lock()
+
+    class Resp:
+        status_code = 200
+        text = "https://tinyurl.com/dup"
+
+    def slow_get(url, timeout=None):
+        with lock:
+            calls["n"] += 1
+        time.sleep(0.05)
+        return Resp()
+
+    before = get_single_flight().stats().coalesced
+    out = list(shorten_many(["https://example.com/same"] * 4, max_concurrency=4, _get=slow_get))
+    assert all(r.short_url == "https://tinyurl.com/dup" for r in out)
+    assert calls["n"] < 4
+    assert get_single_flight().stats().coalesced > before
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from urlcutter.retry import ProviderUnavailable, RateLimited
+from urlcutter.shorteners import shorten_via_tinyurl_core
+from urlcutter.stub_server import FaultProfile, StubTinyUrlServer, parse_latency
+
+
+@pytest.fixture
+def stub_factory():
+    started = []
+
+    def _make(**profile):
+        stub = StubTinyUrlServer(FaultProfile(**profile), seed=0).start()
+        started.append(stub)
+        return stub
+
+    yield _make
+    for stub in started:
+        stub.stop()
+
+
+def test_ok_through_real_core(stub_factory):
+    stub = stub_factory()
+    short = shorten_via_tinyurl_core("https://example.com/a", 2.0, _get=stub.transport())
+    assert short.startswith(stub.base_url + "/")
+    assert stub.stats().ok == 1
+
+
+def test_rate_limit_carries_retry_after(stub_factory):
+    stub = stub_factory(p429=1.0, retry_after=3)
+    with pytest.raises(RateLimited) as ei:
+        shorten_via_tinyurl_core("https://example.com", 2.0, _get=stub.transport())
+    assert ei.value.retry_after == 3.0
+
+
+def test_server_errors(stub_factory):
+    stub = stub_factory(p5xx=1.0)
+    with pytest.raises(ProviderUnavailable):
+        shorten_via_tinyurl_core("https://example.com", 2.0, _get=stub.transport())
+    assert stub.stats().server_errors == 1
+
+
+def test_malformed_payload(stub_factory):
+    stub = stub_factory(p_malformed=1.0)
+    with pytest.raises(ValueError):
+        shorten_via_tinyurl_core("https://example.com", 2.0, _get=stub.transport())
+
+
+def test_hang_becomes_timeout(stub_factory):
+    stub = stub_factory(p_hang=1.0, hang_seconds=5.0)
+    with pytest.raises(TimeoutError):
+        shorten_via_tinyurl_core("https://example.com", 0.2, _get=stub.transport())
+    assert stub.stats().hangs == 1
+
+
+def test_per_client_quota(stub_factory):
+    stub = stub_factory(quota=2, quota_window=60)
+    get = stub.transport()
+    for _ in range(2):
+        shorten_via_tinyurl_core("https://example.com", 2.0, _get=get)
+    with pytest.raises(RateLimited) as ei:
+        shorten_via_tinyurl_core("https://example.com", 2.0, _get=get)
+    assert ei.value.retry_after >= 1
+    assert stub.stats().quota_rejected == 1
+
+
+@pytest.mark.parametrize("spec", ["fixed:0.1", "uniform:0.1:0.2", "lognormal:0.1:0.5", "pareto:0.1:2"])
+def test_latency_specs(spec):
+    sample = parse_latency(spec)
+    rng = random.Random(0)
+    assert all(v >= 0 for v in (sample(rng) for _ in range(100)))
+
+
+def test_bad_latency_spec():
+    with pytest.raises(ValueError):
+        parse_latency("gauss:1")
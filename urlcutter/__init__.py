@@ -8,16 +8,18 @@ from .protection import (
     CLIENT_RPM_LIMIT,
     RATE_LIMIT_WINDOW_SEC,
     AppState,
+    ProtectionEngine,
     _get_state,
     _reset_state,
     circuit_blocked,
     cooldown_left,
+    get_protection_engine,
     internet_ok,
     rate_limit_allow,
     record_failure,
     record_success,
 )
-from .shorteners import shorten_via_tinyurl_core
+from .shorteners import shorten_many, shorten_via_tinyurl_core
 
 __all__ = [
     "normalize_url",
@@ -30,14 +32,17 @@ __all__ = [
     "CLIENT_RPM_LIMIT",
     "RATE_LIMIT_WINDOW_SEC",
     "AppState",
+    "ProtectionEngine",
     "_get_state",
     "_reset_state",
     "circuit_blocked",
     "cooldown_left",
+    "get_protection_engine",
     "internet_ok",
     "rate_limit_allow",
     "record_failure",
     "record_success",
+    "shorten_many",
     "shorten_via_tinyurl_core",
 ]
 __version__ = "0.1.0"
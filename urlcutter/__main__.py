@@ -0,0 +1,5 @@
+"""`python -m urlcutter` — command-line entry point (see `urlcutter.cli`)."""
+
+from urlcutter.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,235 @@
+"""Custom aliases (vanity codes) for the local provider.
+
+`AliasRegistry` answers "is this code taken?" for `<base_url>/<code>` links.
+An in-memory Bloom filter of all existing codes is built once from the
+`links` and `local_codes` tables and updated on every issued code, so most
+checks — every keystroke while the user types an alias — are definite "free"
+answers without touching the DB. Only possible positives go to indexed
+equality lookups.
+
+The filter is per process and only a fast pre-check. Issuing a code
+(`claim`, `reserve`) inserts it into `local_codes`, whose primary key is
+`(base_url, code)`: of two processes racing for one code exactly one insert
+succeeds, the other gets IntegrityError and reports the code as taken.
+Auto-generated base62 codes are claimed the same way, in batches
+(`claim_many`), so a vanity alias can never be handed out again by the
+hi/lo allocator.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections.abc import Callable, Sequence
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from urlcutter.bloom import BloomFilter
+from urlcutter.db import engine as db_engine
+from urlcutter.db.models import Link, LocalCode
+
+__all__ = ["AliasRegistry", "AliasStats", "AliasTaken", "validate_alias"]
+
+ALIAS_RE = re.compile(r"[0-9A-Za-z_-]{3,32}")
+MIN_CAPACITY = 10_000
+DEFAULT_ERROR_RATE = 0.001
+LOAD_BATCH = 10_000
+CLAIM_CHUNK = 500  # строк на один INSERT: 2 параметра на строку, лимит SQLite — 32766
+
+SessionFactory = Callable[[], AbstractContextManager[Session]]
+
+
+class AliasTaken(ValueError):
+    """The requested alias is already used by another link."""
+
+
+def validate_alias(alias: str) -> str:
+    if not isinstance(alias, str) or not ALIAS_RE.fullmatch(alias):
+        raise ValueError("alias must be 3-32 characters: letters, digits, '-' or '_'")
+    return alias
+
+
+@dataclass(slots=True)
+class AliasStats:
+    entries: int
+    capacity: int
+    memory_bytes: int
+    hashes: int
+    expected_fp_rate: float
+    checks: int
+    definite_negatives: int
+    db_checks: int
+    false_positives: int
+
+    @property
+    def observed_fp_rate(self) -> float:
+        """Share of free codes that the filter could not rule out."""
+        free = self.definite_negatives + self.false_positives
+        return self.false_positives / free if free else 0.0
+
+
+class AliasRegistry:
+    """Bloom-filter-fronted set of codes in use under one base URL."""
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        session_factory: SessionFactory | None = None,
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.error_rate = error_rate
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # одна пересборка за раз
+        self._claim_lock = threading.Lock()  # вставки в local_codes этого процесса — по одной
+        self._filter: BloomFilter | None = None
+        self._added_during_load: list[str] | None = None  # коды, выданные, пока load() читал БД
+        self._checks = self._negatives = self._db_checks = self._false_positives = 0
+
+    def _session(self) -> AbstractContextManager[Session]:
+        return (self._session_factory or db_engine.get_session)()
+
+    # --- filter lifecycle ---
+
+    def load(self) -> None:
+        """(Re)build the filter from every `<base_url>/...` link and claimed code in the DB."""
+        with self._load_lock:
+            self._load()
+
+    def _load(self) -> None:
+        prefix = self.base_url + "/"
+        # LIKE сужает выборку, startswith ниже отсекает ложные совпадения по «_» и «%»
+        where = Link.short_url.like(prefix + "%")
+        claimed = LocalCode.base_url == self.base_url
+        with self._lock:
+            self._added_during_load = []
+        try:
+            with self._session() as s:
+                total = s.execute(select(func.count()).select_from(Link).where(where)).scalar_one()
+                total += s.execute(select(func.count()).select_from(LocalCode).where(claimed)).scalar_one()
+                bloom = BloomFilter(max(MIN_CAPACITY, 2 * total), self.error_rate)
+                stmt = select(Link.short_url).where(where).execution_options(yield_per=LOAD_BATCH)
+                for (short_url,) in s.execute(stmt):
+                    if short_url.startswith(prefix):
+                        bloom.add(short_url[len(prefix) :])
+                stmt = select(LocalCode.code).where(claimed).execution_options(yield_per=LOAD_BATCH)
+                for (code,) in s.execute(stmt):
+                    bloom.add(code)
+            with self._lock:
+                # выданное, пока читали БД, могло не попасть в выборку — доносим в новый фильтр
+                for code in self._added_during_load:
+                    bloom.add(code)
+                self._filter = bloom
+        finally:
+            with self._lock:
+                self._added_during_load = None
+
+    def _bloom(self) -> BloomFilter:
+        if self._filter is None:
+            with self._load_lock:
+                if self._filter is None:
+                    self._load()
+        return self._filter
+
+    def _grow_if_full(self) -> None:
+        bloom = self._filter
+        if bloom is None or bloom.count <= bloom.capacity:
+            return
+        with self._load_lock:
+            if self._filter is bloom:  # другой поток мог уже пересобрать
+                self._load()  # фильтр переполнен — пересобираем с запасом ×2
+
+    def _remember(self, code: str) -> None:
+        self._bloom()
+        with self._lock:
+            self._filter.add(code)  # текущий фильтр: его могли подменить после _bloom()
+            if self._added_during_load is not None:
+                self._added_during_load.append(code)
+        self._grow_if_full()
+
+    # --- checks ---
+
+    def _in_db(self, code: str) -> bool:
+        with self._session() as s:
+            stmt = select(Link.id).where(Link.short_url == f"{self.base_url}/{code}").limit(1)
+            if s.execute(stmt).first() is not None:
+                return True
+            return s.get(LocalCode, (self.base_url, code)) is not None
+
+    def is_taken(self, code: str) -> bool:
+        self._bloom()
+        with self._lock:
+            self._checks += 1
+            if code not in self._filter:
+                self._negatives += 1
+                return False  # точно свободен — без БД
+            self._db_checks += 1
+        taken = self._in_db(code)
+        if not taken:
+            with self._lock:
+                self._false_positives += 1
+        return taken
+
+    def is_available(self, alias: str) -> bool:
+        return not self.is_taken(validate_alias(alias))
+
+    def add(self, code: str) -> None:
+        """Remember a code issued elsewhere in the filter (no DB write)."""
+        self._remember(code)
+
+    def claim(self, code: str) -> bool:
+        """Insert `code` into `local_codes`; False when any process has already claimed it."""
+        with self._claim_lock, self._session() as s:
+            s.add(LocalCode(base_url=self.base_url, code=code))
+            try:
+                s.commit()
+            except IntegrityError:
+                s.rollback()
+                return False
+        self._remember(code)
+        return True
+
+    def claim_many(self, codes: Sequence[str]) -> list[str]:
+        """Claim a batch of generated codes in one transaction; returns those nobody had, in order."""
+        won: set[str] = set()
+        with self._claim_lock, self._session() as s:
+            for i in range(0, len(codes), CLAIM_CHUNK):
+                rows = [{"base_url": self.base_url, "code": c} for c in codes[i : i + CLAIM_CHUNK]]
+                # чужие (уже занятые) коды молча пропускаются, RETURNING говорит, какие достались нам
+                stmt = sqlite_insert(LocalCode).values(rows).on_conflict_do_nothing().returning(LocalCode.code)
+                won.update(s.execute(stmt).scalars())
+            s.commit()
+        claimed = [c for c in codes if c in won]
+        for code in claimed:
+            self._remember(code)
+        return claimed
+
+    def reserve(self, alias: str) -> str:
+        """Claim `alias` for a new link; raises AliasTaken if it is in use (in any process)."""
+        validate_alias(alias)
+        if self.is_taken(alias) or not self.claim(alias):
+            raise AliasTaken(f"alias {alias!r} is already taken")
+        return alias
+
+    def stats(self) -> AliasStats:
+        self._bloom()
+        with self._lock:
+            bloom = self._filter
+            return AliasStats(
+                entries=bloom.count,
+                capacity=bloom.capacity,
+                memory_bytes=bloom.memory_bytes,
+                hashes=bloom.k,
+                expected_fp_rate=bloom.expected_fp_rate(),
+                checks=self._checks,
+                definite_negatives=self._negatives,
+                db_checks=self._db_checks,
+                false_positives=self._false_positives,
+            )
@@ -0,0 +1,256 @@
+"""Approximate unique visitors per short link (HyperLogLog), plus read APIs.
+
+Each visit updates two in-memory sketches: the link's lifetime sketch and
+the sketch of the link's current (UTC) day. `flush()` merges them into the
+DB in one transaction — lifetime sketches into `links.visitors_hll`, daily
+ones into `link_visitor_days` — with a handful of batched statements
+regardless of how many visits arrived. Raw visitor ids are never stored,
+only their hashes inside the sketches.
+
+Reads never touch raw events: a link's uniques are the estimate of one
+stored sketch, uniques of a set of links or of a date range are the estimate
+of the merged sketches (a week = merge of 7 days). Estimates reflect the
+last flush.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable, Iterable
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+from datetime import UTC, date, datetime
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from urlcutter.db import engine as db_engine
+from urlcutter.db.models import Link, LinkVisitorDay
+from urlcutter.hll import DEFAULT_PRECISION, HyperLogLog
+
+__all__ = ["LinkStats", "VisitorAnalytics", "get_visitor_analytics"]
+
+_IN_CHUNK = 500
+
+SessionFactory = Callable[[], AbstractContextManager[Session]]
+
+log = logging.getLogger("urlcutter.analytics")
+
+
+def _utc_today() -> date:
+    return datetime.now(UTC).date()
+
+
+@dataclass(slots=True)
+class LinkStats:
+    short_url: str
+    clicks: int
+    uniques: int
+
+
+def _chunks(items: list, size: int = _IN_CHUNK) -> Iterable[list]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class VisitorAnalytics:
+    """In-memory HyperLogLog buffers with batched persistence and estimate queries."""
+
+    def __init__(
+        self,
+        *,
+        p: int = DEFAULT_PRECISION,
+        session_factory: SessionFactory | None = None,
+        today: Callable[[], date] = _utc_today,
+    ) -> None:
+        self.p = p
+        self._session_factory = session_factory
+        self._today = today
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._lifetime: dict[str, HyperLogLog] = {}
+        self._daily: dict[tuple[str, date], HyperLogLog] = {}
+
+    def _session(self) -> AbstractContextManager[Session]:
+        return (self._session_factory or db_engine.get_session)()
+
+    # --- write path ---
+
+    def record(self, short_url: str, visitor: str | bytes) -> None:
+        day = self._today()
+        with self._lock:
+            sketch = self._lifetime.get(short_url)
+            if sketch is None:
+                sketch = self._lifetime[short_url] = HyperLogLog(self.p)
+            sketch.add(visitor)
+            sketch = self._daily.get((short_url, day))
+            if sketch is None:
+                sketch = self._daily[(short_url, day)] = HyperLogLog(self.p)
+            sketch.add(visitor)
+
+    def pending(self) -> int:
+        """How many links have visits not yet written to the DB."""
+        with self._lock:
+            return len(self._lifetime)
+
+    def _restore(self, lifetime: dict[str, HyperLogLog], daily: dict[tuple[str, date], HyperLogLog]) -> None:
+        with self._lock:
+            for key, sketch in lifetime.items():
+                self._lifetime.setdefault(key, HyperLogLog(self.p)).merge(sketch)
+            for key, sketch in daily.items():
+                self._daily.setdefault(key, HyperLogLog(self.p)).merge(sketch)
+
+    def flush(self) -> int:
+        """Merge buffered sketches into the DB; returns how many links were updated."""
+        with self._flush_lock:
+            with self._lock:
+                lifetime, self._lifetime = self._lifetime, {}
+                daily, self._daily = self._daily, {}
+            if not lifetime:
+                return 0
+            try:
+                with self._session() as s:
+                    updated = self._persist(s, lifetime, daily)
+                    s.commit()
+                return updated
+            except Exception as e:
+                self._restore(lifetime, daily)  # не теряем — допишем в следующий раз
+                log.warning("visitor_flush_failed links=%d err=%s", len(lifetime), e)
+                return 0
+
+    def _persist(self, s: Session, lifetime: dict[str, HyperLogLog], daily: dict[tuple[str, date], HyperLogLog]) -> int:
+        ids = self._latest_ids(s, list(lifetime))
+        if not ids:
+            return 0
+
+        by_id = {v: k for k, v in ids.items()}
+        rows = []
+        for chunk in _chunks(list(by_id)):
+            for link_id, blob in s.execute(select(Link.id, Link.visitors_hll).where(Link.id.in_(chunk))):
+                merged = lifetime[by_id[link_id]]
+                if blob:
+                    merged.merge(HyperLogLog.from_bytes(blob))
+                rows.append({"lid": link_id, "blob": merged.to_bytes()})
+        table = Link.__table__
+        s.connection().execute(
+            update(table).where(table.c.id == bindparam("lid")).values(visitors_hll=bindparam("blob")), rows
+        )
+
+        wanted = {(ids[short], day): sketch for (short, day), sketch in daily.items() if short in ids}
+        days = sorted({day for _, day in wanted})
+        for chunk in _chunks(list(by_id)):
+            stmt = select(LinkVisitorDay).where(LinkVisitorDay.link_id.in_(chunk), LinkVisitorDay.day.in_(days))
+            for row in s.execute(stmt).scalars():
+                sketch = wanted.get((row.link_id, row.day))
+                if sketch is not None:
+                    sketch.merge(HyperLogLog.from_bytes(row.sketch))
+        if wanted:
+            ins = sqlite_insert(LinkVisitorDay)
+            s.execute(
+                ins.on_conflict_do_update(index_elements=["link_id", "day"], set_={"sketch": ins.excluded.sketch}),
+                [{"link_id": lid, "day": day, "sketch": sk.to_bytes()} for (lid, day), sk in wanted.items()],
+            )
+        return len(rows)
+
+    @staticmethod
+    def _latest_ids(s: Session, short_urls: list[str]) -> dict[str, int]:
+        # как и везде: при дублях short_url работаем с самой свежей записью
+        ids: dict[str, int] = {}
+        for chunk in _chunks(short_urls):
+            stmt = select(Link.short_url, func.max(Link.id)).where(Link.short_url.in_(chunk)).group_by(Link.short_url)
+            ids.update(dict(s.execute(stmt).all()))
+        return ids
+
+    # --- read path ---
+
+    def _lifetime_sketches(self, short_urls: list[str]) -> dict[str, HyperLogLog]:
+        out: dict[str, HyperLogLog] = {}
+        with self._session() as s:
+            ids = self._latest_ids(s, short_urls)
+            by_id = {v: k for k, v in ids.items()}
+            for chunk in _chunks(list(by_id)):
+                for link_id, blob in s.execute(select(Link.id, Link.visitors_hll).where(Link.id.in_(chunk))):
+                    if blob:
+                        out[by_id[link_id]] = HyperLogLog.from_bytes(blob)
+        return out
+
+    def uniques(self, short_url: str) -> int:
+        return self.uniques_many([short_url]).get(short_url, 0)
+
+    def uniques_many(self, short_urls: Iterable[str]) -> dict[str, int]:
+        """Estimated lifetime uniques per link; links without visits map to 0."""
+        wanted = list(dict.fromkeys(short_urls))
+        sketches = self._lifetime_sketches(wanted)
+        return {u: sketches[u].count() if u in sketches else 0 for u in wanted}
+
+    def rollup(
+        self, short_urls: Iterable[str], day_from: date | None = None, day_to: date | None = None
+    ) -> HyperLogLog:
+        """Merged sketch of the links, over all time or over [day_from, day_to] (inclusive)."""
+        wanted = list(dict.fromkeys(short_urls))
+        if day_from is None and day_to is None:
+            return HyperLogLog.union(self._lifetime_sketches(wanted).values(), self.p)
+        out = HyperLogLog(self.p)
+        with self._session() as s:
+            ids = list(self._latest_ids(s, wanted).values())
+            for chunk in _chunks(ids):
+                stmt = select(LinkVisitorDay.sketch).where(LinkVisitorDay.link_id.in_(chunk))
+                if day_from is not None:
+                    stmt = stmt.where(LinkVisitorDay.day >= day_from)
+                if day_to is not None:
+                    stmt = stmt.where(LinkVisitorDay.day <= day_to)
+                for (blob,) in s.execute(stmt):
+                    out.merge(HyperLogLog.from_bytes(blob))
+        return out
+
+    def uniques_total(self, short_urls: Iterable[str], day_from: date | None = None, day_to: date | None = None) -> int:
+        """Estimated distinct visitors across all given links (a visitor of two links counts once)."""
+        return self.rollup(short_urls, day_from, day_to).count()
+
+    def daily_uniques(self, short_url: str, day_from: date, day_to: date) -> dict[date, int]:
+        out: dict[date, int] = {}
+        with self._session() as s:
+            link_id = self._latest_ids(s, [short_url]).get(short_url)
+            if link_id is None:
+                return out
+            stmt = (
+                select(LinkVisitorDay.day, LinkVisitorDay.sketch)
+                .where(LinkVisitorDay.link_id == link_id, LinkVisitorDay.day.between(day_from, day_to))
+                .order_by(LinkVisitorDay.day)
+            )
+            for day, blob in s.execute(stmt):
+                out[day] = HyperLogLog.from_bytes(blob).count()
+        return out
+
+    def link_stats(self, short_urls: Iterable[str]) -> list[LinkStats]:
+        """Clicks and estimated uniques per link, in input order (unknown links are skipped)."""
+        wanted = list(dict.fromkeys(short_urls))
+        rows: dict[str, tuple[int, bytes | None]] = {}
+        with self._session() as s:
+            ids = self._latest_ids(s, wanted)
+            by_id = {v: k for k, v in ids.items()}
+            for chunk in _chunks(list(by_id)):
+                stmt = select(Link.id, Link.click_count, Link.visitors_hll).where(Link.id.in_(chunk))
+                for link_id, clicks, blob in s.execute(stmt):
+                    rows[by_id[link_id]] = (clicks or 0, blob)
+        return [
+            LinkStats(u, rows[u][0], HyperLogLog.from_bytes(rows[u][1]).count() if rows[u][1] else 0)
+            for u in wanted
+            if u in rows
+        ]
+
+
+# --- Process-wide instance ---
+
+_analytics: VisitorAnalytics | None = None
+_analytics_lock = threading.Lock()
+
+
+def get_visitor_analytics() -> VisitorAnalytics:
+    global _analytics  # noqa: PLW0603
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = VisitorAnalytics()
+        return _analytics
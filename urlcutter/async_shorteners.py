@@ -0,0 +1,181 @@
+"""Asyncio-native TinyURL shortener core.
+
+Mirrors `shorten_via_tinyurl_core` (same normalization and the same
+ValueError / TimeoutError / RuntimeError contract) but never blocks the event
+loop: HTTP goes over `asyncio.open_connection`, deadlines use
+`asyncio.timeout`, and cancelling the awaiting task aborts the request.
+
+The Flet UI can await it from `page.run_task(...)`; batch code can keep
+thousands of shortens in flight on a single thread via `ashorten_many`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ssl
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from urllib.parse import quote, urlsplit
+
+from urlcutter import normalize_url
+from urlcutter.retry import error_for_status
+from urlcutter.shorteners import DEFAULT_HTTP_TIMEOUT, ShortenResult, _looks_like_url
+
+__all__ = ["AsyncResponse", "ashorten_many", "ashorten_via_tinyurl"]
+
+TINYURL_API = "https://tinyurl.com/api-create.php"
+USER_AGENT = "urlcutter/0.1"
+MAX_RESPONSE_BYTES = 64 * 1024  # ответ шортенера — одна строка, больше не нужно
+
+
+@dataclass(slots=True)
+class AsyncResponse:
+    status_code: int
+    text: str
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def _decode_chunked(body: bytes) -> bytes:
+    out = bytearray()
+    pos = 0
+    while True:
+        eol = body.find(b"\r\n", pos)
+        if eol < 0:
+            raise RuntimeError("truncated chunked body")
+        size = int(body[pos:eol].split(b";", 1)[0], 16)
+        if size == 0:
+            return bytes(out)
+        start = eol + 2
+        out += body[start : start + size]
+        pos = start + size + 2
+
+
+async def _http_get(url: str, timeout: float) -> AsyncResponse:
+    """Minimal non-blocking HTTP/1.1 GET (one request per connection)."""
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    host = parts.hostname or ""
+    port = parts.port or (443 if https else 80)
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+
+    async with asyncio.timeout(timeout):
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl.create_default_context() if https else None)
+        try:
+            request = (
+                f"GET {target} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                f"User-Agent: {USER_AGENT}\r\n"
+                "Accept: */*\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(request.encode("ascii"))
+            await writer.drain()
+
+            head = await reader.readuntil(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+            status = int(status_line.split(" ", 2)[1])
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    k, v = line.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+
+            if "content-length" in headers:
+                body = await reader.readexactly(min(int(headers["content-length"]), MAX_RESPONSE_BYTES))
+            else:
+                # Connection: close — читаем до EOF (с потолком на размер)
+                buf = bytearray()
+                while len(buf) < MAX_RESPONSE_BYTES:
+                    chunk = await reader.read(MAX_RESPONSE_BYTES - len(buf))
+                    if not chunk:
+                        break
+                    buf += chunk
+                body = bytes(buf)
+                if headers.get("transfer-encoding", "").lower() == "chunked":
+                    body = _decode_chunked(body)
+        finally:
+            writer.close()
+            with contextlib.suppress(OSError, ssl.SSLError):
+                await writer.wait_closed()
+
+    return AsyncResponse(status_code=status, text=body.decode("utf-8", "replace"), headers=headers)
+
+
+async def ashorten_via_tinyurl(
+    url: str,
+    timeout: float | None = None,
+    *,
+    _aget: Callable[[str, float], Awaitable[object]] | None = None,
+) -> str:
+    """Return a TinyURL short link for `url` without blocking the event loop.
+
+    Raises:
+      ValueError   — bad input, or provider returned non‑URL payload.
+      TimeoutError — the call did not finish within `timeout` seconds.
+      RuntimeError — network/provider errors in other cases (`ProviderError`
+                     with status/Retry-After for HTTP error answers).
+    """
+    if not isinstance(url, str) or not url.strip():
+        raise ValueError("url must be a non-empty string")
+    norm = normalize_url(url)
+
+    aget = _aget or _http_get
+    deadline = timeout or DEFAULT_HTTP_TIMEOUT
+    api = f"{TINYURL_API}?url={quote(norm, safe='')}"
+    try:
+        async with asyncio.timeout(deadline):
+            resp = await aget(api, deadline)
+    except TimeoutError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"TinyURL request failed: {e}") from e
+
+    if getattr(resp, "status_code", HTTPStatus.OK) != HTTPStatus.OK:
+        raise error_for_status("TinyURL", resp.status_code, getattr(resp, "headers", None))
+
+    short = getattr(resp, "text", "").strip()
+    if not _looks_like_url(short):
+        raise ValueError("TinyURL returned invalid payload")
+    return short
+
+
+async def ashorten_many(
+    urls: Iterable[str],
+    *,
+    max_concurrency: int = 64,
+    timeout: float | None = None,
+    _aget: Callable[[str, float], Awaitable[object]] | None = None,
+) -> AsyncIterator[ShortenResult]:
+    """Yield `ShortenResult`s as they complete, at most `max_concurrency` in flight."""
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be >= 1")
+
+    async def _one(index: int, u: str) -> ShortenResult:
+        started = time.monotonic()
+        try:
+            short = await ashorten_via_tinyurl(u, timeout, _aget=_aget)
+            return ShortenResult(index=index, url=u, short_url=short, elapsed=time.monotonic() - started)
+        except (ValueError, TimeoutError, RuntimeError) as e:
+            return ShortenResult(index=index, url=u, error=e, elapsed=time.monotonic() - started)
+
+    source = enumerate(urls)
+    pending: set[asyncio.Task[ShortenResult]] = set()
+    try:
+        for index, u in source:
+            pending.add(asyncio.create_task(_one(index, u)))
+            if len(pending) >= max_concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,68 @@
+"""Plain Bloom filter: fast definite negatives for set membership.
+
+Sized from the expected number of items and the target false-positive
+rate (`m = -n·ln p / ln²2` bits, `k = m/n · ln 2` hash functions). The k bit
+positions come from one 128-bit BLAKE2b digest via double hashing
+(`h1 + i·h2`), so an operation costs a single hash call.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+
+__all__ = ["BloomFilter"]
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false-positive rate."""
+
+    __slots__ = ("capacity", "error_rate", "m", "k", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.m = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str | bytes) -> list[int]:
+        data = item.encode() if isinstance(item, str) else item
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, item: str | bytes) -> bool:
+        """Add `item`; returns False if it was (probably) present already."""
+        bits = self.bits
+        new = False
+        for pos in self._positions(item):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item: str | bytes) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def expected_fp_rate(self) -> float:
+        """False-positive probability at the current fill: (1 - e^(-k·n/m))^k."""
+        return (1 - math.exp(-self.k * self.count / self.m)) ** self.k
@@ -0,0 +1,614 @@
+"""Command-line entry point: `python -m urlcutter shorten|serve|snapshot|stats|alias|quota ...`.
+
+Bulk mode streams URLs (one per line) from a file or stdin through
+`shorten_many` and writes a JSONL or CSV row per URL as soon as it completes.
+Input is fed under the local rate limiter and circuit breaker of the
+process-wide `ProtectionEngine`. Successful rows go to the history DB in
+batches, each written right before a checkpoint so a resume never stores a
+row twice.
+
+Resuming: every output row carries its input line number, and a small
+checkpoint next to the output (`<output>.ckpt`) records which lines are done
+plus the output size at that moment. On restart the checkpoint is loaded,
+rows written after it are recovered from the output tail, and only the
+remaining lines are shortened.
+
+With `--quota`, every provider call is admitted by the persistent quota
+ledger (`urlcutter.quota`); once the provider's hourly or daily budget is
+spent the run stops and leaves the rest of the input for a resume.
+`--quota-pace` also spreads calls so the budget lasts until it resets.
+
+`serve` runs the redirect server for locally issued short codes
+(see `urlcutter.redirect_server`); `snapshot` builds or refreshes the mmap
+lookup snapshot it can read from (see `urlcutter.link_snapshot`); `stats`
+prints clicks and estimated unique visitors (see `urlcutter.analytics`);
+`alias` checks or issues custom aliases of the local provider; `quota` shows
+how much of each provider's budget is left. Every command first upgrades the
+history DB schema to the latest migration, as the GUI does on start-up.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import itertools
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TextIO
+
+from urlcutter.db.migrate import upgrade_to_head
+from urlcutter.db.repo.history_service import HistoryService
+from urlcutter.db.repo.schemas import LinkRecord
+from urlcutter.protection import AppState, get_protection_engine
+from urlcutter.quota import QuotaExhausted, QuotaLedger, get_quota_ledger
+from urlcutter.retry import RetryPolicy
+from urlcutter.shorteners import BatchStats, ShortenResult, get_result_cache, shorten_many
+
+__all__ = ["Checkpoint", "main", "run_alias", "run_quota", "run_serve", "run_shorten", "run_snapshot", "run_stats"]
+
+CHECKPOINT_EVERY = 500  # строк между сохранениями чекпоинта
+CHECKPOINT_INTERVAL = 5.0  # ... или секунд
+HISTORY_BATCH = 200
+QUOTA_RECHECK = 50  # строк между перечитываниями остатка квоты
+CSV_FIELDS = ("line", "url", "short_url", "provider", "error")
+
+log = logging.getLogger("urlcutter.cli")
+
+
+@dataclass(slots=True)
+class Checkpoint:
+    """Which input lines are finished: all below `watermark`, plus the sparse `done` set."""
+
+    input: str
+    output_bytes: int = 0
+    watermark: int = 1  # строки нумеруются с 1
+    done: set[int] = field(default_factory=set)
+
+    def mark(self, line: int) -> None:
+        if line < self.watermark:
+            return
+        self.done.add(line)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def is_done(self, line: int) -> bool:
+        return line < self.watermark or line in self.done
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        payload = {
+            "version": 1,
+            "input": self.input,
+            "output_bytes": self.output_bytes,
+            "watermark": self.watermark,
+            "done": sorted(self.done),
+        }
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp, path)  # атомарно: либо старый, либо новый чекпоинт
+
+    @classmethod
+    def load(cls, path: Path) -> Checkpoint:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(
+            input=data["input"],
+            output_bytes=int(data["output_bytes"]),
+            watermark=int(data["watermark"]),
+            done=set(data["done"]),
+        )
+
+
+# ---------- input / output ----------
+
+
+def _read_lines(stream: TextIO) -> Iterator[tuple[int, str]]:
+    for line_no, raw in enumerate(stream, start=1):
+        yield line_no, raw.strip()
+
+
+def _parse_row(fmt: str, raw: str) -> dict | None:
+    if fmt == "jsonl":
+        return json.loads(raw)
+    row = next(csv.reader([raw]))
+    if row == list(CSV_FIELDS):
+        return None  # заголовок
+    return dict(zip(CSV_FIELDS, row, strict=False))
+
+
+def _recover_tail(path: Path, ckpt: Checkpoint, fmt: str) -> list[dict]:
+    """Mark rows written after the checkpoint as done; drop a torn last line."""
+    if not path.exists():
+        ckpt.output_bytes = 0
+        return []
+    with path.open("r+b") as f:
+        f.seek(ckpt.output_bytes)
+        tail = f.read()
+        complete = tail[: tail.rfind(b"\n") + 1]
+        if len(complete) != len(tail):
+            f.truncate(ckpt.output_bytes + len(complete))  # строка оборвалась на kill
+    rows = []
+    for raw in complete.decode("utf-8").splitlines():
+        row = _parse_row(fmt, raw) if raw else None
+        if row is None:
+            continue
+        ckpt.mark(int(row["line"]))
+        rows.append(row)
+    ckpt.output_bytes += len(complete)
+    return rows
+
+
+class _Writer:
+    def __init__(self, stream: TextIO, fmt: str, *, header: bool) -> None:
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = csv.writer(stream, lineterminator="\n") if fmt == "csv" else None
+        if self._csv is not None and header:
+            self._csv.writerow(CSV_FIELDS)
+
+    def write(self, line: int, res: ShortenResult, provider: str) -> None:
+        error = None if res.ok else f"{type(res.error).__name__}: {res.error}"
+        short = res.short_url if res.ok else None
+        if self._csv is not None:
+            self._csv.writerow((line, res.url, short or "", provider if res.ok else "", error or ""))
+        else:
+            row = {"line": line, "url": res.url, "short_url": short, "provider": provider if res.ok else None}
+            row["error"] = error
+            self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+# ---------- limiter gate ----------
+
+
+def _gated(
+    items: Iterable[tuple[int, str]],
+    state: AppState,
+    logger: logging.Logger,
+    *,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[tuple[int, str]]:
+    """Hand out work only when the circuit admits the call and the local rate limit allows.
+
+    Each handed-out item holds its admission (a probe slot when the circuit is
+    half-open) until the caller reports it with `record_*` or `circuit_release`.
+    """
+    # у тестовых состояний может не быть circuit_acquire — тогда только смотрим
+    acquire = getattr(state, "circuit_acquire", None)
+    release = getattr(state, "circuit_release", None)
+    for item in items:
+        while True:
+            admitted = acquire() if acquire is not None else not state.circuit_blocked()
+            if not admitted:
+                wait = max(1, state.cooldown_left())
+                logger.warning("bulk_paused reason=circuit_open cooldown_left=%ds", wait)
+                sleep(wait)
+                continue
+            if not state.rate_limit_allow(logger):
+                if release is not None:
+                    release()  # слот взят, а вызова не будет — отдаём
+                sleep(1.0)
+                continue
+            break
+        yield item
+
+
+def _quota_paced(  # noqa: PLR0913
+    items: Iterable[tuple[int, str]],
+    ledger: QuotaLedger,
+    provider: str,
+    logger: logging.Logger,
+    *,
+    pace: bool = False,
+    sleep: Callable[[float], None] = time.sleep,
+    clock: Callable[[], float] = time.monotonic,
+) -> Iterator[tuple[int, str]]:
+    """Stop handing out work once the provider's budget is spent; with `pace`, spread it until the reset."""
+    interval = 0.0
+    next_at = clock()
+    for n, item in enumerate(items):
+        if n % QUOTA_RECHECK == 0:
+            status = ledger.status(provider)
+            if status.remaining == 0:
+                logger.warning(
+                    "bulk_stopped reason=quota_exhausted provider=%s reset_in=%ds", provider, status.reset_in
+                )
+                return
+            rate = status.sustainable_rate if pace else None
+            interval = 1.0 / rate if rate else 0.0
+        now = clock()
+        if next_at > now:
+            sleep(next_at - now)
+            now = next_at
+        next_at = now + interval
+        yield item
+
+
+# ---------- command ----------
+
+
+class _BulkJob:
+    """State of one `shorten` run: checkpoint, output, history buffer."""
+
+    def __init__(self, args: argparse.Namespace, history: HistoryService | None, state: AppState) -> None:
+        self.args = args
+        self.fmt = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+        self.out_path = Path(args.output) if args.output != "-" else None
+        self.ckpt_path = Path(args.checkpoint) if args.checkpoint else None
+        if self.ckpt_path is None and self.out_path is not None:
+            self.ckpt_path = self.out_path.with_name(self.out_path.name + ".ckpt")
+        self.history = history
+        self.state = state
+        self.ckpt = Checkpoint(input=args.input)
+        self.pending_history: list[LinkRecord] = []
+        self.since_save = 0
+        self.last_save = time.monotonic()
+
+    def prepare(self) -> str | None:
+        """Load the checkpoint and recover the output tail; returns an error message or None."""
+        if self.ckpt_path is not None and self.out_path is None:
+            return "checkpoints need --output FILE (rows are recovered from it on resume)"
+        resume = self.ckpt_path is not None and self.ckpt_path.exists()
+        if resume:
+            self.ckpt = Checkpoint.load(self.ckpt_path)
+            if self.ckpt.input != self.args.input:
+                return f"{self.ckpt_path} belongs to input {self.ckpt.input!r}; remove it to start over"
+            recovered = _recover_tail(self.out_path, self.ckpt, self.fmt)
+            # эти строки успели попасть в вывод, но не в историю
+            self.pending_history += [
+                LinkRecord(None, r["url"], r["short_url"], r["provider"], None) for r in recovered if r.get("short_url")
+            ]
+            log.info("bulk_resume recovered=%d watermark=%d", len(recovered), self.ckpt.watermark)
+        elif self.out_path is not None and self.out_path.exists():
+            self.out_path.unlink()  # без чекпоинта начинаем с чистого файла
+        return None
+
+    def pending(self, stream: TextIO) -> Iterator[tuple[int, str]]:
+        for line_no, url in _read_lines(stream):
+            if self.ckpt.is_done(line_no):
+                continue
+            if not url or url.startswith("#"):
+                self.ckpt.mark(line_no)  # пустые строки и комментарии «готовы» сразу
+                continue
+            yield line_no, url
+
+    def record(self, line_no: int, res: ShortenResult) -> None:
+        self.ckpt.mark(line_no)
+        if res.ok:
+            self.state.record_success()
+            self.pending_history.append(LinkRecord(None, res.url, res.short_url, "tinyurl", None))
+        elif not isinstance(res.error, ValueError):
+            self.state.record_failure()  # кривой ввод предохранитель не трогает
+        else:
+            self.release()
+        self.since_save += 1
+
+    def release(self) -> None:
+        """Give back the circuit admission of a URL that reported no outcome."""
+        release = getattr(self.state, "circuit_release", None)
+        if release is not None:
+            release()
+
+    def due(self) -> bool:
+        # полная пачка истории тоже повод сохраниться: историю пишем только вместе с чекпоинтом,
+        # иначе после падения восстановленный хвост попал бы в неё второй раз
+        return (
+            self.since_save >= CHECKPOINT_EVERY
+            or len(self.pending_history) >= self.args.history_batch
+            or time.monotonic() - self.last_save >= CHECKPOINT_INTERVAL
+        )
+
+    def flush_history(self) -> None:
+        if self.history is None or not self.pending_history:
+            return
+        batch = max(1, self.args.history_batch)
+        for i in range(0, len(self.pending_history), batch):
+            rows = self.pending_history[i : i + batch]
+            try:
+                self.history.add_many(rows)
+            except Exception as e:
+                log.warning("bulk_history_failed rows=%d err=%s", len(rows), e)
+        self.pending_history.clear()
+
+    def save(self, out_stream: TextIO) -> None:
+        # порядок важен: вывод → история → чекпоинт; историю пишем только здесь
+        out_stream.flush()
+        self.flush_history()
+        if self.ckpt_path is not None:
+            self.ckpt.output_bytes = out_stream.tell()
+            self.ckpt.save(self.ckpt_path)
+        self.since_save, self.last_save = 0, time.monotonic()
+
+
+def run_shorten(  # noqa: PLR0912, PLR0913, PLR0915
+    args: argparse.Namespace,
+    *,
+    stdin: TextIO | None = None,
+    stdout: TextIO | None = None,
+    history: HistoryService | None = None,
+    state: AppState | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+    quota: QuotaLedger | None = None,
+    _get: Callable[..., object] | None = None,
+) -> int:
+    """Run the `shorten` subcommand; returns the process exit code."""
+    if history is None and not args.no_history:
+        from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService  # noqa: PLC0415
+
+        history = SqlAlchemyHistoryService()
+    job = _BulkJob(args, history, state or get_protection_engine())
+    err = job.prepare()
+    if err is not None:
+        print(f"error: {err}", file=sys.stderr)
+        return 2
+
+    own_input = args.input != "-"
+    in_stream = open(args.input, encoding="utf-8") if own_input else (stdin or sys.stdin)  # noqa: SIM115
+    if job.out_path is not None:
+        out_stream = job.out_path.open("a", encoding="utf-8", newline="")
+        header = out_stream.tell() == 0
+    else:
+        out_stream, header = stdout or sys.stdout, True
+    writer = _Writer(out_stream, job.fmt, header=header)
+
+    if quota is None and (args.quota or args.quota_pace):
+        quota = get_quota_ledger()
+    in_flight: dict[int, int] = {}  # позиция в shorten_many -> номер строки
+    positions = itertools.count()
+    deferred = 0  # строк, отложенных до сброса квоты
+
+    def _todo() -> Iterator[str]:
+        items = job.pending(in_stream)
+        if quota is not None:
+            items = _quota_paced(items, quota, "tinyurl", log, pace=args.quota_pace, sleep=sleep)
+        # предохранитель — последним: взятый им слот не должен пропасть в отброшенной строке
+        for line_no, url in _gated(items, job.state, log, sleep=sleep):
+            if deferred:
+                job.release()
+                return  # квоту выбрали параллельно (другой процесс) — дальше не подаём
+            in_flight[next(positions)] = line_no
+            yield url
+
+    stats = BatchStats()
+    interrupted = False
+    try:
+        for res in shorten_many(
+            _todo(),
+            max_concurrency=args.concurrency,
+            timeout=args.timeout,
+            ordered=False,
+            retry=RetryPolicy(max_attempts=1 + args.retries) if args.retries else None,
+            cache=get_result_cache(),
+            stats=stats,
+            quota=quota,
+            _get=_get,
+        ):
+            line_no = in_flight.pop(res.index)
+            if isinstance(res.error, QuotaExhausted):
+                deferred += 1  # ни строки в выводе, ни отметки в чекпоинте: доделает следующий запуск
+                job.release()
+                continue
+            writer.write(line_no, res, "tinyurl")
+            job.record(line_no, res)
+            if job.due():
+                job.save(out_stream)
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        for _ in in_flight:
+            job.release()  # исход прерванных вызовов неизвестен
+        job.save(out_stream)
+        if job.out_path is not None:
+            out_stream.close()
+        if own_input:
+            in_stream.close()
+
+    print(
+        f"done: ok={stats.succeeded} failed={stats.failed} "
+        f"elapsed={stats.elapsed:.1f}s throughput={stats.throughput:.1f}/s",
+        file=sys.stderr,
+    )
+    if deferred:
+        print(f"quota: {deferred} lines deferred until the provider budget resets", file=sys.stderr)
+    if interrupted:
+        return 130
+    return 1 if stats.failed > deferred else 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    # импорт здесь: `shorten` не должен тянуть сервер и наоборот
+    from urlcutter.analytics import VisitorAnalytics
+    from urlcutter.clicks import ClickCounter
+    from urlcutter.link_snapshot import SnapshotHolder
+    from urlcutter.redirect_server import LinkResolver, RedirectServer
+
+    snapshot = SnapshotHolder(args.snapshot) if args.snapshot else None
+    resolver = LinkResolver(args.base_url, lru_size=args.lru_size, snapshot=snapshot)
+    clicks = None
+    if args.click_flush > 0:
+        clicks = ClickCounter(
+            flush_interval=args.click_flush,
+            max_unflushed=args.click_max_unflushed,
+            visitors=None if args.no_uniques else VisitorAnalytics(),
+        ).start()
+    server = RedirectServer(resolver, host=args.host, port=args.port, status=args.status, clicks=clicks)
+
+    async def _watch_snapshot() -> None:
+        while True:
+            await asyncio.sleep(args.snapshot_reload)
+            if await asyncio.to_thread(snapshot.reload):
+                print(f"snapshot reloaded: {len(snapshot.current)} links", file=sys.stderr)
+
+    async def _run() -> None:
+        await server.start()
+        print(f"serving {resolver.base_url}/<code> on http://{server.host}:{server.port}", file=sys.stderr)
+        watcher = asyncio.create_task(_watch_snapshot()) if snapshot is not None else None
+        serving = asyncio.create_task(server.serve_forever())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):  # Windows: остаётся KeyboardInterrupt
+                loop.add_signal_handler(sig, serving.cancel)
+        try:
+            with contextlib.suppress(asyncio.CancelledError):
+                await serving
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    try:
+        with contextlib.suppress(KeyboardInterrupt):
+            asyncio.run(_run())
+    finally:
+        print(f"stopped: {server.stats}", file=sys.stderr)
+        if clicks is not None:
+            clicks.close()  # дописываем накопленные клики перед выходом
+        if snapshot is not None:
+            snapshot.close()
+    return 0
+
+
+def run_snapshot(args: argparse.Namespace) -> int:
+    from urlcutter.link_snapshot import build_snapshot, default_snapshot_path
+
+    path = args.path or default_snapshot_path()
+    st = build_snapshot(path, full=args.full)
+    print(
+        f"{path}: links={st.entries} new_rows={st.new_rows} watermark={st.watermark} elapsed={st.elapsed:.2f}s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_stats(args: argparse.Namespace, *, stdout: TextIO | None = None) -> int:
+    from urlcutter.analytics import get_visitor_analytics
+
+    out = stdout or sys.stdout
+    analytics = get_visitor_analytics()
+    rows = analytics.link_stats(args.short_urls)
+    for r in rows:
+        out.write(f"{r.short_url}\tclicks={r.clicks}\tuniques~{r.uniques}\n")
+    if len(rows) > 1:
+        out.write(f"total\tuniques~{analytics.uniques_total(r.short_url for r in rows)}\n")
+    return 0 if rows else 1
+
+
+def run_quota(args: argparse.Namespace, *, stdout: TextIO | None = None, ledger: QuotaLedger | None = None) -> int:
+    out = stdout or sys.stdout
+    ledger = ledger or get_quota_ledger()
+    names = args.providers or sorted(ledger.limits) or ["tinyurl"]
+    for st in ledger.status_many(names):
+        hour = f"{st.hour_used}/{st.hour_limit or '-'}"
+        day = f"{st.day_used}/{st.day_limit or '-'}"
+        left = "unlimited" if st.remaining is None else str(st.remaining)
+        rate = "-" if st.sustainable_rate is None else f"{st.sustainable_rate:.3f}/s"
+        out.write(f"{st.provider}\thour={hour}\tday={day}\tremaining={left}\tpace={rate}\n")
+    return 0
+
+
+def run_alias(args: argparse.Namespace, *, stdout: TextIO | None = None, history: HistoryService | None = None) -> int:
+    from urlcutter.aliases import AliasTaken
+    from urlcutter.local_shortener import LocalShortener, get_local_shortener
+
+    out = stdout or sys.stdout
+    local = LocalShortener(args.base_url) if args.base_url else get_local_shortener()
+    try:
+        if args.url is None:
+            free = local.aliases.is_available(args.alias)
+            out.write(f"{args.alias}\t{'available' if free else 'taken'}\n")
+            code = 0 if free else 1
+        else:
+            short = local.shorten(args.url, alias=args.alias)
+            if history is None:
+                from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+
+                history = SqlAlchemyHistoryService()
+            history.add(LinkRecord(None, args.url.strip(), short, local.name, None))
+            out.write(f"{short}\n")
+            code = 0
+    except AliasTaken as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    st = local.aliases.stats()
+    print(
+        f"alias filter: codes={st.entries} memory={st.memory_bytes / 1024:.1f}KiB hashes={st.hashes} "
+        f"expected_fp={st.expected_fp_rate:.2e} observed_fp={st.observed_fp_rate:.2e} db_checks={st.db_checks}",
+        file=sys.stderr,
+    )
+    return code
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m urlcutter", description="UrlCutter command line")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    sh = sub.add_parser("shorten", help="shorten URLs from a file or stdin, one per line")
+    sh.add_argument("input", nargs="?", default="-", help="input file, '-' for stdin (default)")
+    sh.add_argument("-o", "--output", default="-", help="output file, '-' for stdout (default)")
+    sh.add_argument("-f", "--format", choices=("jsonl", "csv"), help="default: by --output extension, else jsonl")
+    sh.add_argument("-c", "--concurrency", type=int, default=8)
+    sh.add_argument("--timeout", type=float, default=8.0, help="per-call timeout, seconds")
+    sh.add_argument("--retries", type=int, default=1, help="retries per URL (backoff with jitter)")
+    sh.add_argument("--checkpoint", help="checkpoint path (default: <output>.ckpt when --output is a file)")
+    sh.add_argument("--history-batch", type=int, default=HISTORY_BATCH, help="rows per history DB insert")
+    sh.add_argument("--no-history", action="store_true", help="do not write results to the history DB")
+    sh.add_argument("--quota", action="store_true", help="respect provider quotas (URLCUTTER_QUOTAS); stop when spent")
+    sh.add_argument("--quota-pace", action="store_true", help="like --quota, and spread calls until the budget resets")
+
+    sv = sub.add_parser("serve", help="redirect server for locally issued short codes")
+    sv.add_argument("--host", default="127.0.0.1")
+    sv.add_argument("--port", type=int, default=8765)
+    sv.add_argument("--base-url", help="short link prefix stored in history (default: URLCUTTER_LOCAL_BASE_URL)")
+    sv.add_argument("--status", type=int, choices=(301, 302), default=302, help="redirect status code")
+    sv.add_argument("--lru-size", type=int, default=100_000, help="codes kept in memory")
+    sv.add_argument("--snapshot", help="mmap snapshot file to answer from before the DB")
+    sv.add_argument("--snapshot-reload", type=float, default=30.0, help="seconds between snapshot file checks")
+    sv.add_argument("--click-flush", type=float, default=1.0, help="seconds between click count writes, 0 = off")
+    sv.add_argument(
+        "--click-max-unflushed", type=int, default=50_000, help="flush early once this many clicks are buffered"
+    )
+    sv.add_argument("--no-uniques", action="store_true", help="do not track unique visitors (HyperLogLog)")
+
+    st = sub.add_parser("stats", help="clicks and estimated unique visitors of short links")
+    st.add_argument("short_urls", nargs="+")
+
+    al = sub.add_parser("alias", help="check a custom alias for the local provider, or create a link with it")
+    al.add_argument("alias")
+    al.add_argument("url", nargs="?", help="long URL; without it only availability is checked")
+    al.add_argument("--base-url", help="short link prefix (default: URLCUTTER_LOCAL_BASE_URL)")
+
+    qu = sub.add_parser("quota", help="calls used and budget left per provider this hour and day")
+    qu.add_argument("providers", nargs="*", help="default: providers with configured quotas")
+
+    sn = sub.add_parser("snapshot", help="build or refresh the mmap lookup snapshot of the history DB")
+    sn.add_argument("--path", help="snapshot file (default: links.snap in the data dir)")
+    sn.add_argument("--full", action="store_true", help="rebuild from scratch instead of adding new rows")
+    return ap
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s", stream=sys.stderr)
+    # как и GUI: на свежем или старом каталоге данных сначала доводим схему БД до head
+    upgrade_to_head()
+    commands = {
+        "shorten": run_shorten,
+        "serve": run_serve,
+        "snapshot": run_snapshot,
+        "stats": run_stats,
+        "alias": run_alias,
+        "quota": run_quota,
+    }
+    command = commands.get(args.command)
+    if command is not None:
+        return command(args)
+    return 2  # pragma: no cover
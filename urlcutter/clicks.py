@@ -0,0 +1,191 @@
+"""Click counting for served short links with batched DB writes.
+
+`ClickCounter.record` is the hot path: it writes the short URL into a
+preallocated ring buffer under a lock — no DB, no allocation beyond the
+slot. When the ring fills up it is folded into a per-link delta table.
+A background flusher folds the ring every `flush_interval` seconds (or
+earlier once `max_unflushed` clicks are waiting) and hands the deltas to the
+sink in one call — for the history DB that is a single `executemany UPDATE`
+in one transaction, however many clicks arrived.
+
+With `visitors`, `record(short_url, visitor)` also feeds the link's
+HyperLogLog sketches (`urlcutter.analytics`), flushed on the same schedule.
+
+Loss bound: a crash loses only unflushed clicks — at most one
+`flush_interval` worth, and roughly no more than `max_unflushed` since the
+flusher is woken early at that count. `close()` flushes everything that is
+left; a failed flush keeps its deltas for the next try.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from collections import Counter
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+
+from urlcutter.analytics import VisitorAnalytics
+from urlcutter.db.repo.history_service import HistoryService
+
+__all__ = ["ClickCounter", "ClickStats", "get_click_counter"]
+
+DEFAULT_CAPACITY = 4096
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_UNFLUSHED = 50_000
+
+Sink = Callable[[Mapping[str, int]], object]
+
+log = logging.getLogger("urlcutter.clicks")
+
+
+@dataclass(slots=True)
+class ClickStats:
+    recorded: int = 0
+    flushed: int = 0  # кликов записано в хранилище
+    flushes: int = 0
+    failures: int = 0
+    pending: int = 0
+
+
+class ClickCounter:
+    """In-memory click buffer with a periodic batched flusher thread."""
+
+    def __init__(
+        self,
+        sink: Sink | None = None,
+        *,
+        capacity: int = DEFAULT_CAPACITY,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_unflushed: int = DEFAULT_MAX_UNFLUSHED,
+        visitors: VisitorAnalytics | None = None,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        if flush_interval <= 0:
+            raise ValueError("flush_interval must be > 0")
+        self._sink = sink
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_unflushed = max_unflushed
+        self.visitors = visitors
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # сбросы не пересекаются: фоновый и close()
+        self._ring: list[str | None] = [None] * capacity
+        self._n = 0
+        self._deltas: Counter[str] = Counter()
+        self._unflushed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stats = ClickStats()
+
+    @property
+    def sink(self) -> Sink:
+        if self._sink is None:
+            from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+
+            history: HistoryService = SqlAlchemyHistoryService()
+            self._sink = history.add_clicks
+        return self._sink
+
+    def record(self, short_url: str, visitor: str | None = None) -> None:
+        if visitor is not None and self.visitors is not None:
+            self.visitors.record(short_url, visitor)
+        with self._lock:
+            self._ring[self._n] = short_url
+            self._n += 1
+            if self._n == self.capacity:
+                self._fold()
+            self._unflushed += 1
+            self.stats.recorded += 1
+            if self._unflushed >= self.max_unflushed:
+                self._wake.set()
+
+    def _fold(self) -> None:
+        # вызывается под self._lock: кольцо → агрегированные дельты
+        deltas = self._deltas
+        ring = self._ring
+        for i in range(self._n):
+            deltas[ring[i]] += 1
+            ring[i] = None
+        self._n = 0
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._unflushed
+
+    def flush(self) -> int:
+        """Write all buffered clicks (and visitor sketches) now; returns how many clicks were flushed."""
+        if self.visitors is not None:
+            self.visitors.flush()  # ошибки он логирует и сам сохраняет скетчи до следующего раза
+        with self._flush_lock:
+            with self._lock:
+                self._fold()
+                deltas, self._deltas = self._deltas, Counter()
+                taken = self._unflushed
+                self._unflushed = 0
+            if not deltas:
+                return 0
+            try:
+                self.sink(deltas)
+            except Exception as e:
+                with self._lock:
+                    # вернём дельты обратно — попробуем на следующем интервале
+                    self._deltas.update(deltas)
+                    self._unflushed += taken
+                    self.stats.failures += 1
+                log.warning("click_flush_failed clicks=%d links=%d err=%s", taken, len(deltas), e)
+                return 0
+            self.stats.flushes += 1
+            self.stats.flushed += taken
+            return taken
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self) -> ClickCounter:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="urlcutter-clicks", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float | None = 5.0) -> int:
+        """Stop the flusher and write what is left (graceful shutdown)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self.flush()
+
+    def snapshot(self) -> ClickStats:
+        with self._lock:
+            s = self.stats
+            return ClickStats(s.recorded, s.flushed, s.flushes, s.failures, self._unflushed)
+
+    def __enter__(self) -> ClickCounter:
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+# --- Process-wide instance ---
+
+_counter: ClickCounter | None = None
+_counter_lock = threading.Lock()
+
+
+def get_click_counter() -> ClickCounter:
+    global _counter  # noqa: PLW0603
+    with _counter_lock:
+        if _counter is None:
+            _counter = ClickCounter().start()
+            atexit.register(_counter.close)  # штатное завершение процесса не теряет клики
+        return _counter
@@ -0,0 +1,237 @@
+"""Cached connectivity verdict, refreshed by a background probe.
+
+`ConnectivityMonitor.is_online()` answers from memory and never blocks: a
+daemon thread probes `CONNECTIVITY_PROBE_URL` (any HTTP answer below 500
+counts as "online") and keeps the verdict for `ttl` seconds while online and
+for the shorter `down_ttl` while offline, so recovery is noticed quickly.
+A stale read returns the last verdict and wakes the thread; before the
+first probe completes the answer is optimistic (online). Callers that see a
+connection-level error (`is_network_error`: refused/reset, DNS, connect
+timeout; not read timeouts or bad HTTP answers) call `invalidate()` to
+re-probe at once instead of waiting for the TTL.
+
+The probe URL comes from `URLCUTTER_PROBE_URL`; an empty value turns
+probing off (always online).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import requests
+
+from urlcutter.http_client import get_client
+
+__all__ = [
+    "ConnectivityMonitor",
+    "Verdict",
+    "get_connectivity_monitor",
+    "is_network_error",
+    "set_connectivity_monitor",
+]
+
+PROBE_URL_ENV = "URLCUTTER_PROBE_URL"
+CONNECTIVITY_PROBE_URL = "https://www.google.com/generate_204"
+CONNECTIVITY_TIMEOUT = 2.0  # короткий таймаут для проверки сети
+CONNECTIVITY_TTL_SEC = 30.0  # сколько верим вердикту «сеть есть»
+CONNECTIVITY_DOWN_TTL_SEC = 5.0  # офлайн перепроверяем чаще — быстро замечаем восстановление
+_SERVER_ERROR = 500
+
+log = logging.getLogger("urlcutter.connectivity")
+
+
+def is_network_error(exc: BaseException | None) -> bool:
+    """Connection-level errors (refused/reset, DNS, connect timeout), also when wrapped via `raise ... from`."""
+    # ConnectTimeout — наследник requests.ConnectionError. ReadTimeout, TooManyRedirects, HTTPError —
+    # сервер ответил или соединение было: это медленный/сломанный провайдер, а не пропавшая сеть
+    seen: set[int] = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, requests.ConnectionError | ConnectionError):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__  # провайдеры заворачивают ошибки requests в TimeoutError/RuntimeError
+    return False
+
+
+@dataclass(slots=True, frozen=True)
+class Verdict:
+    online: bool
+    checked_at: float  # по часам монитора (monotonic)
+    latency: float
+    error: str | None = None
+
+
+class ConnectivityMonitor:
+    """Up/down verdict with a TTL, refreshed by a lazily started background thread."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        url: str | None = CONNECTIVITY_PROBE_URL,
+        *,
+        timeout: float = CONNECTIVITY_TIMEOUT,
+        ttl: float = CONNECTIVITY_TTL_SEC,
+        down_ttl: float = CONNECTIVITY_DOWN_TTL_SEC,
+        probe: Callable[[], None] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.url = url or None  # пустая строка → проверка выключена
+        self.timeout = timeout
+        self.ttl = ttl
+        self.down_ttl = down_ttl
+        self._probe_fn = probe or self._http_probe
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._verdict: Verdict | None = None
+        self._stale = True
+        self._probing = False
+        self._probes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.url is not None
+
+    # --- probe ---
+
+    def _http_probe(self) -> None:
+        resp = get_client().get(self.url, timeout=self.timeout, allow_redirects=False)
+        if resp.status_code >= _SERVER_ERROR:
+            raise requests.ConnectionError(f"probe answered HTTP {resp.status_code}")
+
+    def probe(self) -> Verdict:
+        """Probe now (blocking, up to `timeout`) and store the verdict."""
+        with self._lock:
+            self._probing = True
+        t0 = self._clock()
+        try:
+            self._probe_fn()
+            online, error = True, None
+        except Exception as e:
+            online, error = False, f"{type(e).__name__}: {e}"
+        now = self._clock()
+        verdict = Verdict(online, checked_at=now, latency=now - t0, error=error)
+        with self._updated:
+            prev, self._verdict = self._verdict, verdict
+            self._stale = self._probing = False
+            self._probes += 1
+            self._updated.notify_all()
+        if prev is None or prev.online != online:
+            if online:
+                log.info("connectivity up url=%s latency=%.3fs", self.url, verdict.latency)
+            else:
+                log.warning("connectivity down url=%s err=%s", self.url, error)
+        return verdict
+
+    def _expires_at(self, verdict: Verdict) -> float:
+        return verdict.checked_at + (self.ttl if verdict.online else self.down_ttl)
+
+    # --- read path ---
+
+    @property
+    def verdict(self) -> Verdict | None:
+        return self._verdict
+
+    def is_online(self) -> bool:
+        """Last known verdict, instantly; a missing or stale one schedules a background probe."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            verdict = self._verdict
+            fresh = verdict is not None and not self._stale and self._clock() < self._expires_at(verdict)
+            kick = not fresh and not self._probing
+        if kick:
+            self._kick()
+        return True if verdict is None else verdict.online
+
+    def invalidate(self) -> None:
+        """Forget the verdict's freshness (a call just failed on the network) and re-probe now."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._stale = True
+            kick = not self._probing
+        if kick:
+            self._kick()
+
+    def wait(self, timeout: float | None = None, *, probes: int | None = None) -> Verdict | None:
+        """Block until more than `probes` probes have finished (default: the current count)."""
+        with self._updated:
+            target = self._probes if probes is None else probes
+            self._updated.wait_for(lambda: self._probes > target, timeout)
+            return self._verdict
+
+    @property
+    def probes(self) -> int:
+        return self._probes
+
+    # --- background thread ---
+
+    def _kick(self) -> None:
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self.start()  # поток сам сделает пробу сразу после старта
+        else:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Start the probe thread (idempotent); it probes immediately."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._wake.set()
+            self._thread = threading.Thread(target=self._run, name="urlcutter-connectivity", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self._wake.is_set():
+                self._wake.clear()
+                self.probe()
+            verdict = self._verdict
+            delay = self._expires_at(verdict) - self._clock() if verdict is not None else self.down_ttl
+            # проснёмся к истечению вердикта или раньше — по invalidate()/stop()
+            self._wake.wait(max(delay, 0.0))
+            if verdict is not None and self._clock() >= self._expires_at(verdict):
+                self._wake.set()
+
+
+# --- Process-wide instance ---
+
+_monitor: ConnectivityMonitor | None = None
+_monitor_lock = threading.Lock()
+
+
+def get_connectivity_monitor() -> ConnectivityMonitor:
+    global _monitor  # noqa: PLW0603
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = ConnectivityMonitor(os.getenv(PROBE_URL_ENV, CONNECTIVITY_PROBE_URL))
+        return _monitor
+
+
+def set_connectivity_monitor(monitor: ConnectivityMonitor) -> ConnectivityMonitor:
+    """Install `monitor` as the process-wide one (stopping the previous thread); returns it."""
+    global _monitor  # noqa: PLW0603
+    with _monitor_lock:
+        prev, _monitor = _monitor, monitor
+    if prev is not None and prev is not monitor:
+        prev.stop(timeout=0)
+    return monitor
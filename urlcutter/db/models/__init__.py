@@ -10,4 +10,8 @@ class Base(DeclarativeBase):
 
 
 # export models
+from .id_sequence import IdSequence  # noqa: E402,F401
 from .link import Link  # noqa: E402,F401
+from .link_visitor_day import LinkVisitorDay  # noqa: E402,F401
+from .local_code import LocalCode  # noqa: E402,F401
+from .provider_usage import ProviderUsage  # noqa: E402,F401
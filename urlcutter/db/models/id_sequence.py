@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from . import Base
+
+
+class IdSequence(Base):
+    """Named counter of reserved id blocks (hi part of hi/lo allocation)."""
+
+    __tablename__ = "id_sequences"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    next_hi: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
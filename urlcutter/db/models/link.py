@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Index, Integer, String
+from sqlalchemy import DateTime, Index, Integer, LargeBinary, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from . import Base
@@ -17,6 +17,8 @@ class Link(Base):
     service: Mapped[str] = mapped_column(String(64), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
     copy_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    click_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    visitors_hll: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)  # HyperLogLog за всё время
 
     __table_args__ = (
         Index("ix_links_created_at", "created_at"),
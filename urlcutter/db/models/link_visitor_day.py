@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import Date, ForeignKey, Integer, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from . import Base
+
+
+class LinkVisitorDay(Base):
+    """Per-day HyperLogLog of visitors of one link (rollups merge these)."""
+
+    __tablename__ = "link_visitor_days"
+
+    link_id: Mapped[int] = mapped_column(Integer, ForeignKey("links.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    sketch: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from . import Base
+
+
+class LocalCode(Base):
+    """Code issued by the local provider under one base URL; the primary key makes issuing exclusive."""
+
+    __tablename__ = "local_codes"
+
+    base_url: Mapped[str] = mapped_column(String(512), primary_key=True)
+    code: Mapped[str] = mapped_column(String(32), primary_key=True)
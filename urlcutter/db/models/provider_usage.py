@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from . import Base
+
+
+class ProviderUsage(Base):
+    """Calls made to one provider within one hour or day (UTC) bucket."""
+
+    __tablename__ = "provider_usage"
+
+    provider: Mapped[str] = mapped_column(String(64), primary_key=True)
+    period: Mapped[str] = mapped_column(String(8), primary_key=True)  # "hour" | "day"
+    bucket: Mapped[str] = mapped_column(String(16), primary_key=True)  # "2026-10-18T14" | "2026-10-18"
+    calls: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Mapping, Sequence
 
 from .schemas import (
     ExportSpec,
@@ -38,6 +39,29 @@ class HistoryService(ABC):
         """
         raise NotImplementedError
 
+    def add_many(self, records: Sequence[LinkRecord]) -> int:
+        """
+        Persist several records at once and return how many were stored.
+        Default: one `add` per record; storage backends should override with a single transaction.
+        """
+        for rec in records:
+            self.add(rec)
+        return len(records)
+
+    def find_long_urls(self, short_urls: Iterable[str]) -> dict[str, str]:
+        """
+        Map already stored short URLs to their long URLs (unknown ones are simply absent).
+        Default: nothing is known; storage backends should override with an indexed lookup.
+        """
+        return {}
+
+    def add_clicks(self, deltas: Mapping[str, int]) -> int:
+        """
+        Add per-link click deltas (short_url -> clicks) and return how many links were updated.
+        Default: clicks are not stored; storage backends should override with one batched UPDATE.
+        """
+        return 0
+
     @abstractmethod
     def increment_copy_count(self, id: int) -> None:
         """Increase copy_count for the given record id by 1."""
@@ -4,9 +4,10 @@ from __future__ import annotations
 
 import csv
 import io
+from collections.abc import Iterable, Mapping, Sequence
 from datetime import UTC, datetime, time
 
-from sqlalchemy import func, or_, select
+from sqlalchemy import bindparam, func, insert, or_, select, update
 from sqlalchemy.exc import SQLAlchemyError
 
 from urlcutter.db.engine import get_session
@@ -22,6 +23,8 @@ from urlcutter.db.repo.schemas import (
     SortSpec,
 )
 
+_IN_CHUNK = 500
+
 
 def _utc_boundaries_from_local_dates(date_from_local, date_to_local) -> tuple[datetime | None, datetime | None]:
     """date -> [00:00, 23:59:59.999999] в ЛОКАЛИ, затем в UTC."""
@@ -55,6 +58,7 @@ class SqlAlchemyHistoryService(HistoryService):
         "long_url": Link.long_url,
         "short_url": Link.short_url,
         "copy_count": Link.copy_count,
+        "click_count": Link.click_count,
     }
 
     # ---------- helpers ----------
@@ -113,6 +117,7 @@ class SqlAlchemyHistoryService(HistoryService):
                         service=r.service or "",
                         created_at_utc=r.created_at,
                         copy_count=r.copy_count or 0,
+                        click_count=r.click_count or 0,
                     )
                     for r in rows
                 ]
@@ -153,15 +158,81 @@ class SqlAlchemyHistoryService(HistoryService):
         except SQLAlchemyError as e:
             raise StorageError(str(e)) from e
 
+    def add_many(self, records: Sequence[LinkRecord]) -> int:
+        if not records:
+            return 0
+        for rec in records:
+            if not rec.long_url or not rec.short_url or not rec.service:
+                raise ValidationError("long_url, short_url, service are required")
+
+        try:
+            with get_session() as s:
+                # одна транзакция и один executemany вместо INSERT+COMMIT на каждую строку
+                s.execute(
+                    insert(Link),
+                    [
+                        {
+                            "long_url": r.long_url,
+                            "short_url": r.short_url,
+                            "service": r.service,
+                            "created_at": r.created_at_utc or datetime.utcnow(),
+                            "copy_count": r.copy_count or 0,
+                        }
+                        for r in records
+                    ],
+                )
+                s.commit()
+                return len(records)
+        except SQLAlchemyError as e:
+            raise StorageError(str(e)) from e
+
+    def find_long_urls(self, short_urls: Iterable[str]) -> dict[str, str]:
+        wanted = list(dict.fromkeys(u for u in short_urls if u))
+        found: dict[str, str] = {}
+        try:
+            with get_session() as s:
+                # пачками: у SQLite лимит на число параметров в IN (...)
+                for i in range(0, len(wanted), _IN_CHUNK):
+                    chunk = wanted[i : i + _IN_CHUNK]
+                    # как add_clicks и поиск по коду: при дублях short_url берём самую свежую запись
+                    rows = s.execute(
+                        select(Link.short_url, Link.long_url).where(Link.short_url.in_(chunk)).order_by(Link.id.desc())
+                    )
+                    for short, long_ in rows:
+                        found.setdefault(short, long_)
+        except SQLAlchemyError as e:
+            raise StorageError(str(e)) from e
+        return found
+
+    def add_clicks(self, deltas: Mapping[str, int]) -> int:
+        params = [{"s": short, "delta": n} for short, n in deltas.items() if short and n > 0]
+        if not params:
+            return 0
+        # как и поиск по коду: при дублях short_url считаем клики самой свежей записи
+        latest = select(func.max(Link.id)).where(Link.short_url == bindparam("s")).scalar_subquery()
+        stmt = (
+            update(Link.__table__)
+            .where(Link.__table__.c.id == latest)
+            .values(click_count=Link.__table__.c.click_count + bindparam("delta"))
+        )
+        try:
+            with get_session() as s:
+                # один executemany в одной транзакции на весь интервал сброса
+                res = s.connection().execute(stmt, params)
+                s.commit()
+                return res.rowcount
+        except SQLAlchemyError as e:
+            raise StorageError(str(e)) from e
+
     def increment_copy_count(self, id: int) -> None:
         if not isinstance(id, int) or id <= 0:
             raise ValidationError("Invalid id")
         try:
             with get_session() as s:
-                obj = s.get(Link, id)
-                if not obj:
+                # атомарный UPDATE вместо чтения объекта и записи обратно
+                res = s.execute(update(Link).where(Link.id == id).values(copy_count=Link.copy_count + 1))
+                if res.rowcount == 0:
                     raise NotFoundError(f"id={id} not found")
-                obj.copy_count += 1
                 s.commit()
         except SQLAlchemyError as e:
             raise StorageError(str(e)) from e
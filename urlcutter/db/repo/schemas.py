@@ -10,7 +10,7 @@ from typing import Literal
 DEFAULT_PAGE_SIZE: int = 50
 PAGE_SIZE_CHOICES = (10, 25, 50, 100)
 
-SortField = Literal["created_at", "service", "long_url", "short_url", "copy_count"]
+SortField = Literal["created_at", "service", "long_url", "short_url", "copy_count", "click_count"]
 SortDirection = Literal["asc", "desc"]
 LocaleCode = Literal["ru", "en"]
 
@@ -29,6 +29,7 @@ class LinkRecord:
     service: str
     created_at_utc: datetime | None
     copy_count: int = 0
+    click_count: int = 0
 
 
 @dataclass(slots=True)
@@ -0,0 +1,225 @@
+"""Batch expansion of short links: where does each one actually point?
+
+`expand_many` answers in three tiers:
+  1. the local history — an optional mmap snapshot of the `links` table
+     (`urlcutter.link_snapshot`), then the DB itself for whatever the
+     snapshot does not know;
+  2. an in-memory TTL cache of earlier remote resolutions;
+  3. the network: `HEAD` without following redirects (falls back to a
+     streamed `GET` for servers that refuse `HEAD`), on the shared keep-alive
+     client with at most `max_concurrency` requests in flight.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+from itertools import islice
+from urllib.parse import urljoin
+
+import requests
+
+from urlcutter.db.repo.history_service import HistoryService
+from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
+from urlcutter.http_client import ProviderClient, get_client
+from urlcutter.link_snapshot import LinkSnapshot, SnapshotHolder
+from urlcutter.retry import error_for_status
+from urlcutter.shorteners import ResultCache, _looks_like_url
+from urlcutter.singleflight import get_single_flight
+
+__all__ = ["ExpandResult", "expand_many", "expand_url", "get_expand_cache"]
+
+DEFAULT_EXPAND_CONCURRENCY = 8
+DEFAULT_EXPAND_TIMEOUT = 5.0
+EXPAND_CACHE_TTL = 3600.0  # цели коротких ссылок меняются редко, но бывают перепривязки
+CHUNK = 256  # столько ссылок за один запрос к БД
+REDIRECT_CODES = frozenset({301, 302, 303, 307, 308})
+HEAD_REFUSED = frozenset({HTTPStatus.METHOD_NOT_ALLOWED, HTTPStatus.NOT_IMPLEMENTED, HTTPStatus.FORBIDDEN})
+
+log = logging.getLogger("urlcutter.expander")
+
+
+@dataclass(slots=True)
+class ExpandResult:
+    """Outcome of one short link: either `long_url` or `error` is set."""
+
+    index: int
+    short_url: str
+    long_url: str | None = None
+    source: str | None = None  # history | cache | remote
+    status: int | None = None  # HTTP-код редиректа (для remote)
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _hop(client: ProviderClient, url: str, timeout: float) -> requests.Response:
+    try:
+        resp = client.head(url, allow_redirects=False, timeout=timeout)
+        if resp.status_code in HEAD_REFUSED:
+            # некоторые сокращалки не любят HEAD — тело не читаем, только заголовки
+            resp = client.get(url, allow_redirects=False, stream=True, timeout=timeout)
+            resp.close()
+    except requests.Timeout as e:
+        raise TimeoutError(f"expand request timed out: {e}") from e
+    except requests.RequestException as e:
+        raise RuntimeError(f"expand request failed: {e}") from e
+    return resp
+
+
+def expand_url(
+    short_url: str,
+    timeout: float | None = None,
+    *,
+    max_hops: int = 1,
+    client: ProviderClient | None = None,
+) -> tuple[str, int]:
+    """Resolve `short_url` over HTTP without following redirects blindly.
+
+    Follows at most `max_hops` redirects and returns `(target, first_status)`.
+
+    Raises:
+      ValueError   — not an http(s) URL, or it does not redirect at all.
+      TimeoutError — the server did not answer within `timeout`.
+      RuntimeError — network errors; HTTP errors come as `ProviderError`.
+    """
+    if not isinstance(short_url, str) or not _looks_like_url(short_url.strip()):
+        raise ValueError("short_url must be an http(s) URL")
+    client = client or get_client()
+    url = short_url.strip()
+    first_status = None
+    for _ in range(max_hops):
+        resp = _hop(client, url, timeout or DEFAULT_EXPAND_TIMEOUT)
+        status = resp.status_code
+        location = resp.headers.get("Location")
+        if status in REDIRECT_CODES and location:
+            url = urljoin(url, location)
+            first_status = first_status or status
+            continue
+        if first_status is not None:
+            break  # дошли до конечной страницы
+        if status >= HTTPStatus.BAD_REQUEST:
+            raise error_for_status("expand", status, resp.headers)
+        raise ValueError(f"not a redirect (HTTP {status})")
+    return url, first_status
+
+
+def _expand_one(  # noqa: PLR0913
+    index: int,
+    short_url: str,
+    timeout: float | None,
+    max_hops: int,
+    client: ProviderClient,
+    cache: ResultCache,
+) -> ExpandResult:
+    started = time.monotonic()
+    try:
+        target, status = get_single_flight().do(
+            ("expand", short_url), expand_url, short_url, timeout, max_hops=max_hops, client=client
+        )
+    except (ValueError, TimeoutError, RuntimeError) as e:
+        return ExpandResult(index=index, short_url=short_url, error=e, elapsed=time.monotonic() - started)
+    cache.put("expand", short_url, target)
+    return ExpandResult(
+        index=index,
+        short_url=short_url,
+        long_url=target,
+        source="remote",
+        status=status,
+        elapsed=time.monotonic() - started,
+    )
+
+
+def _known(
+    history: HistoryService | None, snapshot: LinkSnapshot | SnapshotHolder | None, short_urls: list[str]
+) -> dict[str, str]:
+    known: dict[str, str] = {}
+    if snapshot is not None:
+        for u in short_urls:
+            if (long_url := snapshot.get(u)) is not None:
+                known[u] = long_url
+    rest = [u for u in short_urls if u not in known]
+    if history is None or not rest:
+        return known
+    try:
+        known.update(history.find_long_urls(rest))
+    except Exception as e:
+        # БД недоступна — не беда, спросим сеть
+        log.warning("expand_history_lookup_failed err=%s", e)
+    return known
+
+
+def expand_many(  # noqa: PLR0913
+    short_urls: Iterable[str],
+    *,
+    max_concurrency: int = DEFAULT_EXPAND_CONCURRENCY,
+    timeout: float | None = None,
+    max_hops: int = 1,
+    history: HistoryService | None = None,
+    use_history: bool = True,
+    cache: ResultCache | None = None,
+    client: ProviderClient | None = None,
+    snapshot: LinkSnapshot | SnapshotHolder | None = None,
+) -> Iterator[ExpandResult]:
+    """Expand many short links, yielding results in input order.
+
+    Behavior:
+      - Input is consumed in chunks; each chunk costs one DB query for links
+        we already know (`source="history"`). With a `snapshot`, only links
+        missing from it reach the DB.
+      - Then the TTL cache (`source="cache"`); the rest go to the network
+        (`source="remote"`), with identical in-flight links resolved once.
+      - Per-link ValueError/TimeoutError/RuntimeError come back as
+        `ExpandResult.error`; the batch never aborts on them.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be >= 1")
+    if use_history and history is None:
+        history = SqlAlchemyHistoryService()
+    cache = cache if cache is not None else get_expand_cache()
+    client = client or get_client()
+    client.ensure_capacity(max_concurrency)
+
+    source = enumerate(short_urls)
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="urlcutter-expand") as pool:
+        while chunk := list(islice(source, CHUNK)):
+            known = _known(
+                history if use_history else None,
+                snapshot if use_history else None,
+                [u.strip() for _, u in chunk if isinstance(u, str)],
+            )
+            slots: list[ExpandResult | object] = []
+            for index, raw in chunk:
+                u = raw.strip() if isinstance(raw, str) else raw
+                if u in known:
+                    slots.append(ExpandResult(index=index, short_url=u, long_url=known[u], source="history"))
+                    continue
+                hit = cache.get("expand", u) if isinstance(u, str) else None
+                if hit is not None:
+                    slots.append(ExpandResult(index=index, short_url=u, long_url=hit, source="cache"))
+                    continue
+                slots.append(pool.submit(_expand_one, index, u, timeout, max_hops, client, cache))
+            for slot in slots:
+                yield slot if isinstance(slot, ExpandResult) else slot.result()
+
+
+# --- Process-wide cache ---
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_expand_cache() -> ResultCache:
+    global _cache  # noqa: PLW0603
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(ttl=EXPAND_CACHE_TTL)
+        return _cache
@@ -1,6 +1,7 @@
 import logging
+import math
 import webbrowser
-from concurrent.futures import TimeoutError as FutTimeout
+from collections.abc import Sequence
 from datetime import UTC, datetime
 from urllib.parse import urlparse
 
@@ -9,17 +10,27 @@ import pyperclip
 import validators
 
 from urlcutter import CLIENT_RPM_LIMIT, AppState, _url_fingerprint
+from urlcutter.connectivity import get_connectivity_monitor, is_network_error
 from urlcutter.db.repo.history_sql import SqlAlchemyHistoryService
 from urlcutter.db.repo.schemas import HistoryFilters, LinkRecord, PageSpec, SortSpec  # + эти двое новые
+from urlcutter.hedging import Hedger
+from urlcutter.latency import AdaptiveTimeouts
 from urlcutter.protection import internet_ok
+from urlcutter.quota import QuotaLedger
+from urlcutter.retry import RateLimited, RetryPolicy
+from urlcutter.shorteners import ResultCache, shorten_with_failover
 from urlcutter.shorteners import shorten_via_tinyurl_core as shorten_via_tinyurl
+from urlcutter.singleflight import get_single_flight
 from urlcutter.ui_builders import titlebar_set_back, titlebar_set_main
 
 from .ui.history.view import make_history_screen
 
-REQUEST_TIMEOUT = 8.0
-RETRIES = 1
+REQUEST_TIMEOUT = 8.0  # потолок; реальный таймаут попытки подстраивается под p99 провайдера
+RETRIES = 1  # повторов после первой попытки (по умолчанию для RetryPolicy)
+RETRY_DEADLINE = 20.0  # общий бюджет на все попытки одного нажатия, секунды
 DEFAULT_HTTP_TIMEOUT = 5
+PROVIDER_CHAIN = ("tinyurl",)  # порядок failover; приложение передаёт свой список
+LOCAL_PROVIDER = "local"  # офлайн-провайдер: выручает, когда сеть/предохранитель не пускают
 
 
 def _safe_fp(s: str) -> str:
@@ -39,6 +50,12 @@ class Handlers:
         url_input_field: ft.TextField,
         short_url_field: ft.TextField,
         shorten_button: ft.ElevatedButton,
+        providers: Sequence[str] | None = None,
+        hedger: Hedger | None = None,
+        timeouts: AdaptiveTimeouts | None = None,
+        retry: RetryPolicy | None = None,
+        cache: ResultCache | None = None,
+        quota: QuotaLedger | None = None,
     ):
         self.page = page
         self.logger = logger
@@ -46,6 +63,12 @@ class Handlers:
         self.url_input_field = url_input_field
         self.short_url_field = short_url_field
         self.shorten_button = shorten_button
+        self.providers = tuple(providers) if providers else PROVIDER_CHAIN
+        self.hedger = hedger  # None → без хеджа, строго по очереди
+        self.timeouts = timeouts or AdaptiveTimeouts(ceiling=REQUEST_TIMEOUT)
+        self.retry = retry or RetryPolicy(max_attempts=1 + RETRIES, deadline=RETRY_DEADLINE)
+        self.cache = cache if cache is not None else ResultCache()
+        self.quota = quota  # None → лимиты провайдеров не учитываются
 
         self.main_body: ft.Container | None = None
         self.history = SqlAlchemyHistoryService()  # NEW: сервис истории
@@ -331,7 +354,49 @@ class Handlers:
         self.page.window.minimized = True
         self.page.update()
 
-    # Главный сценарий: валидация → защита → вызов сервиса → вывод
+    def _show_result(self, long_url: str, short_url: str, provider: str) -> None:
+        self.short_url_field.value = short_url
+        self.page.update()
+        self.toast("Done! Link shortened.")
+
+        # --- запись в историю (тихо; не ломаем UX, если что-то пойдёт не так) ---
+        try:
+            self._last_history_id = None  # сбросим на всякий случай
+            stored = self.history.add(
+                LinkRecord(
+                    id=None,
+                    long_url=long_url,  # исходный длинный URL из этой функции
+                    short_url=short_url,  # только что полученный короткий
+                    service=provider,  # сервис, который реально выдал ссылку
+                    created_at_utc=None,  # БД проставит сама
+                    copy_count=0,
+                )
+            )
+            self._last_history_id = stored.id
+        except Exception as he:
+            if hasattr(self, "logger"):
+                self.logger.debug("History add failed: %s", he)
+
+    def _shorten_offline(self, long_url: str, reason: str) -> bool:
+        """Issue a local short link when the network path is blocked; False if not configured/failed."""
+        if LOCAL_PROVIDER not in self.providers:
+            return False
+        try:
+            outcome = shorten_with_failover(long_url, chain=(LOCAL_PROVIDER,))
+        except Exception as e:
+            self.logger.error("shorten_local_failed reason=%s err=%s", reason, e)
+            return False
+        self.logger.info("shorten_local_fallback reason=%s", reason)
+        self.cache.put(outcome.provider, long_url, outcome.short_url)
+        self._show_result(long_url, outcome.short_url, outcome.provider)
+        return True
+
+    def _release_circuit(self) -> None:
+        release = getattr(self.state, "circuit_release", None)
+        if release is not None:
+            release()
+
+    # Главный сценарий: валидация → кэш → защита → вызов сервиса → вывод
     def on_shorten(self, _):  # noqa: PLR0911, PLR0912, PLR0915
         long_url = self.url_input_field.value.strip()
 
@@ -370,96 +435,137 @@ class Handlers:
             self.logger.info("shorten_reject reason=already_shortened provider=tinyurl")
             return
 
-        # 2) Защита
-        if self.state.circuit_blocked():
+        # 1.5) Кэш: повторные ссылки отдаём сразу, без сети и без тика лимита
+        hit = self.cache.lookup(long_url, self.providers)
+        if hit is not None:
+            short_url, provider = hit
+            self.logger.info("shorten_cache_hit provider=%s url=%s", provider, _safe_fp(long_url))
+            self._show_result(long_url, short_url, provider)
+            return
+
+        # 2) Защита (если в цепочке есть «local» — сокращаем офлайн вместо отказа).
+        # Общий предохранитель «*» берём, а не только смотрим: в полуоткрытом состоянии
+        # пробный слот достаётся одному клику, остальные до его исхода видят «открыт»
+        acquire = getattr(self.state, "circuit_acquire", None)
+        if not (acquire() if acquire is not None else not self.state.circuit_blocked()):
+            if self._shorten_offline(long_url, "circuit_open"):
+                return
             self.toast(f"Service cooling down {self.state.cooldown_left()}s after repeated errors.")
             self.logger.warning("shorten_blocked reason=circuit_open cooldown_left=%ds", self.state.cooldown_left())
             return
         if not self.state.rate_limit_allow(self.logger):
-            self.toast(f"Local limit {CLIENT_RPM_LIMIT}/min to respect remote caps. Try later.")
+            self._release_circuit()
+            if self._shorten_offline(long_url, "local_rate_limit"):
+                return
+            retry_after = getattr(self.state, "rate_limit_retry_after", None)
+            wait = retry_after() if retry_after is not None else 0.0
+            hint = f"Try again in {math.ceil(wait)}s." if 0 < wait < math.inf else "Try later."
+            self.toast(f"Local limit {CLIENT_RPM_LIMIT}/min to respect remote caps. {hint}")
             self.logger.warning("shorten_blocked reason=local_rate_limit rpm=%d", CLIENT_RPM_LIMIT)
             return
-        if not internet_ok(self.logger):
+        # слот «*» уже наш — в полуоткрытом состоянии internet_ok счёл бы предохранитель занятым
+        if not internet_ok(self.logger, check_circuit=False):
+            self._release_circuit()
+            if self._shorten_offline(long_url, "offline"):
+                return
             self.toast("No internet connection detected.")
             self.logger.warning("shorten_blocked reason=offline")
             return
 
-        # 3) Запускаем с таймаутом + ретрай
+        # 3) Запускаем с таймаутом + ретрай (бэкофф с джиттером, Retry-After, общий дедлайн)
         self.busy(True)
         last_err = None
-        for attempt in range(1 + RETRIES):
+        last_exc: Exception | None = None
+        chain = ",".join(self.providers)
+        attempted: list[str] = []  # провайдеры, до которых дошёл вызов (не отбитые локально)
+        retry = self.retry.start()
+        while True:
+            attempt = retry.attempt - 1
+            attempt_timeout = retry.cap(self.timeouts.timeout_for(self.providers[0]))
             self.logger.info(
-                "attempt_start provider=tinyurl attempt=%d timeout=%.1fs",
+                "attempt_start provider=%s attempt=%d timeout=%.1fs",
+                chain,
                 attempt + 1,
-                REQUEST_TIMEOUT,
+                attempt_timeout,
             )
             try:
-                short_url = shorten_via_tinyurl(long_url, REQUEST_TIMEOUT)
-                self.short_url_field.value = short_url
-                self.page.update()
-                self.toast("Done! Link shortened.")
-
-                # --- запись в историю (тихо; не ломаем UX, если что-то пойдёт не так) ---
-                try:
-                    self._last_history_id = None  # сбросим на всякий случай
-                    stored = self.history.add(
-                        LinkRecord(
-                            id=None,
-                            long_url=long_url,  # исходный длинный URL из этой функции
-                            short_url=short_url,  # только что полученный короткий
-                            service="tinyurl",  # пока фиксируем; позже подставим выбранный сервис из настроек
-                            created_at_utc=None,  # БД проставит сама
-                            copy_count=0,
-                        )
-                    )
-                    self._last_history_id = stored.id
-                except Exception as he:
-                    if hasattr(self, "logger"):
-                        self.logger.debug("History add failed: %s", he)
+                # tinyurl идёт через алиас модуля, чтобы его можно было подменить в тестах.
+                # Ключ — тот же нормализованный отпечаток, что у кэша: одинаковые после нормализации
+                # URL с той же цепочкой (двойной клик, несколько окон) склеиваются в один вызов.
+                # С пакетным путём не склеиваемся: там другой вызов (только tinyurl, строка вместо outcome)
+                outcome = get_single_flight().do(
+                    ("failover", self.providers, _url_fingerprint(long_url)),
+                    shorten_with_failover,
+                    long_url,
+                    retry.cap(REQUEST_TIMEOUT),
+                    chain=self.providers,
+                    overrides={"tinyurl": shorten_via_tinyurl},
+                    hedger=self.hedger,
+                    timeouts=self.timeouts,
+                    quota=self.quota,
+                    # у тестовых состояний своих ведра и предохранителя нет
+                    limiter=getattr(self.state, "limiter", None),
+                    breaker=getattr(self.state, "breaker", None),
+                    attempted=attempted,
+                )
+                short_url, provider = outcome.short_url, outcome.provider
+                for failed, err in outcome.failures:
+                    self.logger.warning("provider_failover provider=%s err=%s", failed, err)
+                self.cache.put(provider, long_url, short_url)
+                self._show_result(long_url, short_url, provider)
 
                 self.busy(False)
-                self.logger.info("attempt_success provider=tinyurl short_host=%s", urlparse(short_url).netloc)
+                self.logger.info("attempt_success provider=%s short_host=%s", provider, urlparse(short_url).netloc)
                 self.state.record_success()
                 return
 
-            except FutTimeout:
-                last_err = "timeout"
-                self.logger.error(
-                    "attempt_error provider=tinyurl kind=timeout timeout=%.1fs attempt=%d",
-                    REQUEST_TIMEOUT,
-                    attempt + 1,
-                )
-
             except Exception as e:
+                last_err, last_exc = self.retry.classify(e), e
                 msg = str(e)
-                if "429" in msg or "Too Many Requests" in msg:
-                    last_err = "rate"
-                elif any(x in msg for x in ("502", "503", "504")):
-                    last_err = "unavailable"
-                else:
-                    last_err = "unknown"
-                if last_err == "unknown":
+                if is_network_error(e):
+                    # сеть могла пропасть — не ждём TTL, перепроверяем в фоне сейчас
+                    get_connectivity_monitor().invalidate()
+                if last_err == "timeout":
+                    self.logger.error(
+                        "attempt_error provider=%s kind=timeout timeout=%.1fs attempt=%d",
+                        chain,
+                        attempt_timeout,
+                        attempt + 1,
+                    )
+                elif last_err == "unknown":
                     self.logger.exception(
-                        "attempt_error provider=tinyurl kind=%s attempt=%d err=%s",
+                        "attempt_error provider=%s kind=%s attempt=%d err=%s",
+                        chain,
                         last_err,
                         attempt + 1,
                         msg,
                     )
                 else:
                     self.logger.error(
-                        "attempt_error provider=tinyurl kind=%s attempt=%d err=%s",
+                        "attempt_error provider=%s kind=%s attempt=%d err=%s",
+                        chain,
                         last_err,
                         attempt + 1,
                         msg,
                     )
+                delay = retry.next_delay(e)
+                if delay is None:
+                    break
+                self.logger.info("retry_wait provider=%s kind=%s delay=%.2fs", chain, last_err, delay)
+                self.retry.sleep(delay)
 
         # 4) Все попытки исчерпаны
         self.busy(False)
-        self.state.record_failure()
+        if attempted:
+            self.state.record_failure()
+        else:
+            # все провайдеры отбиты своими воротами (предохранитель/лимит/квота) — сервис
+            # не отказывал, общему предохранителю засчитывать нечего; слот возвращаем
+            self._release_circuit()
         self.logger.error("shorten_failed url=%s final_reason=%s", _url_fingerprint(long_url), last_err)
         if last_err == "timeout":
             self.toast("The service did not respond. Check the internet or try again later.")
-        elif last_err == "rate":
+        elif last_err == "rate" or isinstance(last_exc, RateLimited):  # в т.ч. свой лимит/квота ("rejected")
             self.toast("Too many requests. Please wait a minute and try again.")
         elif last_err == "unavailable":
             self.toast("The service is temporarily unavailable. Please try again later.")
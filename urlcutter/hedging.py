@@ -0,0 +1,240 @@
+"""Hedged provider calls: race a second provider when the first one is slow.
+
+If the primary has not answered within the hedge delay (its recent p95
+latency from `urlcutter.latency`), the same URL is sent to the secondary provider and the
+first successful answer wins. The loser is abandoned on the executor:
+cancelled if it has not started yet, otherwise counted as an orphan, so the
+pool replaces its worker instead of waiting for the slow call. Counters show
+how often we hedge, how often the hedge wins and how much tail latency that saved.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+
+from urlcutter.latency import AdaptiveTimeouts, get_adaptive_timeouts
+from urlcutter.provider_executor import ProviderExecutor, get_executor
+
+__all__ = ["HedgeStats", "Hedger", "get_hedger"]
+
+ShortenFn = Callable[[str, float | None], str]
+
+DEFAULT_HEDGE_DELAY = 1.0  # пока мало замеров
+MIN_HEDGE_DELAY = 0.15
+MAX_HEDGE_DELAY = 3.0
+HEDGE_PERCENTILE = 0.95
+
+
+@dataclass(slots=True, frozen=True)
+class HedgeStats:
+    requests: int
+    hedged: int  # сколько раз запускали второй запрос
+    hedge_wins: int  # второй ответил первым
+    primary_wins: int
+    saved_seconds: float  # сколько хвоста срезали победы хеджа (по факту ответа primary)
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.hedge_wins / self.hedged if self.hedged else 0.0
+
+
+class Hedger:
+    """Runs primary/secondary provider races on the shared `ProviderExecutor`."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        executor: ProviderExecutor | None = None,
+        latency: AdaptiveTimeouts | None = None,
+        percentile: float = HEDGE_PERCENTILE,
+        default_delay: float = DEFAULT_HEDGE_DELAY,
+        min_delay: float = MIN_HEDGE_DELAY,
+        max_delay: float = MAX_HEDGE_DELAY,
+    ) -> None:
+        self._executor = executor
+        # общий трекер с адаптивными таймаутами, чтобы не мерить одно и то же дважды
+        self.latency = latency or AdaptiveTimeouts()
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._primary_wins = 0
+        self._saved = 0.0
+
+    @property
+    def executor(self) -> ProviderExecutor:
+        return self._executor or get_executor()
+
+    # ---------- latency ----------
+
+    def observe(self, provider: str, seconds: float) -> None:
+        self.latency.observe(provider, seconds)
+
+    def hedge_delay(self, provider: str) -> float:
+        p = self.latency.quantile(provider, self.percentile)
+        if p is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, p))
+
+    # ---------- race ----------
+
+    def race(  # noqa: PLR0912, PLR0913, PLR0915
+        self,
+        url: str,
+        timeout: float | None,
+        primary: tuple[str, ShortenFn],
+        secondary: tuple[str, ShortenFn],
+        *,
+        admit: Callable[[str], bool] | None = None,
+        report: Callable[[str, bool | None], None] | None = None,
+    ) -> tuple[str, str]:
+        """Return `(short_url, provider_name)` from whichever provider answers first.
+
+        Raises the error of the provider that failed last if both fail,
+        TimeoutError if neither answers within `timeout`.
+
+        `admit(secondary_name)` is asked right before the secondary would be
+        launched (hedge or fast failover); False keeps it out of the race, so
+        its probe slot, token and quota are only spent when it really runs.
+        `report(name, ok)` is called once for every provider that was started:
+        True/False for its own success/failure (a timeout is a failure), None
+        for a loser that was cancelled or ignored — its outcome is unknown.
+        """
+        p_name, p_fn = primary
+        s_name, s_fn = secondary
+        ex = self.executor
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+
+        def _left() -> float | None:
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        reported: set[str] = set()
+
+        def _report(name: str, ok: bool | None) -> None:
+            if report is not None and name not in reported:
+                reported.add(name)
+                report(name, ok)
+
+        with self._lock:
+            self._requests += 1
+
+        p_fut = ex.submit(p_fn, url, timeout)
+        p_fut.add_done_callback(lambda f: self.observe(p_name, time.monotonic() - started))
+
+        delay = self.hedge_delay(p_name)
+        if timeout is not None:
+            delay = min(delay, timeout)
+        done, _ = wait([p_fut], timeout=delay)
+        if done and p_fut.exception() is None:
+            with self._lock:
+                self._primary_wins += 1
+            _report(p_name, True)
+            return p_fut.result(), p_name
+
+        launch = admit is None or admit(s_name)
+        # primary упал быстро — это не хедж, а обычный failover
+        if done:
+            _report(p_name, False)
+            if not launch:
+                raise p_fut.exception()
+            try:
+                short = ex.call(s_fn, url, _left(), timeout=_left())
+            except Exception:
+                _report(s_name, False)
+                raise
+            _report(s_name, True)
+            return short, s_name
+
+        futures = {p_fut: p_name}
+        if launch:
+            with self._lock:
+                self._hedged += 1
+            hedge_started = time.monotonic()
+            s_fut = ex.submit(s_fn, url, _left())
+            s_fut.add_done_callback(lambda f: self.observe(s_name, time.monotonic() - hedge_started))
+            futures[s_fut] = s_name
+
+        pending: set[Future] = set(futures)
+        last_exc: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, timeout=_left(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                exc = fut.exception()
+                if exc is not None:
+                    _report(futures[fut], False)
+                    last_exc = exc
+                    continue
+                for other in futures.keys() - {fut}:
+                    if other in pending:
+                        # cancel() на запущенном Future ничего не делает — воркер занят до конца вызова
+                        ex.abandon(other)
+                        _report(futures[other], None)
+                    else:
+                        _report(futures[other], other.exception() is None)  # завершились одновременно
+                if fut is not p_fut:
+                    self._record_hedge_win(p_fut, started)
+                else:
+                    with self._lock:
+                        self._primary_wins += 1
+                _report(futures[fut], True)
+                return fut.result(), futures[fut]
+
+        for fut in pending:
+            ex.abandon(fut)
+            _report(futures[fut], False)  # не ответил до дедлайна — как таймаут
+        if pending or last_exc is None:
+            raise TimeoutError(f"no provider answered within {timeout}s")
+        raise last_exc
+
+    def _record_hedge_win(self, p_fut: Future, started: float) -> None:
+        won_after = time.monotonic() - started
+        with self._lock:
+            self._hedge_wins += 1
+
+        # экономию считаем, когда primary всё-таки ответит
+        def _saved(_f: Future) -> None:
+            lost_after = time.monotonic() - started
+            with self._lock:
+                self._saved += max(0.0, lost_after - won_after)
+
+        p_fut.add_done_callback(_saved)
+
+    def stats(self) -> HedgeStats:
+        with self._lock:
+            return HedgeStats(
+                requests=self._requests,
+                hedged=self._hedged,
+                hedge_wins=self._hedge_wins,
+                primary_wins=self._primary_wins,
+                saved_seconds=self._saved,
+            )
+
+
+# --- Process-wide instance ---
+
+_hedger: Hedger | None = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    global _hedger  # noqa: PLW0603
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger(latency=get_adaptive_timeouts())
+        return _hedger
@@ -0,0 +1,242 @@
+"""Process-wide pooled HTTP client for shortening providers.
+
+One keep-alive `requests.Session` (with a sized `HTTPAdapter`) is shared by the
+direct HTTP path, the batch API and the pyshorteners backends, so repeated
+shortens reuse TCP/TLS connections instead of paying a handshake every time.
+Pooled connections are keyed by scheme + host, so `warm()` opens one to the
+exact origin of the backend's `api_url`; the TinyURL backend is switched from
+pyshorteners' `http://` to `https://`, the origin the direct path uses too.
+"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import pyshorteners
+except Exception:
+    pyshorteners = None
+
+__all__ = [
+    "ClientStats",
+    "ProviderClient",
+    "close_client",
+    "configure_client",
+    "get_client",
+]
+
+DEFAULT_HTTP_TIMEOUT = 5
+DEFAULT_POOL_CONNECTIONS = 4  # сколько разных хостов держим в пуле
+DEFAULT_POOL_MAXSIZE = 8  # сколько соединений на один хост
+WARM_URLS = ("https://tinyurl.com/",)  # без pyshorteners: origin прямого пути (TINYURL_ENDPOINT)
+HTTPS_BACKENDS = frozenset({"tinyurl"})  # api_url этих бэкендов переводим на https
+USER_AGENT = "urlcutter/0.1"
+
+
+@dataclass(slots=True, frozen=True)
+class ClientStats:
+    """Connection reuse counters (summed over all hosts)."""
+
+    requests: int
+    connections_opened: int
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.connections_opened)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+
+class ProviderClient:
+    """Thread-safe holder of the shared session and cached provider clients."""
+
+    def __init__(
+        self,
+        *,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        timeout: float = DEFAULT_HTTP_TIMEOUT,
+    ) -> None:
+        if pool_connections < 1 or pool_maxsize < 1:
+            raise ValueError("pool sizes must be >= 1")
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._session: requests.Session | None = None
+        self._adapters: list[HTTPAdapter] = []
+        self._providers: dict[str, object] = {}
+        # счётчики уже закрытых сессий/адаптеров, чтобы stats() не «обнулялся»
+        self._retired_requests = 0
+        self._retired_connections = 0
+
+    # ---------- lifecycle ----------
+
+    def _mount(self, session: requests.Session) -> None:
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._adapters.append(adapter)
+
+    @property
+    def session(self) -> requests.Session:
+        session = self._session
+        if session is not None:
+            return session
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.headers["User-Agent"] = USER_AGENT
+                self._mount(session)
+                self._session = session
+            return self._session
+
+    def ensure_capacity(self, pool_maxsize: int) -> None:
+        """Grow the per-host pool (e.g. for a batch with higher concurrency)."""
+        with self._lock:
+            if pool_maxsize <= self.pool_maxsize:
+                return
+            self.pool_maxsize = pool_maxsize
+            if self._session is not None:
+                # старый адаптер продолжает жить до close(): его соединения
+                # доработают текущие запросы, новые пойдут в больший пул
+                self._mount(self._session)
+
+    def warm_urls(self) -> tuple[str, ...]:
+        """Origins the first real shorten will connect to (the TinyURL backend's `api_url`)."""
+        try:
+            api = urlsplit(self.pyshortener("tinyurl").api_url)
+        except RuntimeError:
+            return WARM_URLS
+        return (f"{api.scheme}://{api.netloc}/",)
+
+    def warm(self, urls: Iterable[str] | None = None, *, timeout: float | None = None) -> int:
+        """Open connections ahead of the first shorten (default: `warm_urls()`). Returns how many hosts answered."""
+        warmed = 0
+        for url in self.warm_urls() if urls is None else urls:
+            try:
+                self.session.head(url, timeout=timeout or self.timeout, allow_redirects=False)
+                warmed += 1
+            except requests.RequestException:
+                # прогрев — best effort, офлайн не должен ломать старт
+                continue
+        return warmed
+
+    def close(self) -> None:
+        with self._lock:
+            stats = self._collect()
+            self._retired_requests = stats.requests
+            self._retired_connections = stats.connections_opened
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._adapters.clear()
+            self._providers.clear()
+
+    # ---------- requests ----------
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.head(url, **kwargs)
+
+    def pyshortener(self, name: str = "tinyurl") -> object:
+        """Return a cached pyshorteners backend whose HTTP goes through the shared session."""
+        provider = self._providers.get(name)
+        if provider is not None:
+            return provider
+        if pyshorteners is None:
+            raise RuntimeError("pyshorteners is required for TinyURL but is not installed.")
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider is None:
+                provider = getattr(pyshorteners.Shortener(timeout=int(self.timeout)), name)
+                api_url = getattr(provider, "api_url", "")
+                if name in HTTPS_BACKENDS and api_url.startswith("http://"):
+                    # другая схема — другой пул: прогретое https-соединение иначе не переиспользуется
+                    provider.api_url = "https://" + api_url[len("http://") :]
+                # pyshorteners ходит через requests.get/post — перенаправим в сессию
+                provider._get = partial(self._provider_request, provider, "GET")
+                provider._post = partial(self._provider_request, provider, "POST")
+                self._providers[name] = provider
+            return provider
+
+    def _provider_request(self, provider, method: str, url: str, **kwargs) -> requests.Response:
+        url = provider.clean_url(url)
+        kwargs.setdefault("timeout", getattr(provider, "timeout", self.timeout))
+        kwargs.setdefault("verify", getattr(provider, "verify", True))
+        kwargs.setdefault("proxies", getattr(provider, "proxies", {}))
+        return self.session.request(method, url, **kwargs)
+
+    # ---------- metrics ----------
+
+    def _collect(self) -> ClientStats:
+        requests_total = self._retired_requests
+        opened = self._retired_connections
+        for adapter in self._adapters:
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_total += getattr(pool, "num_requests", 0)
+                opened += getattr(pool, "num_connections", 0)
+        return ClientStats(requests=requests_total, connections_opened=opened)
+
+    def stats(self) -> ClientStats:
+        with self._lock:
+            return self._collect()
+
+
+# --- Process-wide instance ---
+
+_client: ProviderClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ProviderClient:
+    """Return the shared client, creating it with defaults on first use."""
+    global _client  # noqa: PLW0603
+    client = _client
+    if client is not None:
+        return client
+    with _client_lock:
+        if _client is None:
+            _client = ProviderClient()
+        return _client
+
+
+def configure_client(**kwargs) -> ProviderClient:
+    """Replace the shared client (closing the previous one) with new pool settings."""
+    global _client  # noqa: PLW0603
+    with _client_lock:
+        old, _client = _client, ProviderClient(**kwargs)
+    if old is not None:
+        old.close()
+    return _client
+
+
+def close_client() -> None:
+    """Close the shared client; the next `get_client()` starts a fresh one."""
+    global _client  # noqa: PLW0603
+    with _client_lock:
+        old, _client = _client, None
+    if old is not None:
+        old.close()
+
+
+atexit.register(close_client)
@@ -0,0 +1,175 @@
+"""Per-provider latency tracking and adaptive attempt timeouts.
+
+`LatencyTracker` is a time-decaying log-bucket histogram: O(1) per sample,
+a few hundred bytes per provider, and old samples fade out with a half-life
+so percentiles follow the provider's *current* behaviour.
+
+`AdaptiveTimeouts` turns the recent p99 into the next attempt's timeout
+(`p99 × factor`, clamped to `[floor, ceiling]`). Until enough samples are
+seen it falls back to the ceiling, i.e. the old fixed constant.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+__all__ = ["AdaptiveTimeouts", "LatencyTracker", "TimeoutInfo", "get_adaptive_timeouts"]
+
+MIN_LATENCY = 0.001  # 1 ms — нижняя граница первой корзины
+MAX_LATENCY = 120.0
+BUCKET_GROWTH = 1.15  # ~8% относительная ошибка квантиля
+DEFAULT_HALF_LIFE = 300.0  # секунд: замеры пятиминутной давности весят вдвое меньше
+
+DEFAULT_FACTOR = 2.0
+DEFAULT_FLOOR = 1.0
+DEFAULT_CEILING = 8.0
+DEFAULT_QUANTILE = 0.99
+MIN_SAMPLES = 20
+
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+_N_BUCKETS = int(math.ceil(math.log(MAX_LATENCY / MIN_LATENCY) / _LOG_GROWTH)) + 1
+_RESCALE_AT = 1e100
+
+
+def _bucket(seconds: float) -> int:
+    if seconds <= MIN_LATENCY:
+        return 0
+    return min(_N_BUCKETS - 1, int(math.log(seconds / MIN_LATENCY) / _LOG_GROWTH) + 1)
+
+
+def _bucket_upper(idx: int) -> float:
+    return MIN_LATENCY * BUCKET_GROWTH**idx
+
+
+class LatencyTracker:
+    """Decaying histogram of call latencies (forward decay: new samples weigh more)."""
+
+    __slots__ = ("_clock", "_counts", "_landmark", "_lock", "_total", "count", "half_life")
+
+    def __init__(self, *, half_life: float = DEFAULT_HALF_LIFE, clock: Callable[[], float] = time.monotonic) -> None:
+        self.half_life = half_life
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counts = [0.0] * _N_BUCKETS
+        self._total = 0.0
+        self._landmark = clock()
+        self.count = 0  # сырое число замеров (для «прогрева»)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            weight = 2.0 ** ((self._clock() - self._landmark) / self.half_life)
+            if weight > _RESCALE_AT:
+                self._rescale()
+                weight = 1.0
+            self._counts[_bucket(seconds)] += weight
+            self._total += weight
+            self.count += 1
+
+    def _rescale(self) -> None:
+        now = self._clock()
+        factor = 2.0 ** ((now - self._landmark) / self.half_life)
+        self._counts = [c / factor for c in self._counts]
+        self._total /= factor
+        self._landmark = now
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the `q`-quantile, None without data."""
+        with self._lock:
+            if self._total <= 0:
+                return None
+            target = q * self._total
+            acc = 0.0
+            for idx, c in enumerate(self._counts):
+                acc += c
+                if acc >= target:
+                    return _bucket_upper(idx)
+            return _bucket_upper(_N_BUCKETS - 1)
+
+
+@dataclass(slots=True, frozen=True)
+class TimeoutInfo:
+    samples: int
+    p50: float | None
+    p99: float | None
+    timeout: float
+
+
+class AdaptiveTimeouts:
+    """Per-provider attempt timeouts derived from recent latency percentiles."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        factor: float = DEFAULT_FACTOR,
+        floor: float = DEFAULT_FLOOR,
+        ceiling: float = DEFAULT_CEILING,
+        quantile: float = DEFAULT_QUANTILE,
+        min_samples: int = MIN_SAMPLES,
+        half_life: float = DEFAULT_HALF_LIFE,
+    ) -> None:
+        if not 0 < floor <= ceiling:
+            raise ValueError("expected 0 < floor <= ceiling")
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.q = quantile
+        self.min_samples = min_samples
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._trackers: dict[str, LatencyTracker] = {}
+
+    def tracker(self, provider: str) -> LatencyTracker:
+        tr = self._trackers.get(provider)
+        if tr is None:
+            with self._lock:
+                tr = self._trackers.setdefault(provider, LatencyTracker(half_life=self.half_life))
+        return tr
+
+    def observe(self, provider: str, seconds: float) -> None:
+        """Record a finished call; for a timed-out call pass the timeout it had."""
+        self.tracker(provider).observe(seconds)
+
+    def quantile(self, provider: str, q: float) -> float | None:
+        tr = self._trackers.get(provider)
+        if tr is None or tr.count < self.min_samples:
+            return None
+        return tr.quantile(q)
+
+    def timeout_for(self, provider: str) -> float:
+        p = self.quantile(provider, self.q)
+        if p is None:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, p * self.factor))
+
+    def snapshot(self) -> dict[str, TimeoutInfo]:
+        """Current adapted values per provider (for logs/diagnostics)."""
+        with self._lock:
+            names = list(self._trackers)
+        out = {}
+        for name in names:
+            tr = self._trackers[name]
+            out[name] = TimeoutInfo(
+                samples=tr.count,
+                p50=tr.quantile(0.5),
+                p99=tr.quantile(self.q),
+                timeout=self.timeout_for(name),
+            )
+        return out
+
+
+# --- Process-wide instance ---
+
+_timeouts: AdaptiveTimeouts | None = None
+_timeouts_lock = threading.Lock()
+
+
+def get_adaptive_timeouts() -> AdaptiveTimeouts:
+    global _timeouts  # noqa: PLW0603
+    with _timeouts_lock:
+        if _timeouts is None:
+            _timeouts = AdaptiveTimeouts()
+        return _timeouts
@@ -0,0 +1,317 @@
+"""Read-only, memory-mapped snapshot of the `links` table: short_url → long_url.
+
+For lookup-heavy workloads (redirect server, batch expansion) a query per
+lookup is the dominant cost. The snapshot is one file, opened with `mmap`:
+
+    header   32 bytes: magic, byte order, count, watermark (max links.id), blob size
+    hashes   count × u64 — 64-bit hashes of short_url, sorted
+    offsets  (count + 1) × u64 — record i is blob[offsets[i]:offsets[i + 1]]
+    blob     records `short_url \\0 long_url`, in hash order
+
+A lookup is a `bisect` over the hash array (a `memoryview` of the mapping)
+and a key comparison against the record. It allocates a few small
+`memoryview` slices, which reference the mapping and copy no bytes, and
+decodes the long URL straight from the mapping into the returned string. Hash
+collisions are resolved by scanning the equal-hash run and comparing keys.
+
+`build_snapshot` is incremental only in what it queries: it reads just the
+rows with `id` above the old snapshot's watermark. It then loads every entry
+of the old snapshot into memory, merges the new rows (newest row per short_url
+wins, as in the DB lookups) and rewrites the whole file, re-hashing and
+re-sorting all entries. A refresh therefore costs time proportional to the
+snapshot size, not to the number of new rows. The new file is written to a
+temp file and `os.replace`d over the old one.
+Readers keep their mapping of the old inode until `SnapshotHolder.reload`
+swaps in the new one. Windows refuses to replace a file someone still has
+mapped; then the new snapshot is published next to it as a versioned file
+(`links.snap.1`, `links.snap.2`, ...) and readers pick the newest of them
+(`snapshot_file`). Versions are cleaned up once nobody maps them. Close
+snapshots you are done with (`close()` or `with`): the mapping pins the file.
+Deleted history rows only disappear on a `full` build.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import Engine, func, select
+
+from urlcutter.db import engine as db_engine
+from urlcutter.db.models import Link
+from urlcutter.db.paths import user_data_dir
+
+__all__ = [
+    "LinkSnapshot",
+    "SnapshotBuildStats",
+    "SnapshotHolder",
+    "build_snapshot",
+    "default_snapshot_path",
+    "snapshot_file",
+]
+
+MAGIC = b"UCSNAP\x00\x01"
+_HEADER = struct.Struct("<8sIIQQ")  # magic, byteorder, count, watermark, blob_size
+_ORDER = {"little": 1, "big": 2}
+_SEP = b"\x00"
+FETCH_BATCH = 10_000
+
+
+def default_snapshot_path() -> Path:
+    return user_data_dir() / "links.snap"
+
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _versions(path: Path) -> list[tuple[int, Path]]:
+    """Versioned siblings `<name>.<n>` written when `path` itself could not be replaced."""
+    found = []
+    for p in path.parent.glob(glob.escape(path.name) + ".*"):
+        suffix = p.name[len(path.name) + 1 :]
+        if suffix.isdigit():
+            found.append((int(suffix), p))
+    return sorted(found)
+
+
+def snapshot_file(path: str | os.PathLike[str]) -> Path:
+    """The file holding the newest snapshot published under `path`."""
+    path = Path(path)
+    candidates = [p for _, p in _versions(path)]
+    if path.exists():
+        candidates.append(path)
+    if not candidates:
+        return path
+
+    def _mtime(p: Path) -> int:
+        try:
+            return p.stat().st_mtime_ns
+        except FileNotFoundError:
+            return -1  # удалили между glob и stat
+
+    # при равном mtime (грубые часы ФС) побеждает более поздняя версия, затем сам `path`
+    return max(enumerate(candidates), key=lambda ic: (_mtime(ic[1]), ic[0]))[1]
+
+
+class LinkSnapshot:
+    """One opened snapshot file; immutable, safe to share between threads."""
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{self.path}: not a link snapshot (too short)")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, order, count, watermark, blob_size = _HEADER.unpack_from(self._mm, 0)
+        h0 = _HEADER.size
+        o0 = h0 + 8 * count
+        b0 = o0 + 8 * (count + 1)
+        error = None
+        if magic != MAGIC:
+            error = "not a link snapshot (bad magic)"
+        elif order != _ORDER[sys.byteorder]:
+            error = "built on a machine with a different byte order"
+        elif size != b0 + blob_size:
+            error = "truncated snapshot"
+        if error is not None:
+            self._mm.close()  # иначе отображение держит файл до сборки мусора
+            raise ValueError(f"{self.path}: {error}")
+        self._view = memoryview(self._mm)
+        self._hashes = self._view[h0:o0].cast("Q")
+        self._offsets = self._view[o0:b0].cast("Q")
+        self._blob = self._view[b0:]
+        self.count = count
+        self.watermark = watermark
+
+    @property
+    def closed(self) -> bool:
+        return self._mm.closed
+
+    def close(self) -> None:
+        """Unmap the file; lookups afterwards raise ValueError."""
+        if self._mm.closed:
+            return
+        # mmap не закрыть, пока на него смотрят memoryview
+        for view in (self._hashes, self._offsets, self._blob, self._view):
+            view.release()
+        self._mm.close()
+
+    def __enter__(self) -> LinkSnapshot:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, i: int) -> memoryview:
+        return self._blob[self._offsets[i] : self._offsets[i + 1]]
+
+    def get(self, short_url: str) -> str | None:
+        key = short_url.encode()
+        h = _hash(key)
+        i = bisect.bisect_left(self._hashes, h)
+        n = len(key)
+        while i < self.count and self._hashes[i] == h:
+            rec = self._record(i)
+            if len(rec) > n and rec[n] == 0 and rec[:n] == key:
+                return str(rec[n + 1 :], "utf-8")
+            i += 1
+        return None
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        """All (short_url, long_url) pairs, in hash order."""
+        for i in range(self.count):
+            short, _, long = bytes(self._record(i)).partition(_SEP)
+            yield short.decode(), long.decode()
+
+
+@dataclass(slots=True)
+class SnapshotBuildStats:
+    entries: int
+    new_rows: int
+    watermark: int
+    elapsed: float
+
+
+def _write(path: Path, entries: dict[bytes, bytes], watermark: int) -> None:
+    keyed = sorted((_hash(k), k, v) for k, v in entries.items())
+    hashes = array("Q", (h for h, _, _ in keyed))
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for _, k, v in keyed:
+        blob += k + _SEP + v
+        offsets.append(len(blob))
+    header = _HEADER.pack(MAGIC, _ORDER[sys.byteorder], len(keyed), watermark, len(blob))
+
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(hashes.tobytes())
+            f.write(offsets.tobytes())
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # старый файл остаётся открытым у читателей (mmap держит inode) — замена атомарна
+            os.replace(tmp, path)
+        except PermissionError:
+            # Windows: файл отображён читателем — публикуем рядом следующую версию
+            versions = _versions(path)
+            os.replace(tmp, path.with_name(f"{path.name}.{versions[-1][0] + 1 if versions else 1}"))
+            return
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    for _, stale in _versions(path):
+        with contextlib.suppress(OSError):  # ещё отображена у кого-то — уберём в следующий раз
+            stale.unlink()
+
+
+def build_snapshot(
+    path: str | os.PathLike[str] | None = None,
+    *,
+    engine: Engine | None = None,
+    full: bool = False,
+) -> SnapshotBuildStats:
+    """Create or refresh the snapshot at `path` from the `links` table."""
+    started = time.monotonic()
+    path = Path(path) if path is not None else default_snapshot_path()
+    entries: dict[bytes, bytes] = {}
+    watermark = 0
+    current = snapshot_file(path)
+    if not full and current.exists():
+        try:
+            old = LinkSnapshot(current)
+        except ValueError:
+            old = None  # битый/чужой файл — просто строим заново
+        if old is not None:
+            with old:  # закрываем до замены файла
+                entries = {s.encode(): lng.encode() for s, lng in old.items()}
+                watermark = old.watermark
+
+    new_rows = 0
+    with (engine or db_engine.engine).connect() as conn:
+        if watermark and (conn.execute(select(func.max(Link.id))).scalar() or 0) < watermark:
+            entries, watermark = {}, 0  # БД пересоздали — инкремент не годится
+        stmt = select(Link.id, Link.short_url, Link.long_url).where(Link.id > watermark).order_by(Link.id)
+        for rows in conn.execution_options(yield_per=FETCH_BATCH).execute(stmt).partitions():
+            for link_id, short_url, long_url in rows:
+                entries[short_url.encode()] = long_url.encode()  # по возрастанию id: новая строка побеждает
+                watermark = link_id
+            new_rows += len(rows)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write(path, entries, watermark)
+    return SnapshotBuildStats(
+        entries=len(entries), new_rows=new_rows, watermark=watermark, elapsed=time.monotonic() - started
+    )
+
+
+class SnapshotHolder:
+    """Current snapshot for long-lived readers, swapped in place on `reload()`."""
+
+    def __init__(self, path: str | os.PathLike[str] | None = None) -> None:
+        self.path = Path(path) if path is not None else default_snapshot_path()
+        self._lock = threading.Lock()
+        self._current: LinkSnapshot | None = None
+        self._stamp: tuple[str, int, int] | None = None
+        self.reload()
+
+    @property
+    def current(self) -> LinkSnapshot | None:
+        return self._current
+
+    def _file_stamp(self) -> tuple[str, int, int] | None:
+        current = snapshot_file(self.path)
+        try:
+            st = os.stat(current)
+        except FileNotFoundError:
+            return None
+        return str(current), st.st_ino, st.st_mtime_ns
+
+    def reload(self) -> bool:
+        """Map the file again if it was replaced; True when a new snapshot was swapped in."""
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp is None or stamp == self._stamp:
+                return False
+            fresh = LinkSnapshot(stamp[0])
+            # простое присваивание ссылки: читатели дорабатывают со старым отображением,
+            # оно закроется само, когда на него не останется ссылок
+            self._current, self._stamp = fresh, stamp
+            return True
+
+    def get(self, short_url: str) -> str | None:
+        snap = self._current
+        return snap.get(short_url) if snap is not None else None
+
+    def close(self) -> None:
+        """Unmap the current snapshot (call once no reader uses the holder any more)."""
+        with self._lock:
+            snap, self._current, self._stamp = self._current, None, None
+        if snap is not None:
+            snap.close()
+
+    def __enter__(self) -> SnapshotHolder:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
@@ -0,0 +1,186 @@
+"""Offline "local" provider: short codes issued by this app, no network.
+
+Codes are base62 of ids from a hi/lo allocator: one small transaction on the
+history DB reserves a whole block of `block_size` ids (the "hi" part), and
+codes inside the block (the "lo" part) are handed out from memory. The block
+is taken with UPDATE-then-SELECT in a single transaction, so two processes
+sharing the DB file can never get the same block. Unused ids of a block are
+simply skipped after a restart.
+
+Short URLs look like `<URLCUTTER_LOCAL_BASE_URL>/<code>`; the mapping lives in
+the `links` table, recorded by the caller like for any other service.
+`shorten(url, alias=...)` issues a custom alias instead; availability goes
+through `urlcutter.aliases.AliasRegistry`, which generated codes consult too.
+Every issued code is claimed in the `local_codes` table, generated ones
+`CLAIM_BATCH` at a time, so a code taken by another process (say, as an
+alias) is skipped rather than handed out twice. Like unused ids, claimed but
+unissued codes of a batch are lost on restart.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from collections.abc import Callable
+from contextlib import AbstractContextManager
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from urlcutter.aliases import AliasRegistry
+from urlcutter.db import engine as db_engine
+from urlcutter.db.models import IdSequence
+from urlcutter.shorteners import _normalize_input
+
+__all__ = [
+    "LOCAL_BASE_URL",
+    "BlockAllocator",
+    "LocalShortener",
+    "decode_base62",
+    "encode_base62",
+    "get_local_shortener",
+]
+
+BASE62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DEFAULT_BLOCK_SIZE = 1000
+CLAIM_BATCH = 100  # сгенерированных кодов за одну транзакцию в local_codes
+SEQUENCE_NAME = "local"
+LOCAL_BASE_URL = os.getenv("URLCUTTER_LOCAL_BASE_URL", "http://localhost:8765")
+
+SessionFactory = Callable[[], AbstractContextManager[Session]]
+
+
+def encode_base62(n: int) -> str:
+    if n < 0:
+        raise ValueError("n must be >= 0")
+    if n == 0:
+        return BASE62[0]
+    out = []
+    while n:
+        n, r = divmod(n, 62)
+        out.append(BASE62[r])
+    return "".join(reversed(out))
+
+
+def decode_base62(code: str) -> int:
+    n = 0
+    for ch in code:
+        idx = BASE62.find(ch)
+        if idx < 0:
+            raise ValueError(f"not a base62 code: {code!r}")
+        n = n * 62 + idx
+    return n
+
+
+class BlockAllocator:
+    """Thread-safe hi/lo id allocator backed by the `id_sequences` table."""
+
+    def __init__(
+        self,
+        name: str = SEQUENCE_NAME,
+        *,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        session_factory: SessionFactory | None = None,
+    ) -> None:
+        if block_size < 1:
+            raise ValueError("block_size must be >= 1")
+        self.name = name
+        self.block_size = block_size
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0  # пустой блок: первый next_id() сходит в БД
+        self.blocks_reserved = 0
+
+    def _session(self) -> AbstractContextManager[Session]:
+        # get_session берём в момент вызова, чтобы тесты могли подменить движок
+        return (self.session_factory or db_engine.get_session)()
+
+    def reserve_block(self) -> int:
+        """Reserve the next block in the DB and return its hi number."""
+        for _ in range(2):
+            try:
+                with self._session() as s:
+                    # UPDATE берёт блокировку записи до COMMIT — SELECT ниже видит только наш инкремент
+                    res = s.execute(
+                        update(IdSequence).where(IdSequence.name == self.name).values(next_hi=IdSequence.next_hi + 1)
+                    )
+                    if res.rowcount == 0:
+                        s.add(IdSequence(name=self.name, next_hi=1))
+                        s.flush()
+                        hi = 0
+                    else:
+                        hi = s.execute(select(IdSequence.next_hi).where(IdSequence.name == self.name)).scalar_one() - 1
+                    s.commit()
+                    return hi
+            except IntegrityError:
+                continue  # другой процесс создал строку одновременно с нами — повторяем через UPDATE
+        raise RuntimeError(f"could not reserve an id block for sequence {self.name!r}")
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                hi = self.reserve_block()
+                self.blocks_reserved += 1
+                # +1: id 0 (код «0») не выдаём
+                self._next = hi * self.block_size + 1
+                self._end = self._next + self.block_size
+            n = self._next
+            self._next += 1
+            return n
+
+
+class LocalShortener:
+    """Issues `<base_url>/<base62 id>` short links without any network I/O."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        *,
+        allocator: BlockAllocator | None = None,
+        aliases: AliasRegistry | None = None,
+    ) -> None:
+        self.base_url = (base_url or LOCAL_BASE_URL).rstrip("/")
+        self.allocator = allocator or BlockAllocator()
+        self.aliases = aliases or AliasRegistry(self.base_url, session_factory=self.allocator.session_factory)
+        self._codes: deque[str] = deque()  # уже закреплены в local_codes, ещё не выданы
+        self._codes_lock = threading.Lock()
+
+    def shorten(self, url: str, timeout: float | None = None, *, alias: str | None = None) -> str:
+        """Issue a short link; with `alias` the code is the alias (AliasTaken if in use)."""
+        _normalize_input(url)  # те же правила валидации, что у сетевых провайдеров
+        code = self.aliases.reserve(alias) if alias is not None else self._next_code()
+        return f"{self.base_url}/{code}"
+
+    def _next_code(self) -> str:
+        with self._codes_lock:
+            while not self._codes:
+                codes = [encode_base62(self.allocator.next_id()) for _ in range(CLAIM_BATCH)]
+                # сгенерированные коды уникальны между собой, но могут совпасть с чьим-то алиасом
+                self._codes.extend(self.aliases.claim_many([c for c in codes if not self.aliases.is_taken(c)]))
+            return self._codes.popleft()
+
+    def code_of(self, short_url: str) -> str | None:
+        """Code part of one of our short URLs, None for foreign links."""
+        prefix = self.base_url + "/"
+        if not short_url.startswith(prefix):
+            return None
+        return short_url[len(prefix) :] or None
+
+
+# --- Process-wide instance ---
+
+_local: LocalShortener | None = None
+_local_lock = threading.Lock()
+
+
+def get_local_shortener() -> LocalShortener:
+    global _local  # noqa: PLW0603
+    with _local_lock:
+        if _local is None:
+            _local = LocalShortener()
+        return _local
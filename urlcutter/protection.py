@@ -1,123 +1,655 @@
+"""Client-side protection: local rate limiting and a circuit breaker.
+
+Both live behind one `ProtectionEngine` with pluggable strategies — any
+`Limiter` (default: per-provider `TokenBucket`s via `RateLimiter`) and any
+`Breaker` (default: the per-provider half-open `CircuitBreaker`). The process shares one
+engine (`get_protection_engine`, replaceable once at start-up with
+`set_protection_engine`): the app's `Handlers`, `internet_ok`, the bulk
+CLI and the module-level helpers below all read and update the same state.
+With `URLCUTTER_SHARED_STATE` set, that engine keeps its state in a file
+shared by every process on the host (see `urlcutter.shared_protection`).
+`AppState` is the engine class under its historical name; constructing it
+directly gives an independent engine (tests, benchmarks).
+"""
+
+import dataclasses
 import logging
+import math
+import os
+import threading
 import time
-from collections import deque
-from collections.abc import Callable
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Protocol
+
+from urlcutter.connectivity import ConnectivityMonitor, get_connectivity_monitor
+from urlcutter.retry import LocalRefusal, ProviderUnavailable, RateLimited
 
 # --- Константы поведения ---
 CLIENT_RPM_LIMIT = 60  # сколько запросов в минуту разрешено
-CB_FAIL_THRESHOLD = 3  # после скольких подряд ошибок открываем предохранитель
-CB_COOLDOWN_SEC = 30  # сколько секунд держим «открытым»
 CIRCUIT_FAIL_THRESHOLD = 3  # сколько подряд ошибок, чтобы "остановиться"
 CIRCUIT_COOLDOWN_SEC = 60  # на сколько секунд "остановиться" (cooldown)
+CIRCUIT_MAX_COOLDOWN_SEC = 15 * 60  # потолок экспоненциального кулдауна
+CIRCUIT_PROBE_TIMEOUT_SEC = 30  # пробный слот, о котором не отчитались, освобождается через столько
+CB_FAIL_THRESHOLD = CIRCUIT_FAIL_THRESHOLD  # прежние имена модульного предохранителя — теперь он тот же
+CB_COOLDOWN_SEC = CIRCUIT_COOLDOWN_SEC
 RATE_LIMIT_WINDOW_SEC = 60
+ANY_PROVIDER = "*"  # общее ведро на все вызовы наружу
+RATE_LIMITS_ENV = "URLCUTTER_RATE_LIMITS"  # "isgd=10:0.5;tinyurl=30:1" — ёмкость:токенов в секунду
+SHARED_STATE_ENV = "URLCUTTER_SHARED_STATE"  # "1" или путь к файлу — лимит и предохранитель общие для процессов
 
-# --- Глобальное состояние (простое и прозрачное) ---
-_state = {
-    "ticks": deque(),  # таймстемпы успешных выдач для rate-limit
-    "fail_count": 0,  # счётчик подряд идущих ошибок
-    "cb_open_until": 0.0,  # unix-время, до которого предохранитель «открыт»
-}
+log = logging.getLogger("urlcutter.protection")
 
 
-# Тестовые служебные функции (экспортируем для фикстур)
-def _get_state():
-    return _state
+class TokenBucket:
+    """Thread-safe token bucket: up to `burst` tokens, refilled at `rate` tokens per second.
 
+    Every decision is O(1): tokens are topped up lazily from the time since
+    the previous decision, then one comparison and one subtraction under a
+    lock. Time comes from `clock` (default `time.monotonic`, looked up per
+    call); an explicit `now` overrides it.
+    """
 
-def _reset_state():
-    _state["ticks"].clear()
-    _state["fail_count"] = 0
-    _state["cb_open_until"] = 0.0
+    __slots__ = ("burst", "rate", "_clock", "_lock", "_tokens", "_stamp")
 
+    def __init__(self, burst: float, rate: float, *, clock: Callable[[], float] | None = None) -> None:
+        if burst < 1:
+            raise ValueError("burst must be >= 1")
+        if rate < 0:
+            raise ValueError("rate must be >= 0")
+        self.burst = float(burst)
+        self.rate = float(rate)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._stamp: float | None = None  # первое обращение задаёт точку отсчёта
 
-class AppState:
-    def __init__(self):
-        self.ticks = deque(maxlen=CLIENT_RPM_LIMIT * 2)
-        self.fails = 0
-        self.blocked_until = 0.0
+    def _refill(self, now: float) -> float:
+        # вызывается под self._lock
+        stamp = self._stamp
+        if stamp is None or now < stamp:
+            self._stamp = now  # часы пошли назад (или первый вызов) — просто переставляем отсчёт
+        elif now > stamp:
+            tokens = self._tokens + (now - stamp) * self.rate
+            self._tokens = tokens if tokens < self.burst else self.burst
+            self._stamp = now
+        return self._tokens
 
-    def circuit_blocked(self) -> bool:
-        return time.time() < self.blocked_until
+    def try_acquire(self, n: float = 1.0, *, now: float | None = None) -> bool:
+        if now is None:
+            now = self._clock() if self._clock is not None else time.monotonic()
+        # горячий путь: _refill вписан вручную, а лок берётся acquire/release —
+        # на CPython это заметно дешевле, чем протокол контекстного менеджера
+        lock = self._lock
+        lock.acquire()
+        try:
+            stamp = self._stamp
+            if stamp is not None and now > stamp:
+                tokens = self._tokens + (now - stamp) * self.rate
+                if tokens > self.burst:  # noqa: PLR1730 — без вызова min() на горячем пути
+                    tokens = self.burst
+                self._stamp = now
+            else:
+                tokens = self._tokens
+                if stamp is None or now < stamp:
+                    self._stamp = now
+            if tokens >= n:
+                self._tokens = tokens - n
+                return True
+            self._tokens = tokens
+            return False
+        finally:
+            lock.release()
 
-    def record_failure(self):
-        self.fails += 1
-        if self.fails >= CIRCUIT_FAIL_THRESHOLD:
-            self.blocked_until = time.time() + CIRCUIT_COOLDOWN_SEC
+    def peek(self, *, now: float | None = None) -> float:
+        """Tokens available right now, without consuming any."""
+        if now is None:
+            now = self._clock() if self._clock is not None else time.monotonic()
+        with self._lock:
+            return self._refill(now)
 
-    def record_success(self):
-        self.fails = 0
-        self.blocked_until = 0.0
+    def retry_after(self, n: float = 1.0, *, now: float | None = None) -> float:
+        """Seconds until `n` tokens are available (0 if they are now; inf if they never will be)."""
+        missing = n - self.peek(now=now)
+        if missing <= 0:
+            return 0.0
+        if self.rate == 0 or n > self.burst:
+            return math.inf
+        return missing / self.rate
 
-    def cooldown_left(self) -> int:
-        return max(0, int(self.blocked_until - time.time()))
+    def refund(self, n: float = 1.0) -> None:
+        """Return `n` tokens taken for a call that was never made (capped at `burst`)."""
+        with self._lock:
+            tokens = self._tokens + n
+            self._tokens = tokens if tokens < self.burst else self.burst
 
-    def rate_limit_allow(self, logger: logging.Logger) -> bool:
-        now = time.time()
-        while self.ticks and now - self.ticks[0] > RATE_LIMIT_WINDOW_SEC:
-            self.ticks.popleft()
-        if len(self.ticks) >= CLIENT_RPM_LIMIT:
-            logger.warning("rate_limit hit rpm=%d queue_len=%d", CLIENT_RPM_LIMIT, len(self.ticks))
-            return False
-        self.ticks.append(now)
-        return True
+    def reset(self) -> None:
+        with self._lock:
+            self._tokens = self.burst
+            self._stamp = None
+
+
+@dataclass(slots=True, frozen=True)
+class BucketSpec:
+    burst: int
+    rate: float  # токенов в секунду
+
+
+DEFAULT_BUCKET = BucketSpec(burst=CLIENT_RPM_LIMIT, rate=CLIENT_RPM_LIMIT / RATE_LIMIT_WINDOW_SEC)
+
+
+def parse_rate_limits(spec: str | None) -> dict[str, BucketSpec]:
+    """`"isgd=10:0.5;tinyurl=30:1"` (burst:tokens-per-second) -> {provider: BucketSpec}."""
+    out: dict[str, BucketSpec] = {}
+    for raw in (spec or "").split(";"):
+        entry = raw.strip()
+        if not entry:
+            continue
+        name, _, value = entry.partition("=")
+        burst, sep, rate = value.partition(":")
+        try:
+            if not name.strip() or not sep:
+                raise ValueError
+            out[name.strip()] = BucketSpec(int(burst), float(rate))
+        except ValueError:
+            raise ValueError(f"bad rate limit {entry!r}: expected provider=BURST:PER_SECOND") from None
+    return out
+
+
+class Limiter(Protocol):
+    """Rate-limiting strategy of a `ProtectionEngine`."""
+
+    def allow(self, provider: str = ANY_PROVIDER, n: float = 1.0, *, now: float | None = None) -> bool: ...
+
+    def peek(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> float: ...
+
+    def retry_after(self, provider: str = ANY_PROVIDER, n: float = 1.0, *, now: float | None = None) -> float: ...
+
+    def refund(self, provider: str = ANY_PROVIDER, n: float = 1.0) -> None: ...
+
+    def reset(self) -> None: ...
+
+
+class Breaker(Protocol):
+    """Circuit-breaking strategy of a `ProtectionEngine`."""
+
+    def blocked(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool: ...
+
+    def try_acquire(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool: ...
+
+    def release(self, provider: str = ANY_PROVIDER) -> None: ...
+
+    def cooldown_left(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> float: ...
+
+    def record_failure(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None: ...
+
+    def record_success(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None: ...
+
+    def reset(self) -> None: ...
+
+
+class RateLimiter:
+    """One token bucket per provider, plus the shared `ANY_PROVIDER` bucket.
+
+    Providers without a spec are not limited individually (`allow` is always
+    True, `peek` is inf). Bucket lookup is a plain dict read; buckets are
+    created once, under a lock.
+    """
+
+    def __init__(
+        self,
+        specs: Mapping[str, BucketSpec] | None = None,
+        *,
+        default: BucketSpec | None = DEFAULT_BUCKET,
+        clock: Callable[[], float] | None = None,
+    ) -> None:
+        self._specs = dict(specs or {})
+        if default is not None:
+            self._specs.setdefault(ANY_PROVIDER, default)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def configure(self, provider: str, spec: BucketSpec) -> None:
+        with self._lock:
+            self._specs[provider] = spec
+            self._buckets.pop(provider, None)
+
+    def bucket(self, provider: str = ANY_PROVIDER) -> TokenBucket | None:
+        bucket = self._buckets.get(provider)
+        if bucket is None and provider in self._specs:
+            with self._lock:
+                bucket = self._buckets.get(provider)
+                spec = self._specs.get(provider)
+                if bucket is None and spec is not None:
+                    bucket = self._buckets[provider] = TokenBucket(spec.burst, spec.rate, clock=self._clock)
+        return bucket
+
+    def allow(self, provider: str = ANY_PROVIDER, n: float = 1.0, *, now: float | None = None) -> bool:
+        bucket = self._buckets.get(provider) or self.bucket(provider)
+        return bucket is None or bucket.try_acquire(n, now=now)
+
+    def peek(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> float:
+        bucket = self.bucket(provider)
+        return math.inf if bucket is None else bucket.peek(now=now)
+
+    def retry_after(self, provider: str = ANY_PROVIDER, n: float = 1.0, *, now: float | None = None) -> float:
+        bucket = self.bucket(provider)
+        return 0.0 if bucket is None else bucket.retry_after(n, now=now)
+
+    def refund(self, provider: str = ANY_PROVIDER, n: float = 1.0) -> None:
+        bucket = self._buckets.get(provider)
+        if bucket is not None:
+            bucket.refund(n)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpen(ProviderUnavailable, LocalRefusal):
+    """The provider's circuit is open (or its half-open probe slots are taken); `retry_after` is the cooldown left."""
+
+
+class LocalRateLimited(RateLimited, LocalRefusal):
+    """The provider's local token bucket is empty; `retry_after` is when the next token arrives."""
+
+
+@dataclass(slots=True, frozen=True)
+class BreakerEvent:
+    provider: str
+    old: CircuitState
+    new: CircuitState
+    at: float
+    cooldown: float  # с каким кулдауном открылись (0 для прочих переходов)
+
+
+@dataclass(slots=True)
+class BreakerStats:
+    state: CircuitState = CircuitState.CLOSED
+    failures: int = 0  # подряд, в закрытом состоянии
+    trips: int = 0  # всего открытий
+    consecutive_trips: int = 0  # открытий без закрытия между ними — от них растёт кулдаун
+    cooldown: float = 0.0
+    open_until: float = 0.0
+    probes: int = 0  # пробных вызовов сейчас в полёте
+    rejected: int = 0  # отказов try_acquire
+
+
+class _Circuit:
+    __slots__ = ("stats", "probes")
+
+    def __init__(self) -> None:
+        self.stats = BreakerStats()
+        self.probes: list[float] = []  # моменты выдачи пробных слотов (с арендой)
+
+
+class CircuitBreaker:
+    """Per-provider closed → open → half-open breaker with exponential cooldown.
+
+    `threshold` consecutive failures open a provider's circuit for
+    `cooldown × multiplier^(trips-1)` seconds (capped by `max_cooldown`);
+    `trips` counts openings since the circuit was last closed. After the
+    cooldown the circuit is half-open: `try_acquire` admits at most `probes`
+    calls at a time (a slot not reported back within `probe_timeout` is
+    reclaimed). A probe success closes the circuit, a probe failure reopens it
+    with the next, longer cooldown. `blocked()` is the non-consuming view.
+
+    Every transition is passed to the `subscribe`d listeners (outside the
+    lock) and logged; `stats()`/`snapshot()` expose counters per provider.
+    Providers never share state, so one outage does not block the others.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        threshold: int = CIRCUIT_FAIL_THRESHOLD,
+        cooldown: float = CIRCUIT_COOLDOWN_SEC,
+        *,
+        max_cooldown: float = CIRCUIT_MAX_COOLDOWN_SEC,
+        multiplier: float = 2.0,
+        probes: int = 1,
+        probe_timeout: float = CIRCUIT_PROBE_TIMEOUT_SEC,
+        clock: Callable[[], float] | None = None,
+    ) -> None:
+        if threshold < 1 or probes < 1:
+            raise ValueError("threshold and probes must be >= 1")
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self.multiplier = multiplier
+        self.probes = probes
+        self.probe_timeout = probe_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._circuits: dict[str, _Circuit] = {}
+        self._listeners: list[Callable[[BreakerEvent], None]] = []
 
+    def _now(self, now: float | None) -> float:
+        if now is not None:
+            return now
+        return self._clock() if self._clock is not None else time.monotonic()
 
-def _now_default() -> float:
-    return time.time()
+    def subscribe(self, listener: Callable[[BreakerEvent], None]) -> None:
+        self._listeners.append(listener)
 
+    def _emit(self, events: list[BreakerEvent]) -> None:
+        for ev in events:
+            level = logging.WARNING if ev.new is CircuitState.OPEN else logging.INFO
+            log.log(
+                level,
+                "circuit_transition provider=%s from=%s to=%s cooldown=%.0fs",
+                ev.provider,
+                ev.old,
+                ev.new,
+                ev.cooldown,
+            )
+            for listener in self._listeners:
+                try:
+                    listener(ev)
+                except Exception:  # слушатель не должен ломать решение
+                    log.exception("circuit listener failed provider=%s", ev.provider)
 
-def circuit_blocked(*, now_fn: Callable[[], float] = _now_default) -> bool:
-    now = now_fn()
-    return now < _state["cb_open_until"]
+    # --- переходы (под self._lock) ---
 
+    def _move(self, provider: str, c: _Circuit, new: CircuitState, now: float, events: list[BreakerEvent]) -> None:
+        st = c.stats
+        old, st.state = st.state, new
+        c.probes.clear()
+        cooldown = 0.0
+        if new is CircuitState.OPEN:
+            st.trips += 1
+            st.consecutive_trips += 1
+            cooldown = min(self.max_cooldown, self.cooldown * self.multiplier ** (st.consecutive_trips - 1))
+            st.cooldown, st.open_until = cooldown, now + cooldown
+        elif new is CircuitState.CLOSED:
+            st.consecutive_trips = 0
+            st.cooldown = st.open_until = 0.0
+        st.failures = 0
+        events.append(BreakerEvent(provider, old, new, now, cooldown))
 
-def cooldown_left(*, now_fn: Callable[[], float] = _now_default) -> int:
-    now = now_fn()
-    left = int(round(_state["cb_open_until"] - now))
-    return max(0, left)
+    def _current(self, provider: str, now: float, events: list[BreakerEvent]) -> _Circuit | None:
+        c = self._circuits.get(provider)
+        if c is None:
+            return None
+        st = c.stats
+        if st.state is CircuitState.OPEN and now >= st.open_until:
+            self._move(provider, c, CircuitState.HALF_OPEN, now, events)
+        elif st.state is CircuitState.HALF_OPEN and c.probes:
+            lease = now - self.probe_timeout
+            c.probes[:] = [t for t in c.probes if t > lease]  # пропавшие пробы не держат слот вечно
+        st.probes = len(c.probes)
+        return c
 
+    # --- Breaker ---
 
-def record_failure(*, now_fn: Callable[[], float] = _now_default) -> None:
-    now = now_fn()
-    # Если уже открыт — просто обновим таймер (не обязательно, но удобно)
-    if now < _state["cb_open_until"]:
-        return
-    _state["fail_count"] += 1
-    if _state["fail_count"] >= CB_FAIL_THRESHOLD:
-        _state["cb_open_until"] = now + CB_COOLDOWN_SEC
-        _state["fail_count"] = 0  # сбросим, чтобы после окна считать заново
+    def blocked(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool:
+        if provider not in self._circuits:
+            return False  # быстрый путь: по провайдеру ещё не было ни одной ошибки
+        now = self._now(now)
+        events: list[BreakerEvent] = []
+        with self._lock:
+            c = self._current(provider, now, events)
+            state = c.stats.state if c is not None else CircuitState.CLOSED
+            blocked = state is CircuitState.OPEN or (state is CircuitState.HALF_OPEN and len(c.probes) >= self.probes)
+        self._emit(events)
+        return blocked
+
+    def try_acquire(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool:
+        """Admit one call: always when closed, never when open, up to `probes` at a time when half-open."""
+        if provider not in self._circuits:
+            return True
+        now = self._now(now)
+        events: list[BreakerEvent] = []
+        with self._lock:
+            c = self._current(provider, now, events)
+            state = c.stats.state if c is not None else CircuitState.CLOSED
+            if state is CircuitState.CLOSED:
+                ok = True
+            elif state is CircuitState.HALF_OPEN and len(c.probes) < self.probes:
+                c.probes.append(now)
+                c.stats.probes = len(c.probes)
+                ok = True
+            else:
+                c.stats.rejected += 1
+                ok = False
+        self._emit(events)
+        return ok
+
+    def release(self, provider: str = ANY_PROVIDER) -> None:
+        """Give back a probe slot taken by `try_acquire` for a call that never reported an outcome."""
+        with self._lock:
+            c = self._circuits.get(provider)
+            if c is not None and c.stats.state is CircuitState.HALF_OPEN and c.probes:
+                c.probes.pop(0)
+                c.stats.probes = len(c.probes)
+
+    def cooldown_left(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> float:
+        c = self._circuits.get(provider)
+        if c is None or c.stats.state is not CircuitState.OPEN:
+            return 0.0
+        return max(0.0, c.stats.open_until - self._now(now))
+
+    def record_failure(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None:
+        now = self._now(now)
+        events: list[BreakerEvent] = []
+        with self._lock:
+            c = self._current(provider, now, events)
+            if c is None:
+                c = self._circuits[provider] = _Circuit()
+            st = c.stats
+            if st.state is CircuitState.HALF_OPEN:
+                self._move(provider, c, CircuitState.OPEN, now, events)  # проба не прошла — кулдаун длиннее
+            elif st.state is CircuitState.CLOSED:
+                st.failures += 1
+                if st.failures >= self.threshold:
+                    self._move(provider, c, CircuitState.OPEN, now, events)
+            # OPEN: ошибки «в закрытую дверь» (начатые до открытия) не копим
+        self._emit(events)
+
+    def record_success(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None:
+        if provider not in self._circuits:
+            return
+        now = self._now(now)
+        events: list[BreakerEvent] = []
+        with self._lock:
+            c = self._current(provider, now, events)
+            st = c.stats if c is not None else BreakerStats()
+            if st.state is CircuitState.HALF_OPEN:
+                self._move(provider, c, CircuitState.CLOSED, now, events)
+            elif st.state is CircuitState.CLOSED:
+                st.failures = 0
+            # OPEN: поздний успех вызова, начатого до открытия, кулдаун не отменяет
+        self._emit(events)
+
+    def state(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> CircuitState:
+        return self.stats(provider, now=now).state
+
+    def stats(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> BreakerStats:
+        return self.snapshot(now=now).get(provider, BreakerStats())
+
+    def snapshot(self, *, now: float | None = None) -> dict[str, BreakerStats]:
+        """Copy of every provider's counters (open circuits whose cooldown is over show as half-open)."""
+        now = self._now(now)
+        events: list[BreakerEvent] = []
+        with self._lock:
+            out = {}
+            for provider in list(self._circuits):
+                st = self._current(provider, now, events).stats
+                out[provider] = dataclasses.replace(st)
+        self._emit(events)
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._circuits.clear()
+
+
+class ProtectionEngine:
+    """Local rate limit + circuit breaker with pluggable strategies; safe to share between threads."""
+
+    def __init__(self, limiter: Limiter | None = None, breaker: Breaker | None = None) -> None:
+        self.limiter = limiter or RateLimiter(parse_rate_limits(os.getenv(RATE_LIMITS_ENV)))
+        self.breaker = breaker or CircuitBreaker()
+
+    # --- circuit breaker ---
+
+    def circuit_blocked(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool:
+        return self.breaker.blocked(provider, now=now)
+
+    def circuit_acquire(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool:
+        """Admit one call through the breaker (takes a probe slot when half-open)."""
+        return self.breaker.try_acquire(provider, now=now)
+
+    def circuit_release(self, provider: str = ANY_PROVIDER) -> None:
+        """Return a probe slot from `circuit_acquire` when the call was not made (or its outcome is unknown)."""
+        self.breaker.release(provider)
+
+    def cooldown_left(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> int:
+        """Whole seconds until the circuit closes (rounded up)."""
+        return math.ceil(self.breaker.cooldown_left(provider, now=now))
+
+    def record_failure(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None:
+        self.breaker.record_failure(provider, now=now)
+
+    def record_success(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None:
+        self.breaker.record_success(provider, now=now)
+
+    # --- rate limit ---
+
+    def rate_limit_allow(self, logger: logging.Logger, provider: str = ANY_PROVIDER) -> bool:
+        if self.limiter.allow(provider):
+            return True
+        # без retry_after в сообщении: отказ — частый путь, лишний peek ему ни к чему
+        logger.warning("rate_limit hit provider=%s", provider)
+        return False
+
+    def rate_limit_peek(self, provider: str = ANY_PROVIDER) -> float:
+        """Tokens left in the bucket (for UI hints); does not consume one."""
+        return self.limiter.peek(provider)
+
+    def rate_limit_retry_after(self, provider: str = ANY_PROVIDER) -> float:
+        return self.limiter.retry_after(provider)
+
+    def reset(self) -> None:
+        self.limiter.reset()
+        self.breaker.reset()
+
+
+AppState = ProtectionEngine  # историческое имя: AppState() — отдельный, ни с кем не разделённый движок
+
+
+# --- Process-wide engine ---
+
+_engine: ProtectionEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_protection_engine() -> ProtectionEngine:
+    global _engine  # noqa: PLW0603
+    with _engine_lock:
+        if _engine is None:
+            _engine = _default_engine()
+        return _engine
+
+
+def _default_engine() -> ProtectionEngine:
+    shared = os.getenv(SHARED_STATE_ENV, "").strip()
+    if not shared or shared == "0":
+        return ProtectionEngine()
+    # модуль сам импортирует protection — берём его здесь, а не наверху
+    from urlcutter.shared_protection import shared_engine  # noqa: PLC0415
+
+    return shared_engine(None if shared == "1" else shared)
+
+
+def set_protection_engine(engine: ProtectionEngine) -> ProtectionEngine:
+    """Install `engine` as the process-wide one (at start-up); returns it."""
+    global _engine  # noqa: PLW0603
+    with _engine_lock:
+        _engine = engine
+        return engine
+
+
+# Тестовые служебные функции (экспортируем для фикстур)
+def _get_state() -> ProtectionEngine:
+    return get_protection_engine()
+
+
+def _reset_state() -> None:
+    get_protection_engine().reset()
+
+
+# --- Модульные функции: тонкая обёртка над общим движком ---
+
+
+def _now_of(now_fn: Callable[[], float] | None) -> float | None:
+    return now_fn() if now_fn is not None else None
+
+
+def circuit_blocked(*, now_fn: Callable[[], float] | None = None) -> bool:
+    return get_protection_engine().circuit_blocked(now=_now_of(now_fn))
+
+
+def cooldown_left(*, now_fn: Callable[[], float] | None = None) -> int:
+    return get_protection_engine().cooldown_left(now=_now_of(now_fn))
+
+
+def record_failure(*, now_fn: Callable[[], float] | None = None) -> None:
+    get_protection_engine().record_failure(now=_now_of(now_fn))
 
 
 def record_success() -> None:
-    # Любой успешный вызов сбрасывает счётчик ошибок
-    _state["fail_count"] = 0
+    # Любой успешный вызов сбрасывает счётчик ошибок и закрывает предохранитель
+    get_protection_engine().record_success()
 
 
-def rate_limit_allow(*, now_fn: Callable[[], float] = _now_default) -> bool:
+def rate_limit_allow(*, now_fn: Callable[[], float] | None = None) -> bool:
     """
-    Скользящее окно 60 сек: очищаем старые метки и решаем, можно ли ещё.
+    Ведро токенов общего движка: до CLIENT_RPM_LIMIT подряд, дальше по одному в секунду.
     """
-    now = now_fn()
-    # Очищаем старые записи старше 60с
-    window_start = now - float(RATE_LIMIT_WINDOW_SEC)
-    ticks = _state["ticks"]
-    while ticks and ticks[0] <= window_start:
-        ticks.popleft()
-    if len(ticks) < CLIENT_RPM_LIMIT:
-        ticks.append(now)
-        return True
-    return False
+    return get_protection_engine().limiter.allow(now=_now_of(now_fn))
 
 
-def internet_ok(logger: logging.Logger, *, AppState_cls=AppState) -> bool:
-    st = AppState_cls()
+def internet_ok(
+    logger: logging.Logger,
+    *,
+    engine: ProtectionEngine | None = None,
+    monitor: ConnectivityMonitor | None = None,
+    check_circuit: bool = True,
+    AppState_cls: type | None = None,
+) -> bool:
+    """May we go to the network now? Never blocks and consumes no tokens.
 
-    if st.circuit_blocked():
+    Reads the shared engine (or `engine`) for an open circuit and the
+    connectivity monitor (or `monitor`) for its cached up/down verdict; the
+    probe itself runs on the monitor's background thread. The rate-limit
+    token is charged by the caller that makes the call (`Handlers`, the bulk
+    CLI). A caller that already holds a `circuit_acquire` admission passes
+    `check_circuit=False`: in the half-open state its own probe slot would
+    make the circuit look blocked. `AppState_cls` is the old test hook: a fresh instance of it is
+    built and its `rate_limit_allow` is consulted.
+    """
+    if AppState_cls is not None:
+        st = AppState_cls()
+        if st.circuit_blocked():
+            logger.warning("circuit open: skip network")
+            return False
+        if not st.rate_limit_allow(logger):
+            logger.warning("rate limit exceeded")
+            return False
+        return True
+
+    if check_circuit and (engine or get_protection_engine()).circuit_blocked():
         logger.warning("circuit open: skip network")
         return False
-
-    if not st.rate_limit_allow(logger):
-        logger.warning("rate limit exceeded")
+    if not (monitor or get_connectivity_monitor()).is_online():
+        logger.warning("offline: skip network")
         return False
-
     return True
@@ -0,0 +1,197 @@
+"""Long-lived bounded executor for blocking provider calls.
+
+Unlike a per-call `ThreadPoolExecutor` used as a context manager, a timed-out
+call here is *abandoned*: the caller gets `TimeoutError` immediately and the
+worker thread (a daemon) finishes — or hangs — on its own. Abandoned calls are
+counted as orphans; once `max_orphans` of them are still running, new submits
+are refused instead of piling up more stuck threads.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import queue
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutTimeout
+from dataclasses import dataclass
+from typing import Any
+
+__all__ = ["ExecutorGauges", "ProviderExecutor", "get_executor"]
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_ORPHANS = 8
+IDLE_EXIT_SEC = 30.0  # простаивающий воркер сам завершается
+
+_STOP = object()
+
+
+@dataclass(slots=True, frozen=True)
+class ExecutorGauges:
+    active: int  # вызовы, которые сейчас выполняются (включая брошенные)
+    queued: int  # ждут свободного воркера
+    orphaned: int  # брошены по таймауту, но ещё не вернулись
+    workers: int  # живые потоки
+    abandoned_total: int
+    rejected_total: int
+
+
+class ProviderExecutor:
+    """Daemon-thread pool that never joins timed-out work."""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_orphans: int = DEFAULT_MAX_ORPHANS,
+        *,
+        name: str = "urlcutter-provider",
+        idle_timeout: float = IDLE_EXIT_SEC,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        if max_orphans < 0:
+            raise ValueError("max_orphans must be >= 0")
+        self.max_workers = max_workers
+        self.max_orphans = max_orphans
+        self.name = name
+        self.idle_timeout = idle_timeout
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._threads = 0
+        self._idle = 0
+        self._active = 0
+        self._queued = 0
+        self._orphans: set[Future] = set()
+        self._abandoned_total = 0
+        self._rejected_total = 0
+        self._seq = 0
+        self._shutdown = False
+
+    # ---------- public API ----------
+
+    def submit(self, fn: Callable[..., Any], /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("provider executor is shut down")
+            if self._orphans and len(self._orphans) >= self.max_orphans:
+                self._rejected_total += 1
+                raise RuntimeError(f"too many abandoned provider calls in flight ({len(self._orphans)})")
+            fut: Future = Future()
+            self._queued += 1
+            self._queue.put((fut, fn, args, kwargs))
+            # брошенные потоки заняты навсегда — разрешаем столько же замен
+            if self._idle < self._queued and self._threads < self.max_workers + len(self._orphans):
+                self._spawn()
+        return fut
+
+    def call(self, fn: Callable[..., Any], /, *args, timeout: float | None = None, **kwargs) -> Any:
+        """Run `fn` on a worker and wait at most `timeout` seconds for it."""
+        fut = self.submit(fn, *args, **kwargs)
+        try:
+            return fut.result(timeout=timeout)
+        except FutTimeout:
+            if self.abandon(fut):
+                raise
+            # успел завершиться между таймаутом и abandon — отдаём результат
+            return fut.result()
+
+    def gauges(self) -> ExecutorGauges:
+        with self._lock:
+            return ExecutorGauges(
+                active=self._active,
+                queued=self._queued,
+                orphaned=len(self._orphans),
+                workers=self._threads,
+                abandoned_total=self._abandoned_total,
+                rejected_total=self._rejected_total,
+            )
+
+    def shutdown(self) -> None:
+        """Stop idle workers; running (and orphaned) calls are left alone."""
+        with self._lock:
+            self._shutdown = True
+            threads = self._threads
+        for _ in range(threads):
+            self._queue.put(_STOP)
+
+    def abandon(self, fut: Future) -> bool:
+        """Give up on `fut`: cancel it if still queued, otherwise count it as orphaned.
+
+        Returns False when the future had already finished (nothing to abandon).
+        """
+        with self._lock:
+            if fut.done():
+                return False
+            if fut.cancel():
+                # ещё не стартовал — просто выкинули из очереди
+                self._abandoned_total += 1
+                return True
+            self._orphans.add(fut)
+            self._abandoned_total += 1
+            return True
+
+    # ---------- internals ----------
+
+    def _spawn(self) -> None:
+        self._threads += 1
+        self._seq += 1
+        t = threading.Thread(target=self._worker, name=f"{self.name}-{self._seq}", daemon=True)
+        t.start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                self._idle += 1
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                item = None
+            with self._lock:
+                if item is None:
+                    # submit мог положить задачу уже после таймаута get, посчитав нас простаивающими:
+                    # под замком (его держит и submit) перепроверяем очередь, иначе задача зависнет
+                    with contextlib.suppress(queue.Empty):
+                        item = self._queue.get_nowait()
+                self._idle -= 1
+                if item is None or item is _STOP:
+                    self._threads -= 1
+                    return
+                self._queued -= 1
+
+            fut, fn, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._active += 1
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:  # noqa: BLE001
+                fut.set_exception(e)
+            else:
+                fut.set_result(result)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._orphans.discard(fut)
+                # не держим ссылки на результат/исключение в кадре цикла
+                del fut, fn, args, kwargs, item
+
+
+# --- Process-wide instance ---
+
+_executor: ProviderExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProviderExecutor:
+    """Return the shared provider executor, creating it on first use."""
+    global _executor  # noqa: PLW0603
+    ex = _executor
+    if ex is not None:
+        return ex
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProviderExecutor()
+        return _executor
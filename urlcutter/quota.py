@@ -0,0 +1,302 @@
+"""Persistent per-provider call quotas (hourly and daily, UTC) in the history DB.
+
+Free shorteners cap how many links a client may create per hour or day;
+`CLIENT_RPM_LIMIT` only sees the last minute of this process. The ledger
+keeps a `provider_usage` row per (provider, period, bucket) — e.g.
+`("tinyurl", "day", "2026-10-18")` — so counts survive restarts and are
+shared by every process using the same DB.
+
+`try_acquire` is the admission check: one conditional upsert per period,
+`INSERT … ON CONFLICT DO UPDATE SET calls = calls + n WHERE calls + n <= cap`,
+both in one transaction. SQLite applies each statement atomically, so two
+processes can never push a bucket over its cap; if any period refuses
+(rowcount 0) the transaction is rolled back and nothing is counted. A
+refused provider raises/reports `QuotaExhausted` (a `RateLimited` whose
+`retry_after` is the time until the bucket rolls over), which the failover
+chain treats as "skip to the next provider". If the ledger itself fails
+(DB locked, missing table, ...), the quota is unknown: the call is admitted
+uncounted and a warning is logged, so bookkeeping never breaks shortening.
+
+Caps come from `URLCUTTER_QUOTAS`, e.g. `tinyurl=500/h,5000/d;isgd=200/h`.
+Providers without a cap are still counted, so `status()` always shows usage.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from urlcutter.db import engine as db_engine
+from urlcutter.db.models import ProviderUsage
+from urlcutter.retry import LocalRefusal, RateLimited
+
+__all__ = [
+    "QuotaExhausted",
+    "QuotaLedger",
+    "QuotaLimits",
+    "QuotaStatus",
+    "get_quota_ledger",
+    "parse_quota_spec",
+]
+
+QUOTAS_ENV = "URLCUTTER_QUOTAS"
+HOUR, DAY = "hour", "day"
+_UNITS = {"h": HOUR, "d": DAY}
+_ADJECTIVE = {HOUR: "hourly", DAY: "daily"}
+DEFAULT_KEEP_DAYS = 7
+
+log = logging.getLogger("urlcutter.quota")
+
+SessionFactory = Callable[[], AbstractContextManager[Session]]
+
+
+class QuotaExhausted(RateLimited, LocalRefusal):
+    """The provider's hourly or daily budget is spent; `retry_after` is seconds until it resets."""
+
+    def __init__(self, provider: str, period: str, retry_after: float) -> None:
+        super().__init__(f"{provider}: {_ADJECTIVE[period]} quota exhausted", retry_after=retry_after)
+        self.provider = provider
+        self.period = period
+
+
+@dataclass(slots=True, frozen=True)
+class QuotaLimits:
+    per_hour: int | None = None
+    per_day: int | None = None
+
+    def cap(self, period: str) -> int | None:
+        return self.per_hour if period == HOUR else self.per_day
+
+
+def parse_quota_spec(spec: str | None) -> dict[str, QuotaLimits]:
+    """`"tinyurl=500/h,5000/d;isgd=200/h"` -> {name: QuotaLimits}; empty/None -> {}."""
+    out: dict[str, QuotaLimits] = {}
+    for raw in (spec or "").split(";"):
+        entry = raw.strip()
+        if not entry:
+            continue
+        name, sep, caps = entry.partition("=")
+        name = name.strip()
+        if not sep or not name:
+            raise ValueError(f"bad quota entry {entry!r}: expected provider=N/h,M/d")
+        values: dict[str, int] = {}
+        for part in caps.split(","):
+            count, slash, unit = part.strip().partition("/")
+            period = _UNITS.get(unit.strip().lower())
+            if not slash or period is None or not count.strip().isdigit():
+                raise ValueError(f"bad quota {part.strip()!r} for {name}: expected N/h or N/d")
+            values[period] = int(count)
+        out[name] = QuotaLimits(per_hour=values.get(HOUR), per_day=values.get(DAY))
+    return out
+
+
+@dataclass(slots=True)
+class QuotaStatus:
+    provider: str
+    hour_used: int
+    hour_limit: int | None
+    hour_reset_in: float
+    day_used: int
+    day_limit: int | None
+    day_reset_in: float
+
+    @property
+    def remaining(self) -> int | None:
+        """Calls still allowed right now (the tighter period wins); None = no cap."""
+        left = [
+            cap - used
+            for cap, used in ((self.hour_limit, self.hour_used), (self.day_limit, self.day_used))
+            if cap is not None
+        ]
+        return max(0, min(left)) if left else None
+
+    @property
+    def reset_in(self) -> float:
+        """Seconds until the budget grows again: the day's rollover if it is spent, else the hour's."""
+        if self.day_limit is not None and self.day_used >= self.day_limit:
+            return self.day_reset_in
+        return self.hour_reset_in
+
+    @property
+    def sustainable_rate(self) -> float | None:
+        """Calls/second that spend the budget no faster than it resets; None = no cap."""
+        rates = []
+        for cap, used, reset_in in (
+            (self.hour_limit, self.hour_used, self.hour_reset_in),
+            (self.day_limit, self.day_used, self.day_reset_in),
+        ):
+            if cap is not None:
+                rates.append(max(0, cap - used) / max(reset_in, 1.0))
+        return min(rates) if rates else None
+
+
+def _buckets(now: float) -> tuple[dict[str, str], dict[str, float]]:
+    """Bucket keys for `now` and seconds until each rolls over."""
+    dt = datetime.fromtimestamp(now, UTC)
+    hour_start = dt.replace(minute=0, second=0, microsecond=0)
+    day_start = hour_start.replace(hour=0)
+    keys = {HOUR: hour_start.strftime("%Y-%m-%dT%H"), DAY: day_start.strftime("%Y-%m-%d")}
+    reset = {
+        HOUR: (hour_start + timedelta(hours=1) - dt).total_seconds(),
+        DAY: (day_start + timedelta(days=1) - dt).total_seconds(),
+    }
+    return keys, reset
+
+
+class QuotaLedger:
+    """DB-backed hourly/daily call counters with cap-enforcing admission."""
+
+    def __init__(
+        self,
+        limits: dict[str, QuotaLimits] | None = None,
+        *,
+        session_factory: SessionFactory | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.limits = dict(limits or {})
+        self._session_factory = session_factory
+        self._clock = clock
+
+    def _session(self) -> AbstractContextManager[Session]:
+        return (self._session_factory or db_engine.get_session)()
+
+    def limits_for(self, provider: str) -> QuotaLimits:
+        return self.limits.get(provider, QuotaLimits())
+
+    # --- write path ---
+
+    def try_acquire(self, provider: str, n: int = 1) -> bool:
+        """Count `n` calls if every period has room; otherwise count nothing and return False."""
+        return self._acquire(provider, n) is None
+
+    def acquire(self, provider: str, n: int = 1) -> None:
+        """Like `try_acquire`, but raises QuotaExhausted when the budget is spent."""
+        refused = self._acquire(provider, n)
+        if refused is not None:
+            raise refused
+
+    def record(self, provider: str, n: int = 1) -> None:
+        """Count calls made regardless of caps (e.g. ones the ledger did not admit)."""
+        keys, _ = _buckets(self._clock())
+        with self._session() as s:
+            for period, bucket in keys.items():
+                s.execute(self._upsert(provider, period, bucket, n, None))
+            s.commit()
+
+    def _acquire(self, provider: str, n: int) -> QuotaExhausted | None:
+        if n < 1:
+            raise ValueError("n must be >= 1")
+        limits = self.limits_for(provider)
+        keys, reset = _buckets(self._clock())
+        try:
+            with self._session() as s:
+                # сначала час (он чаще упирается), потом сутки — всё в одной транзакции
+                for period in (HOUR, DAY):
+                    cap = limits.cap(period)
+                    if cap is not None and n > cap:
+                        s.rollback()
+                        return QuotaExhausted(provider, period, reset[period])
+                    result = s.execute(self._upsert(provider, period, keys[period], n, cap))
+                    if result.rowcount == 0:
+                        s.rollback()  # откатываем и уже засчитанный период
+                        return QuotaExhausted(provider, period, reset[period])
+                s.commit()
+        except SQLAlchemyError as e:
+            # учёт недоступен — квота неизвестна: пропускаем вызов, а не роняем всю цепочку
+            log.warning("quota_unknown provider=%s err=%s", provider, e)
+        return None
+
+    @staticmethod
+    def _upsert(provider: str, period: str, bucket: str, n: int, cap: int | None):
+        ins = sqlite_insert(ProviderUsage).values(provider=provider, period=period, bucket=bucket, calls=n)
+        where = None if cap is None else (ProviderUsage.calls + n <= cap)
+        return ins.on_conflict_do_update(
+            index_elements=["provider", "period", "bucket"],
+            set_={"calls": ProviderUsage.calls + ins.excluded.calls},
+            where=where,
+        )
+
+    def prune(self, keep_days: int = DEFAULT_KEEP_DAYS) -> int:
+        """Drop buckets older than `keep_days`; returns how many rows were deleted."""
+        cutoff = datetime.fromtimestamp(self._clock(), UTC) - timedelta(days=keep_days)
+        with self._session() as s:
+            # ключи бакетов — ISO-строки, поэтому сравниваются лексикографически
+            result = s.execute(delete(ProviderUsage).where(ProviderUsage.bucket < cutoff.strftime("%Y-%m-%d")))
+            s.commit()
+        return result.rowcount
+
+    # --- read path ---
+
+    def status(self, provider: str) -> QuotaStatus:
+        return self.status_many([provider])[0]
+
+    def status_many(self, providers: Iterable[str]) -> list[QuotaStatus]:
+        """Current usage and caps per provider, in input order."""
+        names = list(dict.fromkeys(providers))
+        keys, reset = _buckets(self._clock())
+        used: dict[tuple[str, str], int] = {}
+        if names:
+            with self._session() as s:
+                stmt = select(ProviderUsage.provider, ProviderUsage.period, ProviderUsage.calls).where(
+                    ProviderUsage.provider.in_(names),
+                    ((ProviderUsage.period == HOUR) & (ProviderUsage.bucket == keys[HOUR]))
+                    | ((ProviderUsage.period == DAY) & (ProviderUsage.bucket == keys[DAY])),
+                )
+                for provider, period, calls in s.execute(stmt):
+                    used[(provider, period)] = calls
+        out = []
+        for name in names:
+            limits = self.limits_for(name)
+            out.append(
+                QuotaStatus(
+                    provider=name,
+                    hour_used=used.get((name, HOUR), 0),
+                    hour_limit=limits.per_hour,
+                    hour_reset_in=reset[HOUR],
+                    day_used=used.get((name, DAY), 0),
+                    day_limit=limits.per_day,
+                    day_reset_in=reset[DAY],
+                )
+            )
+        return out
+
+    def remaining(self, provider: str) -> int | None:
+        return self.status(provider).remaining
+
+    def pace(self, providers: Iterable[str]) -> float | None:
+        """Sustainable calls/second across `providers` (the failover chain shares the load).
+
+        None means at least one provider is uncapped, so quotas do not limit the pace.
+        """
+        total = 0.0
+        for st in self.status_many(providers):
+            rate = st.sustainable_rate
+            if rate is None:
+                return None
+            total += rate
+        return total
+
+
+# --- Process-wide instance ---
+
+_ledger: QuotaLedger | None = None
+_ledger_lock = threading.Lock()
+
+
+def get_quota_ledger() -> QuotaLedger:
+    global _ledger  # noqa: PLW0603
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = QuotaLedger(parse_quota_spec(os.getenv(QUOTAS_ENV)))
+        return _ledger
@@ -0,0 +1,265 @@
+"""Asyncio redirect server for locally issued short codes (stdlib HTTP, no framework).
+
+`GET /<code>` (and `HEAD`) answers 302 — or 301 if configured — with
+`Location: <long_url>` (non-ASCII percent-encoded as UTF-8). Codes are resolved
+by `LinkResolver`: a hot in-memory LRU first, then the optional mmap snapshot
+(`urlcutter.link_snapshot`), then one indexed equality lookup on
+`links.short_url` (`ix_links_short_like`) — never a scan. Misses are remembered
+for `negative_ttl` seconds only, so a code issued right after a lookup (say, by
+another process) starts resolving soon after. DB misses run in a worker thread
+so the event loop keeps serving cached codes meanwhile. Connections are
+HTTP/1.1 keep-alive. With a `ClickCounter`, every redirect is counted in memory
+and written to `links.click_count` in batches; the visitor id handed to it is a
+client address + User-Agent pair (only its hash ends up in a sketch).
+
+    python -m urlcutter serve --port 8765 --base-url http://localhost:8765
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from http import HTTPStatus
+from urllib.parse import quote
+
+from sqlalchemy import Engine, select
+
+from urlcutter.clicks import ClickCounter
+from urlcutter.db import engine as db_engine
+from urlcutter.db.models import Link
+from urlcutter.link_snapshot import SnapshotHolder
+from urlcutter.local_shortener import BASE62, LOCAL_BASE_URL
+
+__all__ = ["LinkResolver", "RedirectServer", "RedirectStats"]
+
+DEFAULT_LRU_SIZE = 100_000
+NEGATIVE_LRU_SIZE = 10_000  # помним и несуществующие коды — сканеры не бьют в БД повторно
+NEGATIVE_TTL_SEC = 5.0  # но недолго: код может быть выдан (другим процессом) сразу после промаха
+MAX_HEADER_BYTES = 8 * 1024
+IDLE_TIMEOUT = 30.0
+MAX_CODE_LEN = 32  # сгенерированные коды и алиасы (urlcutter.aliases)
+_CODE_CHARS = frozenset(BASE62 + "-_")
+_MISSING = object()
+_LOCATION_SAFE = ":/?#[]@!$&'()*+,;=%"  # зарезервированные символы URL и уже готовые %XX
+
+
+@dataclass(slots=True)
+class RedirectStats:
+    requests: int = 0
+    redirects: int = 0
+    not_found: int = 0
+    bad_requests: int = 0
+    lru_hits: int = 0
+    snapshot_hits: int = 0
+    db_lookups: int = 0
+
+
+class LinkResolver:
+    """code → long_url through an LRU in front of an indexed SQLite lookup."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        base_url: str | None = None,
+        *,
+        engine: Engine | None = None,
+        lru_size: int = DEFAULT_LRU_SIZE,
+        negative_size: int = NEGATIVE_LRU_SIZE,
+        negative_ttl: float = NEGATIVE_TTL_SEC,
+        snapshot: SnapshotHolder | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_url = (base_url or LOCAL_BASE_URL).rstrip("/")
+        self._engine = engine
+        self.snapshot = snapshot
+        self.lru_size = lru_size
+        self.negative_size = negative_size
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, str | None] = OrderedDict()
+        self._negative_until: dict[str, float] = {}  # код → до какого момента верим промаху
+        self.stats = RedirectStats()
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine or db_engine.engine
+
+    def cached(self, code: str) -> str | None | object:
+        """In-memory answer: long_url, None (known missing) or `_MISSING` (ask the DB)."""
+        with self._lock:
+            value = self._lru.get(code, _MISSING)
+            if value is None and self._clock() >= self._negative_until[code]:
+                self._drop(code)  # промах устарел — ссылку могли создать с тех пор
+                value = _MISSING
+            if value is not _MISSING:
+                self._lru.move_to_end(code)
+                self.stats.lru_hits += 1
+                return value
+        if self.snapshot is not None:
+            # снимок не кладём в LRU: он и так в памяти; промах — возможно, ссылка новее снимка
+            value = self.snapshot.get(f"{self.base_url}/{code}")
+            if value is not None:
+                self.stats.snapshot_hits += 1
+                return value
+        return _MISSING
+
+    def lookup(self, code: str) -> str | None:
+        """Blocking DB lookup (equality on the indexed short_url); fills the LRU."""
+        stmt = (
+            select(Link.long_url).where(Link.short_url == f"{self.base_url}/{code}").order_by(Link.id.desc()).limit(1)
+        )
+        with self.engine.connect() as conn:
+            long_url = conn.execute(stmt).scalar_one_or_none()
+        with self._lock:
+            self.stats.db_lookups += 1
+            self._remember(code, long_url)
+        return long_url
+
+    def _remember(self, code: str, long_url: str | None) -> None:
+        if long_url is None:
+            if code not in self._negative_until and len(self._negative_until) >= self.negative_size:
+                return
+            self._negative_until[code] = self._clock() + self.negative_ttl
+        else:
+            self._negative_until.pop(code, None)
+        self._lru[code] = long_url
+        self._lru.move_to_end(code)
+        while len(self._lru) > self.lru_size:
+            dropped, _ = self._lru.popitem(last=False)
+            self._negative_until.pop(dropped, None)
+
+    def _drop(self, code: str) -> None:
+        self._lru.pop(code, None)
+        self._negative_until.pop(code, None)
+
+    def resolve(self, code: str) -> str | None:
+        value = self.cached(code)
+        return self.lookup(code) if value is _MISSING else value
+
+    def forget(self, code: str) -> None:
+        with self._lock:
+            self._drop(code)
+
+
+def _valid_code(code: str) -> bool:
+    return 0 < len(code) <= MAX_CODE_LEN and all(ch in _CODE_CHARS for ch in code)
+
+
+class RedirectServer:
+    """Minimal keep-alive HTTP/1.1 server answering with redirects."""
+
+    def __init__(
+        self,
+        resolver: LinkResolver,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        status: int = HTTPStatus.FOUND,
+        clicks: ClickCounter | None = None,
+    ) -> None:
+        if status not in (HTTPStatus.MOVED_PERMANENTLY, HTTPStatus.FOUND):
+            raise ValueError("status must be 301 or 302")
+        self.resolver = resolver
+        self.clicks = clicks
+        self.host = host
+        self.port = port
+        self.status = HTTPStatus(status)
+        self._server: asyncio.base_events.Server | None = None
+
+    @property
+    def stats(self) -> RedirectStats:
+        return self.resolver.stats
+
+    async def start(self) -> RedirectServer:
+        self._server = await asyncio.start_server(self._serve_conn, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peername = writer.get_extra_info("peername")
+        peer = str(peername[0]) if peername else ""
+        try:
+            while True:
+                try:
+                    async with asyncio.timeout(IDLE_TIMEOUT):
+                        head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, TimeoutError, ConnectionError):
+                    return
+                if len(head) > MAX_HEADER_BYTES:
+                    return
+                keep_alive = await self._respond(head, writer, peer)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _respond(self, head: bytes, writer: asyncio.StreamWriter, peer: str = "") -> bool:
+        stats = self.resolver.stats
+        stats.requests += 1
+        lines = head.decode("iso-8859-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            stats.bad_requests += 1
+            self._write(writer, HTTPStatus.BAD_REQUEST, keep_alive=False)
+            return False
+        headers = {k.strip().lower(): v.strip() for k, _, v in (x.partition(":") for x in lines[1:] if x)}
+        conn_hdr = headers.get("connection", "").lower()
+        keep_alive = conn_hdr != "close" if version == "HTTP/1.1" else conn_hdr == "keep-alive"
+
+        if method not in ("GET", "HEAD"):
+            stats.bad_requests += 1
+            self._write(writer, HTTPStatus.METHOD_NOT_ALLOWED, keep_alive=keep_alive, extra={"Allow": "GET, HEAD"})
+            return keep_alive
+
+        code = target.split("?", 1)[0].lstrip("/")
+        long_url = None
+        if _valid_code(code):
+            long_url = self.resolver.cached(code)
+            if long_url is _MISSING:
+                # промах LRU: SQLite в отдельном потоке, цикл событий не блокируем
+                long_url = await asyncio.to_thread(self.resolver.lookup, code)
+        if long_url is None:
+            stats.not_found += 1
+            self._write(writer, HTTPStatus.NOT_FOUND, keep_alive=keep_alive)
+            return keep_alive
+
+        stats.redirects += 1
+        if self.clicks is not None and method == "GET":
+            visitor = f"{peer}|{headers.get('user-agent', '')}"
+            self.clicks.record(f"{self.resolver.base_url}/{code}", visitor)
+        # заголовок — latin-1: не-ASCII (и CR/LF) кодируем процентами, уже закодированное не трогаем
+        location = quote(long_url, safe=_LOCATION_SAFE)
+        self._write(writer, self.status, keep_alive=keep_alive, extra={"Location": location})
+        return keep_alive
+
+    @staticmethod
+    def _write(
+        writer: asyncio.StreamWriter, status: HTTPStatus, *, keep_alive: bool, extra: dict[str, str] | None = None
+    ) -> None:
+        out = [f"HTTP/1.1 {status.value} {status.phrase}", "Content-Length: 0"]
+        out.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        if status in (HTTPStatus.MOVED_PERMANENTLY, HTTPStatus.FOUND):
+            out.append("Cache-Control: private, max-age=90")
+        for k, v in (extra or {}).items():
+            out.append(f"{k}: {v}")
+        writer.write(("\r\n".join(out) + "\r\n\r\n").encode("iso-8859-1", "replace"))
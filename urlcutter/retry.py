@@ -0,0 +1,201 @@
+"""Retry policy for provider calls: typed errors, backoff with jitter, deadline budget.
+
+Providers raise `ProviderError` (a `RuntimeError`, so the old contract holds)
+carrying the HTTP status and the server's `Retry-After`, if any.
+`RetryPolicy` classifies an error, decides whether it is worth retrying and
+how long to wait: decorrelated jitter (`uniform(base, prev × 3)`, capped), never
+shorter than `Retry-After`, and never past the total deadline budget; a
+`Retry-After` longer than `max_delay` means giving up rather than parking the
+caller. Errors without a status (e.g. from pyshorteners) are classified by
+their message, the way the UI used to do it. `LocalRefusal`s (open circuit,
+local bucket, spent quota — the provider was never called) are "rejected".
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Callable, Iterable, Mapping
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import Any
+
+__all__ = [
+    "LocalRefusal",
+    "ProviderError",
+    "ProviderUnavailable",
+    "RateLimited",
+    "RetryPolicy",
+    "RetryState",
+    "error_for_status",
+    "parse_retry_after",
+]
+
+DEFAULT_MAX_ATTEMPTS = 2
+DEFAULT_BASE_DELAY = 0.2
+DEFAULT_MAX_DELAY = 4.0
+RETRYABLE = frozenset({"timeout", "rate", "unavailable", "unknown"})
+
+
+class ProviderError(RuntimeError):
+    """Provider answered with an error status."""
+
+    def __init__(self, message: str, *, status_code: int | None = None, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after  # секунды, как просил сервер
+
+
+class RateLimited(ProviderError):
+    """HTTP 429."""
+
+
+class LocalRefusal(ProviderError):
+    """Refused on our side before the provider was called; an immediate retry cannot help."""
+
+
+class ProviderUnavailable(ProviderError):
+    """HTTP 5xx."""
+
+
+def parse_retry_after(value: str | None, *, now: datetime | None = None) -> float | None:
+    """`Retry-After` as seconds (delta-seconds or HTTP-date); None if absent/garbage."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    return max(0.0, (when - (now or datetime.now(UTC))).total_seconds())
+
+
+def error_for_status(label: str, status: int, headers: Mapping[str, str] | None = None) -> ProviderError:
+    """Typed exception for a non-200 provider answer (message kept as `<label> HTTP <code>`)."""
+    retry_after = None
+    if headers:
+        retry_after = parse_retry_after(headers.get("Retry-After") or headers.get("retry-after"))
+    msg = f"{label} HTTP {status}"
+    if status == HTTPStatus.TOO_MANY_REQUESTS:
+        return RateLimited(msg, status_code=status, retry_after=retry_after)
+    if status >= HTTPStatus.INTERNAL_SERVER_ERROR:
+        return ProviderUnavailable(msg, status_code=status, retry_after=retry_after)
+    return ProviderError(msg, status_code=status, retry_after=retry_after)
+
+
+def _status_kind(status: int) -> str:
+    if status == HTTPStatus.TOO_MANY_REQUESTS:
+        return "rate"
+    if status >= HTTPStatus.INTERNAL_SERVER_ERROR:
+        return "unavailable"
+    return "rejected"  # прочие 4xx — повтор не поможет
+
+
+class RetryState:
+    """One logical request: attempt counter, previous delay and the deadline."""
+
+    __slots__ = ("attempt", "deadline", "policy", "prev_delay")
+
+    def __init__(self, policy: RetryPolicy) -> None:
+        self.policy = policy
+        self.attempt = 1
+        self.prev_delay = policy.base_delay
+        self.deadline = None if policy.deadline is None else policy.clock() + policy.deadline
+
+    def remaining(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self.policy.clock())
+
+    def cap(self, timeout: float | None) -> float | None:
+        """Shrink an attempt timeout so it does not outlive the budget."""
+        left = self.remaining()
+        if left is None:
+            return timeout
+        return left if timeout is None else min(timeout, left)
+
+    def next_delay(self, exc: BaseException) -> float | None:
+        """Delay before the next attempt, or None if we should give up now."""
+        p = self.policy
+        if self.attempt >= p.max_attempts or p.classify(exc) not in p.retry_on:
+            return None
+        delay = min(p.max_delay, p.rng.uniform(p.base_delay, self.prev_delay * 3))
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is not None:
+            if retry_after > p.max_delay:
+                return None  # ждать дольше max_delay не станем (и раньше срока ходить нельзя)
+            delay = max(delay, retry_after)  # сервер сказал ждать — ждём
+        left = self.remaining()
+        if left is not None and delay >= left:
+            return None
+        self.prev_delay = delay
+        self.attempt += 1
+        return delay
+
+
+class RetryPolicy:
+    """When and how long to wait before retrying a failed provider call."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        deadline: float | None = None,
+        retry_on: Iterable[str] = RETRYABLE,
+        rng: random.Random | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be >= 1")
+        if not 0 < base_delay <= max_delay:
+            raise ValueError("expected 0 < base_delay <= max_delay")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline  # общий бюджет на все попытки, секунды
+        self.retry_on = frozenset(retry_on)
+        self.rng = rng or random.Random()  # джиттер, не криптография
+        self.sleep = sleep
+        self.clock = clock
+
+    @staticmethod
+    def classify(exc: BaseException) -> str:  # noqa: PLR0911
+        """One of: timeout, rate, unavailable, rejected, invalid, unknown."""
+        if isinstance(exc, LocalRefusal):
+            return "rejected"  # провайдер не вызывался: предохранитель/лимит/квота
+        if isinstance(exc, TimeoutError):
+            return "timeout"
+        status = getattr(exc, "status_code", None)
+        if isinstance(status, int):
+            return _status_kind(status)
+        if isinstance(exc, ValueError):
+            return "invalid"
+        msg = str(exc)
+        if "429" in msg or "Too Many Requests" in msg:
+            return "rate"
+        if any(x in msg for x in ("502", "503", "504")):
+            return "unavailable"
+        return "unknown"
+
+    def start(self) -> RetryState:
+        return RetryState(self)
+
+    def call(self, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Run `fn` until it succeeds or the policy gives up; re-raise the last error."""
+        state = self.start()
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = state.next_delay(e)
+                if delay is None:
+                    raise
+                self.sleep(delay)
@@ -0,0 +1,424 @@
+"""Rate-limit buckets and circuit state shared by every process on the host.
+
+Each `ProtectionEngine` keeps its buckets and circuits in memory, so N app
+instances or bulk workers together send N times the allowed rate. The
+classes here keep that state in one small SQLite file instead
+(`<user_data_dir>/protection.db`, WAL mode, `synchronous=OFF` — it is
+throw-away coordination state, not history), and plug into the engine as
+its `Limiter` and `Breaker`:
+
+* `SharedRateLimiter` — one row per bucket. A grant is a single
+  conditional upsert that refills lazily from the row's timestamp and takes
+  `n` tokens only if they are there (`… ON CONFLICT DO UPDATE … WHERE
+  tokens >= n`, the same pattern as the quota ledger); SQLite applies it
+  atomically, so the cap holds across processes. A refusal needs only a
+  read, so a saturated bucket does not queue writers.
+* `SharedCircuitBreaker` — the `CircuitBreaker` state machine run on a row
+  loaded and written back in one `BEGIN IMMEDIATE` transaction. Closed
+  circuits (the common case) are answered by a plain read.
+
+Per-decision latency is bounded by `lock_timeout`: threads of one process
+queue on a local lock, processes on SQLite's busy timeout. When the file
+stays locked longer, the limiter refuses (fails closed — the remote caps are
+what it protects) and the breaker lets the call through and drops the
+outcome (fails open — it is advisory). Both count these in `store.busy`.
+
+Timestamps are wall-clock (`time.time`) because they are compared across
+processes. Enable with `URLCUTTER_SHARED_STATE=1` (default file) or
+`URLCUTTER_SHARED_STATE=/path/to/state.db`.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from pathlib import Path
+
+from urlcutter.db import paths
+from urlcutter.protection import (
+    ANY_PROVIDER,
+    CIRCUIT_COOLDOWN_SEC,
+    CIRCUIT_FAIL_THRESHOLD,
+    CIRCUIT_MAX_COOLDOWN_SEC,
+    CIRCUIT_PROBE_TIMEOUT_SEC,
+    DEFAULT_BUCKET,
+    RATE_LIMITS_ENV,
+    BreakerStats,
+    BucketSpec,
+    CircuitBreaker,
+    CircuitState,
+    ProtectionEngine,
+    _Circuit,
+    parse_rate_limits,
+)
+
+__all__ = [
+    "SharedCircuitBreaker",
+    "SharedRateLimiter",
+    "SharedStateStore",
+    "StoreBusy",
+    "shared_engine",
+]
+
+DEFAULT_LOCK_TIMEOUT = 0.05  # потолок ожидания блокировки на одно решение, секунды
+SETUP_TIMEOUT = 10.0  # создание схемы при одновременном старте многих процессов может подождать
+STATE_FILE = "protection.db"
+
+log = logging.getLogger("urlcutter.protection")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    provider TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS circuits (
+    provider TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    trips INTEGER NOT NULL,
+    consecutive_trips INTEGER NOT NULL,
+    cooldown REAL NOT NULL,
+    open_until REAL NOT NULL,
+    rejected INTEGER NOT NULL,
+    leases TEXT NOT NULL
+);
+"""
+
+# пополнение и списание одним оператором: строка меняется, только если токенов хватает
+_TAKE = """
+INSERT INTO rate_buckets (provider, tokens, updated) VALUES (:provider, :burst - :n, :now)
+ON CONFLICT (provider) DO UPDATE SET
+    tokens = min(:burst, tokens + max(0.0, :now - updated) * :rate) - :n,
+    updated = max(updated, :now)
+WHERE min(:burst, tokens + max(0.0, :now - updated) * :rate) >= :n
+"""
+
+_REFUND = "UPDATE rate_buckets SET tokens = min(:burst, tokens + :n) WHERE provider = :provider"
+
+_CIRCUIT_COLUMNS = "provider, state, failures, trips, consecutive_trips, cooldown, open_until, rejected, leases"
+
+
+class StoreBusy(RuntimeError):
+    """The shared state file stayed locked longer than `lock_timeout`."""
+
+
+class SharedStateStore:
+    """One WAL-mode SQLite file; a connection per thread, writes bounded by `lock_timeout`."""
+
+    def __init__(self, path: str | Path, *, lock_timeout: float = DEFAULT_LOCK_TIMEOUT) -> None:
+        self.path = Path(path)
+        self.lock_timeout = lock_timeout
+        self.busy = 0  # решений, принятых без общего состояния
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SETUP_TIMEOUT, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA busy_timeout={max(1, round(self.lock_timeout * 1000))}")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        # потоки процесса ждут на своём замке, а не в цикле сна busy-обработчика SQLite
+        if not self._write_lock.acquire(timeout=self.lock_timeout):
+            raise StoreBusy(f"{self.path}: local writer queue is longer than {self.lock_timeout}s")
+        try:
+            yield self.connect()
+        except sqlite3.OperationalError as e:
+            raise StoreBusy(f"{self.path}: {e}") from e
+        finally:
+            self._write_lock.release()
+
+    def execute(self, sql: str, params: Mapping | tuple = ()) -> sqlite3.Cursor:
+        """Run one autocommit write statement."""
+        with self._write() as conn:
+            return conn.execute(sql, params)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """`BEGIN IMMEDIATE` … `COMMIT`: the whole block holds the file's write lock."""
+        with self._write() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def read(self, sql: str, params: Mapping | tuple = ()) -> list[tuple]:
+        try:
+            return self.connect().execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise StoreBusy(f"{self.path}: {e}") from e
+
+    def note_busy(self, what: str, err: Exception) -> None:
+        self.busy += 1
+        log.debug("shared_state_busy op=%s err=%s", what, err)
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+class SharedRateLimiter:
+    """`RateLimiter` whose buckets live in a `SharedStateStore` (one row per provider)."""
+
+    def __init__(
+        self,
+        store: SharedStateStore,
+        specs: Mapping[str, BucketSpec] | None = None,
+        *,
+        default: BucketSpec | None = DEFAULT_BUCKET,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        self._specs = dict(specs or {})
+        if default is not None:
+            self._specs.setdefault(ANY_PROVIDER, default)
+        self._clock = clock
+
+    def configure(self, provider: str, spec: BucketSpec) -> None:
+        self._specs[provider] = spec
+
+    def allow(self, provider: str = ANY_PROVIDER, n: float = 1.0, *, now: float | None = None) -> bool:
+        spec = self._specs.get(provider)
+        if spec is None:
+            return True
+        if n > spec.burst:
+            return False
+        now = self._clock() if now is None else now
+        try:
+            # отказ решается чтением без замка записи: устаревшая строка токенов не занижает,
+            # так что её «не хватает» — верный ответ (при насыщении это почти все решения)
+            if self._available(spec, provider, now) < n:
+                return False
+            params = {"provider": provider, "burst": spec.burst, "rate": spec.rate, "n": n, "now": now}
+            return self.store.execute(_TAKE, params).rowcount == 1
+        except StoreBusy as e:
+            self.store.note_busy("allow", e)
+            return False  # лимит защищает удалённые капы — при сомнении не пускаем
+
+    def _available(self, spec: BucketSpec, provider: str, now: float) -> float:
+        rows = self.store.read("SELECT tokens, updated FROM rate_buckets WHERE provider = ?", (provider,))
+        if not rows:
+            return float(spec.burst)
+        tokens, updated = rows[0]
+        return min(spec.burst, tokens + max(0.0, now - updated) * spec.rate)
+
+    def peek(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> float:
+        spec = self._specs.get(provider)
+        if spec is None:
+            return math.inf
+        return self._available(spec, provider, self._clock() if now is None else now)
+
+    def retry_after(self, provider: str = ANY_PROVIDER, n: float = 1.0, *, now: float | None = None) -> float:
+        spec = self._specs.get(provider)
+        if spec is None:
+            return 0.0
+        missing = n - self.peek(provider, now=now)
+        if missing <= 0:
+            return 0.0
+        if spec.rate == 0 or n > spec.burst:
+            return math.inf
+        return missing / spec.rate
+
+    def refund(self, provider: str = ANY_PROVIDER, n: float = 1.0) -> None:
+        spec = self._specs.get(provider)
+        if spec is None:
+            return
+        try:
+            self.store.execute(_REFUND, {"provider": provider, "burst": spec.burst, "n": n})
+        except StoreBusy as e:
+            self.store.note_busy("refund", e)  # токен пропадёт — лимит от этого только строже
+
+    def reset(self) -> None:
+        self.store.execute("DELETE FROM rate_buckets")
+
+
+def _circuit_from_row(row: tuple) -> _Circuit:
+    _, state, failures, trips, consecutive, cooldown, open_until, rejected, leases = row
+    c = _Circuit()
+    c.probes = [float(t) for t in leases.split(",") if t]
+    c.stats = BreakerStats(
+        state=CircuitState(state),
+        failures=failures,
+        trips=trips,
+        consecutive_trips=consecutive,
+        cooldown=cooldown,
+        open_until=open_until,
+        probes=len(c.probes),
+        rejected=rejected,
+    )
+    return c
+
+
+def _circuit_row(provider: str, c: _Circuit) -> tuple:
+    st = c.stats
+    leases = ",".join(repr(t) for t in c.probes)
+    return (
+        provider,
+        str(st.state),
+        st.failures,
+        st.trips,
+        st.consecutive_trips,
+        st.cooldown,
+        st.open_until,
+        st.rejected,
+        leases,
+    )
+
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """`CircuitBreaker` whose per-provider circuits live in a `SharedStateStore`.
+
+    Every state change runs the parent's logic on the provider's row inside
+    one write transaction, so transitions, probe leases and cooldown growth
+    are the same as in-process — just seen by all processes. Listeners are
+    called by the process that made the transition.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        store: SharedStateStore,
+        threshold: int = CIRCUIT_FAIL_THRESHOLD,
+        cooldown: float = CIRCUIT_COOLDOWN_SEC,
+        *,
+        max_cooldown: float = CIRCUIT_MAX_COOLDOWN_SEC,
+        multiplier: float = 2.0,
+        probes: int = 1,
+        probe_timeout: float = CIRCUIT_PROBE_TIMEOUT_SEC,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        super().__init__(
+            threshold,
+            cooldown,
+            max_cooldown=max_cooldown,
+            multiplier=multiplier,
+            probes=probes,
+            probe_timeout=probe_timeout,
+            clock=clock,
+        )
+        self.store = store
+
+    def _row(self, provider: str) -> tuple | None:
+        rows = self.store.read(f"SELECT {_CIRCUIT_COLUMNS} FROM circuits WHERE provider = ?", (provider,))
+        return rows[0] if rows else None
+
+    def _shared(self, provider: str | None, op: Callable[[], object]) -> object:
+        """Load the row(s) (all when `provider` is None), run `op` on them, write them back — atomically."""
+        with self.store.transaction() as conn:
+            if provider is None:
+                rows = conn.execute(f"SELECT {_CIRCUIT_COLUMNS} FROM circuits").fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {_CIRCUIT_COLUMNS} FROM circuits WHERE provider = ?", (provider,)
+                ).fetchall()
+            # self._circuits — лишь рабочая копия на время транзакции; её держит замок записи хранилища
+            self._circuits = {row[0]: _circuit_from_row(row) for row in rows}
+            try:
+                result = op()
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO circuits ({_CIRCUIT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [_circuit_row(name, c) for name, c in self._circuits.items()],
+                )
+            finally:
+                self._circuits = {}
+        return result
+
+    def blocked(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool:
+        try:
+            row = self._row(provider)
+            if row is None or row[1] == CircuitState.CLOSED:
+                return False  # быстрый путь: чтение без блокировки записи
+            now = self._now(now)
+            if row[1] == CircuitState.OPEN and now < row[6]:
+                return True
+            return self._shared(provider, functools.partial(CircuitBreaker.blocked, self, provider, now=now))
+        except StoreBusy as e:
+            self.store.note_busy("blocked", e)
+            return False
+
+    def try_acquire(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> bool:
+        try:
+            row = self._row(provider)
+            if row is None or row[1] == CircuitState.CLOSED:
+                return True
+            return self._shared(provider, functools.partial(CircuitBreaker.try_acquire, self, provider, now=now))
+        except StoreBusy as e:
+            self.store.note_busy("try_acquire", e)
+            return True
+
+    def release(self, provider: str = ANY_PROVIDER) -> None:
+        try:
+            row = self._row(provider)
+            if row is None or row[1] != CircuitState.HALF_OPEN or not row[8]:
+                return  # слот не брали — без записи
+            self._shared(provider, functools.partial(CircuitBreaker.release, self, provider))
+        except StoreBusy as e:
+            self.store.note_busy("release", e)
+
+    def cooldown_left(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> float:
+        try:
+            row = self._row(provider)
+        except StoreBusy as e:
+            self.store.note_busy("cooldown_left", e)
+            return 0.0
+        if row is None or row[1] != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, row[6] - self._now(now))
+
+    def record_failure(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None:
+        try:
+            self._shared(provider, functools.partial(CircuitBreaker.record_failure, self, provider, now=now))
+        except StoreBusy as e:
+            self.store.note_busy("record_failure", e)
+
+    def record_success(self, provider: str = ANY_PROVIDER, *, now: float | None = None) -> None:
+        try:
+            row = self._row(provider)
+            if row is None or (row[1] == CircuitState.CLOSED and row[2] == 0):
+                return  # нечего сбрасывать — без записи
+            self._shared(provider, functools.partial(CircuitBreaker.record_success, self, provider, now=now))
+        except StoreBusy as e:
+            self.store.note_busy("record_success", e)
+
+    def snapshot(self, *, now: float | None = None) -> dict[str, BreakerStats]:
+        return self._shared(None, functools.partial(CircuitBreaker.snapshot, self, now=now))
+
+    def reset(self) -> None:
+        self.store.execute("DELETE FROM circuits")
+
+
+def shared_engine(
+    path: str | Path | None = None,
+    *,
+    specs: Mapping[str, BucketSpec] | None = None,
+    lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+) -> ProtectionEngine:
+    """Engine whose limiter and breaker state is shared through `path` (default: in the user data dir)."""
+    store = SharedStateStore(path or paths.user_data_dir() / STATE_FILE, lock_timeout=lock_timeout)
+    if specs is None:
+        specs = parse_rate_limits(os.getenv(RATE_LIMITS_ENV))
+    return ProtectionEngine(SharedRateLimiter(store, specs), SharedCircuitBreaker(store))
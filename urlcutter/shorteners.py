@@ -1,14 +1,28 @@
 """TinyURL shortener core with dual backend:
 - direct HTTP API (DI via _get for unit tests)
-- pyshorteners + ThreadPoolExecutor (keeps legacy tests happy)
+- pyshorteners on the shared `ProviderExecutor` (timed-out calls are abandoned,
+  not joined); an injected `_pool_factory` keeps the legacy per-call pool
+- batch API (`shorten_many`) on one executor and one HTTP session
+- provider registry (TinyURL, is.gd, da.gd, clck.ru, offline "local") and a
+  failover chain
+- TTL + LRU cache of successful results (`ResultCache`)
+
+All network traffic goes through the process-wide pooled client
+(`urlcutter.http_client`) unless a test injects its own transport.
 """
 
 from __future__ import annotations
 
-from collections.abc import Callable
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from functools import partial
 from http import HTTPStatus
+from itertools import islice
+from typing import TYPE_CHECKING, Protocol
 
 # stdlib
 from urllib.parse import quote, urlparse
@@ -17,17 +31,41 @@ import requests
 
 # 3rd party
 # local
-from urlcutter import normalize_url
-
-__all__ = ["shorten_via_tinyurl_core"]
+from urlcutter import _url_fingerprint, normalize_url
+from urlcutter.hedging import Hedger
+from urlcutter.http_client import get_client
+from urlcutter.latency import AdaptiveTimeouts
+from urlcutter.protection import Breaker, CircuitOpen, LocalRateLimited, RateLimiter
+from urlcutter.provider_executor import get_executor
+from urlcutter.retry import ProviderError, RateLimited, RetryPolicy, error_for_status
+from urlcutter.singleflight import get_single_flight
 
-DEFAULT_HTTP_TIMEOUT = 5
+if TYPE_CHECKING:
+    from urlcutter.quota import QuotaLedger
 
+__all__ = [
+    "DEFAULT_PROVIDER_CHAIN",
+    "BatchStats",
+    "CacheStats",
+    "FunctionProvider",
+    "HttpProvider",
+    "Provider",
+    "ResultCache",
+    "ShortenOutcome",
+    "ShortenResult",
+    "available_providers",
+    "get_result_cache",
+    "get_provider",
+    "register_provider",
+    "shorten_many",
+    "shorten_via_tinyurl_core",
+    "shorten_with_failover",
+    "unregister_provider",
+]
 
-try:
-    import pyshorteners
-except Exception:
-    pyshorteners = None
+DEFAULT_HTTP_TIMEOUT = 5
+DEFAULT_BATCH_CONCURRENCY = 8
+TINYURL_ENDPOINT = "https://tinyurl.com/api-create.php?url="
 
 
 def _looks_like_url(s: str) -> bool:
@@ -35,6 +73,38 @@ def _looks_like_url(s: str) -> bool:
     return p.scheme in ("http", "https") and bool(p.netloc)
 
 
+def _normalize_input(url: str) -> str:
+    if not isinstance(url, str) or not url.strip():
+        raise ValueError("url must be a non-empty string")
+    return normalize_url(url)
+
+
+def _http_shorten(
+    label: str,
+    endpoint: str,
+    norm: str,
+    timeout: float | None,
+    get: Callable[..., object] | None = None,
+) -> str:
+    """GET `<endpoint><quoted url>` and return the short URL from a plain-text body."""
+    get = get or get_client().get
+    api = f"{endpoint}{quote(norm, safe='')}"
+    try:
+        resp = get(api, timeout=(timeout or DEFAULT_HTTP_TIMEOUT))
+    except requests.Timeout as e:
+        raise TimeoutError(f"{label} request timed out: {e}") from e
+    except Exception as e:
+        raise RuntimeError(f"{label} request failed: {e}") from e
+
+    if getattr(resp, "status_code", HTTPStatus.OK) != HTTPStatus.OK:
+        raise error_for_status(label, resp.status_code, getattr(resp, "headers", None))
+
+    short = getattr(resp, "text", "").strip()
+    if not _looks_like_url(short):
+        raise ValueError(f"{label} returned invalid payload")
+    return short
+
+
 def shorten_via_tinyurl_core(
     url: str,
     timeout: float | None = None,
@@ -47,55 +117,38 @@ def shorten_via_tinyurl_core(
 
     Behavior:
       - If `_get` is provided, use direct HTTP API (TinyURL endpoint).
-      - Otherwise use `pyshorteners.Shortener().tinyurl.short(...)`.
-      - If `timeout` is provided in the pyshorteners path, call via a pool and
-        pass the timeout to `future.result(timeout=...)`.
+      - Otherwise use pyshorteners' TinyURL backend: the shared one from
+        `get_client()` (keep-alive session), or `_shortener_factory().tinyurl`.
+      - If `timeout` is provided in the pyshorteners path, run the call on the
+        shared `ProviderExecutor` and give up after `timeout` without waiting
+        for the hung call; with `_pool_factory` use that pool per call and pass
+        the timeout to `future.result(timeout=...)`.
 
     Raises:
       ValueError   — bad input, or provider returned non‑URL payload.
-      TimeoutError — when pyshorteners path exceeds the given timeout.
-      RuntimeError — network/provider errors in other cases.
+      TimeoutError — when the provider call exceeds the given timeout.
+      RuntimeError — network/provider errors in other cases; HTTP error
+                     answers come as `ProviderError` (status, Retry-After).
     """
     # --- Early validate user input (before any provider call) ---
-    if not isinstance(url, str) or not url.strip():
-        raise ValueError("url must be a non-empty string")
-
     # 1) Normalize (trim spaces, validate scheme, etc.)
-    norm = normalize_url(url)
+    norm = _normalize_input(url)
 
     # --- A) Direct HTTP path (used by new unit-tests) ---
     if _get is not None:
-        get = _get or requests.get
-        api = f"https://tinyurl.com/api-create.php?url={quote(norm, safe='')}"
-        try:
-            resp = get(api, timeout=(timeout or DEFAULT_HTTP_TIMEOUT))
-        except Exception as e:
-            raise RuntimeError(f"TinyURL request failed: {e}") from e
-
-        if getattr(resp, "status_code", HTTPStatus.OK) != HTTPStatus.OK:
-            raise RuntimeError(f"TinyURL HTTP {resp.status_code}")
-
-        short = getattr(resp, "text", "").strip()
-        if not _looks_like_url(short):
-            raise ValueError("TinyURL returned invalid payload")
-        return short
+        return _http_shorten("TinyURL", TINYURL_ENDPOINT, norm, timeout, _get)
 
     # --- B) pyshorteners + thread pool (legacy tests expect this) ---
     try:
-        shortener_factory = _shortener_factory
-        if shortener_factory is None:
-            if pyshorteners is None:
-                raise RuntimeError("pyshorteners is required for TinyURL but is not installed.")
-            shortener_factory = pyshorteners.Shortener
-
-        shortener = shortener_factory()
-        tiny = shortener.tinyurl
+        tiny = get_client().pyshortener("tinyurl") if _shortener_factory is None else _shortener_factory().tinyurl
 
         if timeout is None:
             return tiny.short(norm)
 
-        pool_factory = _pool_factory or ThreadPoolExecutor
-        with pool_factory(max_workers=1) as pool:
+        if _pool_factory is None:
+            return get_executor().call(tiny.short, norm, timeout=timeout)
+
+        with _pool_factory(max_workers=1) as pool:
             fut = pool.submit(partial(tiny.short, norm))
             return fut.result(timeout=timeout)
 
@@ -108,3 +161,543 @@ def shorten_via_tinyurl_core(
     except Exception as e:
         # Any other provider/pool error → RuntimeError
         raise RuntimeError(f"TinyURL provider error: {e}") from e
+
+
+# --- Result cache ---
+
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_CACHE_BYTES = 1 << 20
+DEFAULT_CACHE_TTL = 24 * 3600.0
+_ENTRY_OVERHEAD = 120  # ключ-кортеж, узел OrderedDict, float срока — грубо, но стабильно
+
+
+@dataclass(slots=True, frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int  # вытеснены по лимиту записей/байт
+    expirations: int  # выброшены по TTL
+    entries: int
+    bytes: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResultCache:
+    """Thread-safe TTL + LRU cache of short links keyed by `(provider, url fingerprint)`.
+
+    Only successful results are stored. Size is bounded both by entry count
+    and by an estimate of the bytes held; the least recently used entries go
+    first.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = DEFAULT_CACHE_ENTRIES,
+        max_bytes: int = DEFAULT_CACHE_BYTES,
+        ttl: float = DEFAULT_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries < 1 or max_bytes < 1 or ttl <= 0:
+            raise ValueError("cache limits must be positive")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: OrderedDict[tuple[str, str], tuple[str, float, int]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def _key(provider: str, url: str) -> tuple[str, str] | None:
+        try:
+            return provider, _url_fingerprint(url)
+        except ValueError:
+            return None
+
+    def get(self, provider: str, url: str) -> str | None:
+        key = self._key(provider, url)
+        with self._lock:
+            item = self._data.get(key) if key is not None else None
+            if item is None:
+                self._misses += 1
+                return None
+            short, expires, size = item
+            if expires <= self._clock():
+                del self._data[key]
+                self._bytes -= size
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return short
+
+    def lookup(self, url: str, providers: Sequence[str]) -> tuple[str, str] | None:
+        """First cached `(short_url, provider)` in `providers` order."""
+        for name in providers:
+            short = self.get(name, url)
+            if short is not None:
+                return short, name
+        return None
+
+    def put(self, provider: str, url: str, short_url: str) -> None:
+        key = self._key(provider, url)
+        if key is None:
+            return
+        size = _ENTRY_OVERHEAD + len(provider) + len(key[1]) + len(short_url)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (short_url, self._clock() + self.ttl, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, dropped) = self._data.popitem(last=False)
+                self._bytes -= dropped
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                entries=len(self._data),
+                bytes=self._bytes,
+            )
+
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide cache shared by the UI and batch callers."""
+    global _cache  # noqa: PLW0603
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+# --- Batch API ---
+
+
+@dataclass(slots=True)
+class ShortenResult:
+    """Outcome of one URL in a batch: either `short_url` or `error` is set."""
+
+    index: int
+    url: str
+    short_url: str | None = None
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass(slots=True)
+class BatchStats:
+    """Aggregate counters for a `shorten_many` run (updated while it yields)."""
+
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    busy_time: float = 0.0  # сумма времени всех вызовов провайдера
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return max(0.0, end - self.started_at)
+
+    @property
+    def throughput(self) -> float:
+        """Completed URLs per second of wall time."""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.busy_time / self.completed if self.completed else 0.0
+
+
+def _call(fn: Callable[..., str], /, *args, **kwargs) -> str:
+    return fn(*args, **kwargs)
+
+
+def _shorten_one(  # noqa: PLR0913
+    index: int,
+    url: str,
+    timeout: float | None,
+    get: Callable[..., object],
+    coalesce: bool,
+    retry: RetryPolicy | None,
+    cache: ResultCache | None,
+    quota: QuotaLedger | None = None,
+) -> ShortenResult:
+    started = time.monotonic()
+    call = retry.call if retry is not None else _call
+    cached = cache.get("tinyurl", url) if cache is not None else None
+    if cached is not None:
+        return ShortenResult(index=index, url=url, short_url=cached, elapsed=time.monotonic() - started)
+    try:
+        if quota is not None:
+            quota.acquire("tinyurl")  # до ретраев: ждать сброса квоты внутри батча бессмысленно
+        if coalesce:
+            # одинаковые URL в окне батча (и параллельно из UI) — один вызов провайдера
+            key = ("tinyurl", _url_fingerprint(url))
+            short = get_single_flight().do(key, call, shorten_via_tinyurl_core, url, timeout, _get=get)
+        else:
+            short = call(shorten_via_tinyurl_core, url, timeout, _get=get)
+        if cache is not None:
+            cache.put("tinyurl", url, short)
+        return ShortenResult(index=index, url=url, short_url=short, elapsed=time.monotonic() - started)
+    except (ValueError, TimeoutError, RuntimeError) as e:
+        return ShortenResult(index=index, url=url, error=e, elapsed=time.monotonic() - started)
+
+
+def shorten_many(  # noqa: PLR0913
+    urls: Iterable[str],
+    *,
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    timeout: float | None = None,
+    ordered: bool = True,
+    coalesce: bool = True,
+    stats: BatchStats | None = None,
+    retry: RetryPolicy | None = None,
+    cache: ResultCache | None = None,
+    quota: QuotaLedger | None = None,
+    _get: Callable[..., object] | None = None,
+) -> Iterator[ShortenResult]:
+    """Shorten many URLs with at most `max_concurrency` provider calls in flight.
+
+    Behavior:
+      - `urls` is consumed lazily: no more than 2 × `max_concurrency` items are
+        pulled ahead, so a generator of millions of lines is fine.
+      - `ordered=True` yields results in input order, otherwise as they complete.
+      - Per-URL ValueError/TimeoutError/RuntimeError come back as
+        `ShortenResult.error`; the batch itself never aborts on them.
+      - One executor serves the whole batch; HTTP goes through the shared
+        keep-alive client, whose pool is grown to `max_concurrency` if needed
+        (unless `_get` is injected).
+      - `coalesce=True` shares one provider call between identical URLs that
+        are in flight at the same time (see `urlcutter.singleflight`).
+      - With `retry`, each URL is retried per that policy (backoff with
+        jitter, Retry-After, deadline) before its error is reported.
+      - With `cache`, cached URLs are answered without a provider call and
+        new results are stored.
+      - With `quota`, every provider call is admitted by the ledger first; a
+        spent budget comes back as a `QuotaExhausted` error for that URL.
+      - Pass `stats=BatchStats()` to read throughput while/after iterating.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be >= 1")
+
+    stats = stats if stats is not None else BatchStats()
+    stats.started_at = time.monotonic()
+    stats.finished_at = None
+
+    get = _get
+    if get is None:
+        client = get_client()
+        client.ensure_capacity(max_concurrency)
+        get = client.get
+
+    window = max_concurrency * 2
+    source = enumerate(urls)
+    pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="urlcutter-batch")
+    pending: deque[Future[ShortenResult]] = deque()
+
+    def _fill() -> None:
+        for index, url in islice(source, window - len(pending)):
+            pending.append(pool.submit(_shorten_one, index, url, timeout, get, coalesce, retry, cache, quota))
+            stats.submitted += 1
+
+    def _account(res: ShortenResult) -> ShortenResult:
+        if res.ok:
+            stats.succeeded += 1
+        else:
+            stats.failed += 1
+        stats.busy_time += res.elapsed
+        return res
+
+    try:
+        _fill()
+        while pending:
+            if ordered:
+                res = pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                fut = next(iter(done))
+                pending.remove(fut)
+                res = fut.result()
+            yield _account(res)
+            _fill()
+    finally:
+        stats.finished_at = time.monotonic()
+        # генератор могли закрыть на середине — не ждём хвост
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Provider registry and failover ---
+
+
+class Provider(Protocol):
+    """Anything that can turn a long URL into a short one."""
+
+    name: str
+
+    def shorten(self, url: str, timeout: float | None = None) -> str: ...
+
+
+@dataclass(slots=True, frozen=True)
+class HttpProvider:
+    """Plain-text GET API: `<endpoint><quoted url>` answers with the short URL."""
+
+    name: str
+    endpoint: str
+    label: str = ""
+
+    def shorten(self, url: str, timeout: float | None = None, *, _get: Callable[..., object] | None = None) -> str:
+        return _http_shorten(self.label or self.name, self.endpoint, _normalize_input(url), timeout, _get)
+
+
+@dataclass(slots=True, frozen=True)
+class FunctionProvider:
+    """Adapter for an existing `fn(url, timeout) -> short_url` callable."""
+
+    name: str
+    fn: Callable[[str, float | None], str]
+
+    def shorten(self, url: str, timeout: float | None = None) -> str:
+        return self.fn(url, timeout)
+
+
+@dataclass(slots=True, frozen=True)
+class ShortenOutcome:
+    short_url: str
+    provider: str  # кто реально выдал ссылку — пишем в history.service
+    failures: tuple[tuple[str, str], ...] = ()  # (provider, error) до успеха
+
+
+_registry_lock = threading.Lock()
+_PROVIDERS: dict[str, Provider] = {}
+
+
+def register_provider(provider: Provider, *, replace: bool = False) -> Provider:
+    with _registry_lock:
+        if provider.name in _PROVIDERS and not replace:
+            raise ValueError(f"provider already registered: {provider.name}")
+        _PROVIDERS[provider.name] = provider
+    return provider
+
+
+def unregister_provider(name: str) -> None:
+    with _registry_lock:
+        _PROVIDERS.pop(name, None)
+
+
+def get_provider(name: str) -> Provider:
+    try:
+        return _PROVIDERS[name]
+    except KeyError:
+        raise KeyError(f"unknown provider: {name}") from None
+
+
+def available_providers() -> list[str]:
+    return list(_PROVIDERS)
+
+
+register_provider(FunctionProvider("tinyurl", shorten_via_tinyurl_core))
+register_provider(HttpProvider("isgd", "https://is.gd/create.php?format=simple&url=", "is.gd"))
+register_provider(HttpProvider("dagd", "https://da.gd/s?url=", "da.gd"))
+register_provider(HttpProvider("clckru", "https://clck.ru/--?url=", "clck.ru"))
+
+
+def _shorten_local(url: str, timeout: float | None = None) -> str:
+    # модуль тянет движок БД — грузим только когда «local» действительно нужен
+    from urlcutter.local_shortener import get_local_shortener  # noqa: PLC0415
+
+    return get_local_shortener().shorten(url, timeout)
+
+
+register_provider(FunctionProvider("local", _shorten_local))
+
+DEFAULT_PROVIDER_CHAIN: tuple[str, ...] = ("tinyurl", "isgd", "dagd", "clckru")
+
+
+def shorten_with_failover(  # noqa: PLR0912, PLR0913, PLR0915
+    url: str,
+    timeout: float | None = None,
+    *,
+    chain: Sequence[str] = DEFAULT_PROVIDER_CHAIN,
+    overrides: Mapping[str, Callable[[str, float | None], str]] | None = None,
+    hedger: Hedger | None = None,
+    timeouts: AdaptiveTimeouts | None = None,
+    quota: QuotaLedger | None = None,
+    limiter: RateLimiter | None = None,
+    breaker: Breaker | None = None,
+    attempted: list[str] | None = None,
+) -> ShortenOutcome:
+    """Try providers in `chain` order and return the first short link.
+
+    Input is validated once up front (ValueError, no provider is called).
+    Any provider error moves on to the next one; if all of them fail, the
+    last provider's exception is re-raised unchanged, with a note listing the
+    earlier failures. `overrides` replaces a provider's callable by name.
+    With a `hedger`, the first two providers are raced (see
+    `urlcutter.hedging`) before falling over to the rest of the chain.
+    With `timeouts`, each provider's attempt gets its adaptive timeout
+    (never above `timeout`) and its latency is recorded.
+    With `quota`, a provider whose hourly/daily budget is spent is skipped
+    (recorded as a `QuotaExhausted` failure) without being called; with
+    `limiter`, so is a provider whose local token bucket is empty.
+    With `breaker`, each provider has its own circuit: an open one is skipped
+    (`CircuitOpen`), a half-open one lets through only its probe calls, and
+    every real call's outcome is reported back to it. A provider refused by
+    a later gate gets back what the earlier ones took (probe slot, token).
+    With `attempted`, the name of every provider actually called is appended
+    to it; providers refused by those local gates are not.
+    """
+    _normalize_input(url)
+    if not chain:
+        raise ValueError("provider chain is empty")
+
+    def _fn(name: str) -> Callable[[str, float | None], str]:
+        return (overrides or {}).get(name) or get_provider(name).shorten
+
+    failures: list[tuple[str, str]] = []
+    last_exc: Exception | None = None
+    admitted: set[str] = set()
+
+    def _admit(name: str) -> ProviderError | None:
+        if name in admitted:
+            return None
+        # ворота по очереди; отказ следующих возвращает то, что взяли предыдущие
+        probe = token = False
+        try:
+            if breaker is not None:
+                if not breaker.try_acquire(name):
+                    raise CircuitOpen(f"{name}: circuit open", retry_after=breaker.cooldown_left(name))
+                probe = True
+            if limiter is not None:
+                if not limiter.allow(name):
+                    raise LocalRateLimited(f"{name}: local rate limit", retry_after=limiter.retry_after(name))
+                token = True
+            if quota is not None:
+                quota.acquire(name)
+        except (RateLimited, CircuitOpen) as e:
+            if token:
+                limiter.refund(name)
+            if probe:
+                breaker.release(name)
+            failures.append((name, f"{type(e).__name__}: {e}"))
+            return e
+        admitted.add(name)
+        return None
+
+    def _outcome(name: str, ok: bool) -> None:
+        if breaker is not None:
+            (breaker.record_success if ok else breaker.record_failure)(name)
+
+    def _report(name: str, ok: bool | None) -> None:
+        if ok is not None:
+            _outcome(name, ok)
+        elif breaker is not None:
+            breaker.release(name)  # проигравший отменён — исход неизвестен, пробный слот возвращаем
+
+    rest = list(chain)
+    if hedger is not None and len(chain) >= 2:  # noqa: PLR2004
+        first, second, *tail = chain
+        refused = _admit(first)
+        if refused is not None:
+            last_exc, rest = refused, [second, *tail]  # гонки не будет: второй пойдёт по цепочке
+        else:
+            rest = tail
+            ran: list[str] = []
+
+            def _report_race(name: str, ok: bool | None) -> None:
+                ran.append(name)
+                if attempted is not None:
+                    attempted.append(name)
+                _report(name, ok)
+
+            try:
+                # второй допускается (и списывает слот/токен/квоту), только когда хедж действительно стартует
+                short, served = hedger.race(
+                    url,
+                    timeout,
+                    (first, _fn(first)),
+                    (second, _fn(second)),
+                    admit=lambda name: _admit(name) is None,
+                    report=_report_race,
+                )
+                return ShortenOutcome(short_url=short, provider=served, failures=tuple(failures))
+            except Exception as e:
+                failures.append(("+".join(ran) or first, f"{type(e).__name__}: {e}"))
+                last_exc = e
+
+    for name in rest:
+        refused = _admit(name)
+        if refused is not None:
+            last_exc = refused
+            continue
+        fn = _fn(name)
+        attempt_timeout = timeout
+        if timeouts is not None:
+            adaptive = timeouts.timeout_for(name)
+            attempt_timeout = adaptive if timeout is None else min(timeout, adaptive)
+        started = time.monotonic()
+        if attempted is not None:
+            attempted.append(name)
+        try:
+            short = fn(url, attempt_timeout)
+        except TimeoutError as e:
+            if timeouts is not None and attempt_timeout is not None:
+                # таймаут — «цензурированный» замер: реальная задержка не меньше
+                timeouts.observe(name, attempt_timeout)
+            _outcome(name, False)
+            failures.append((name, f"{type(e).__name__}: {e}"))
+            last_exc = e
+            continue
+        except Exception as e:
+            _outcome(name, False)
+            failures.append((name, f"{type(e).__name__}: {e}"))
+            last_exc = e
+            continue
+        if timeouts is not None:
+            timeouts.observe(name, time.monotonic() - started)
+        _outcome(name, True)
+        return ShortenOutcome(short_url=short, provider=name, failures=tuple(failures))
+
+    if len(failures) > 1:
+        last_exc.add_note("failover: " + "; ".join(f"{n} -> {err}" for n, err in failures))
+    raise last_exc
@@ -0,0 +1,99 @@
+"""Single-flight coalescing of concurrent identical calls.
+
+While a call for a key is in flight, other callers with the same key do not
+start their own: they wait for the leader and get its result (or exception).
+Shortening keys by `_url_fingerprint`, so double-clicks, parallel sessions and
+duplicate rows in a batch cost one provider call and one rate-limit tick.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+__all__ = ["SingleFlight", "SingleFlightStats", "get_single_flight"]
+
+
+@dataclass(slots=True, frozen=True)
+class SingleFlightStats:
+    calls: int
+    executed: int  # реально дошли до провайдера
+    coalesced: int  # получили чужой результат
+    in_flight: int
+
+    @property
+    def coalesced_ratio(self) -> float:
+        return self.coalesced / self.calls if self.calls else 0.0
+
+
+class _Call:
+    __slots__ = ("done", "exc", "result")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.exc: BaseException | None = None
+
+
+class SingleFlight:
+    """Thread-safe per-key deduplication of in-flight calls."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], /, *args, wait_timeout: float | None = None, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` once per in-flight `key` and share the outcome.
+
+        A follower waits at most `wait_timeout` seconds for the leader and gets
+        TimeoutError after that (the leader's call keeps going).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executed += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            if not call.done.wait(wait_timeout):
+                raise TimeoutError("timed out waiting for an identical in-flight call")
+            if call.exc is not None:
+                raise call.exc
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.exc = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> SingleFlightStats:
+        with self._lock:
+            return SingleFlightStats(
+                calls=self._executed + self._coalesced,
+                executed=self._executed,
+                coalesced=self._coalesced,
+                in_flight=len(self._calls),
+            )
+
+
+# --- Process-wide instance ---
+
+_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Shared instance used by the UI handler and the batch API."""
+    return _flight
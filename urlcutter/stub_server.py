@@ -0,0 +1,259 @@
+"""Local stand-in for TinyURL's `api-create.php` with fault injection.
+
+For benchmarks and resilience tests only: the server answers like the real
+API (plain-text short URL, HTTP/1.1 keep-alive), and a `FaultProfile` adds
+latency drawn from a distribution, random 429/5xx answers, hangs, malformed
+payloads and per-client quotas. `StubTinyUrlServer.transport()` gives a `_get`
+that routes the real `shorten_via_tinyurl_core` to it.
+
+    with StubTinyUrlServer(FaultProfile(latency="lognormal:0.08:0.6", p5xx=0.05)) as stub:
+        shorten_via_tinyurl_core("https://example.com", 2.0, _get=stub.transport())
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from urlcutter.http_client import get_client
+from urlcutter.shorteners import TINYURL_ENDPOINT
+
+__all__ = ["FaultProfile", "StubStats", "StubTinyUrlServer", "parse_latency"]
+
+_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a latency spec, seconds.
+
+    `fixed:S`, `uniform:LO:HI`, `lognormal:MEDIAN:SIGMA`, `pareto:SCALE:ALPHA`
+    (heavy tail: most calls near SCALE, a few much slower).
+    """
+    kind, _, rest = spec.partition(":")
+    try:
+        args = [float(x) for x in rest.split(":")] if rest else []
+    except ValueError:
+        raise ValueError(f"bad latency spec: {spec!r}") from None
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:  # noqa: PLR2004
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "lognormal" and len(args) == 2:  # noqa: PLR2004
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1])
+    if kind == "pareto" and len(args) == 2:  # noqa: PLR2004
+        return lambda rng: args[0] * rng.paretovariate(args[1])
+    raise ValueError(f"bad latency spec: {spec!r}")
+
+
+@dataclass(slots=True)
+class FaultProfile:
+    """What the stand-in does to each request (probabilities are per request)."""
+
+    latency: str = "fixed:0"
+    p429: float = 0.0
+    p5xx: float = 0.0
+    p_hang: float = 0.0  # не отвечает hang_seconds, потом рвёт соединение
+    p_malformed: float = 0.0  # 200, но в теле не URL (как «Error» у TinyURL)
+    quota: int = 0  # запросов на клиента за quota_window; 0 — без квоты
+    quota_window: float = 60.0
+    retry_after: int | None = 1  # заголовок Retry-After на 429/503
+    hang_seconds: float = 30.0
+
+
+@dataclass(slots=True)
+class StubStats:
+    requests: int = 0
+    ok: int = 0
+    rate_limited: int = 0
+    quota_rejected: int = 0
+    server_errors: int = 0
+    hangs: int = 0
+    malformed: int = 0
+    bad_requests: int = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API
+    server: _Server
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass  # без шума в stderr
+
+    def do_GET(self):  # noqa: N802
+        self.server.stub._handle(self)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: StubTinyUrlServer
+
+
+class StubTinyUrlServer:
+    """Threaded local HTTP server mimicking `GET /api-create.php?url=...`."""
+
+    def __init__(
+        self, profile: FaultProfile | None = None, *, host: str = "127.0.0.1", port: int = 0, seed: int | None = None
+    ) -> None:
+        self.profile = profile or FaultProfile()
+        self._sample_latency = parse_latency(self.profile.latency)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._quotas: dict[str, deque[float]] = {}
+        self._seq = 0
+        self._stats = StubStats()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.stub = self
+        self._thread: threading.Thread | None = None
+
+    # ---------- lifecycle ----------
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def endpoint(self) -> str:
+        """Drop-in for `TINYURL_ENDPOINT`."""
+        return f"{self.base_url}/api-create.php?url="
+
+    def start(self) -> StubTinyUrlServer:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-tinyurl", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()  # отпускаем «зависшие» обработчики
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> StubTinyUrlServer:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def transport(self, get: Callable[..., object] | None = None) -> Callable[..., object]:
+        """`_get` for the shortener core that sends TinyURL calls here instead."""
+
+        def _get(url: str, **kwargs):
+            if url.startswith(TINYURL_ENDPOINT):
+                url = self.endpoint + url[len(TINYURL_ENDPOINT) :]
+            return (get or get_client().get)(url, **kwargs)
+
+        return _get
+
+    def stats(self) -> StubStats:
+        with self._lock:
+            return StubStats(**{f: getattr(self._stats, f) for f in StubStats.__slots__})
+
+    # ---------- request handling ----------
+
+    def _roll(self) -> tuple[float, float]:
+        with self._lock:
+            return self._rng.random(), self._sample_latency(self._rng)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
+
+    def _quota_left(self, client: str) -> float | None:
+        """None if the client is within quota, else seconds until a slot frees up."""
+        p = self.profile
+        if p.quota <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            hits = self._quotas.setdefault(client, deque())
+            while hits and now - hits[0] >= p.quota_window:
+                hits.popleft()
+            if len(hits) >= p.quota:
+                return p.quota_window - (now - hits[0])
+            hits.append(now)
+            return None
+
+    def _next_code(self) -> str:
+        with self._lock:
+            self._seq += 1
+            n = self._seq
+        out = []
+        while n:
+            n, r = divmod(n, len(_ALPHABET))
+            out.append(_ALPHABET[r])
+        return "".join(reversed(out))
+
+    def _handle(self, req: _Handler) -> None:
+        self._count("requests")
+        p = self.profile
+        parts = urlsplit(req.path)
+        long_url = parse_qs(parts.query).get("url", [""])[0]
+        if parts.path != "/api-create.php" or not long_url:
+            self._count("bad_requests")
+            self._reply(req, HTTPStatus.BAD_REQUEST, "Error")
+            return
+
+        client = req.headers.get("X-Client-Id") or req.client_address[0]
+        wait = self._quota_left(client)
+        if wait is not None:
+            self._count("quota_rejected")
+            self._reply(req, HTTPStatus.TOO_MANY_REQUESTS, "Error", retry_after=max(1, int(wait + 0.999)))
+            return
+
+        roll, delay = self._roll()
+        if delay > 0 and self._stop.wait(delay):
+            return
+
+        fault = self._pick_fault(roll)
+        self._count(fault)
+        if fault == "hangs":
+            self._stop.wait(p.hang_seconds)
+            req.close_connection = True
+        elif fault == "rate_limited":
+            self._reply(req, HTTPStatus.TOO_MANY_REQUESTS, "Error", retry_after=p.retry_after)
+        elif fault == "server_errors":
+            status = (HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT)
+            self._reply(req, status[int(roll * 1000) % 3], "Error", retry_after=p.retry_after)
+        elif fault == "malformed":
+            self._reply(req, HTTPStatus.OK, "Error")
+        else:
+            self._reply(req, HTTPStatus.OK, f"{self.base_url}/{self._next_code()}")
+
+    def _pick_fault(self, roll: float) -> str:
+        """Map one uniform roll onto [hang | 429 | 5xx | malformed | ok] (named as the counters)."""
+        p = self.profile
+        edge = 0.0
+        for name, share in (
+            ("hangs", p.p_hang),
+            ("rate_limited", p.p429),
+            ("server_errors", p.p5xx),
+            ("malformed", p.p_malformed),
+        ):
+            edge += share
+            if roll < edge:
+                return name
+        return "ok"
+
+    @staticmethod
+    def _reply(req: _Handler, status: int, body: str, *, retry_after: int | None = None) -> None:
+        data = body.encode("utf-8")
+        try:
+            req.send_response(status)
+            req.send_header("Content-Type", "text/plain; charset=utf-8")
+            req.send_header("Content-Length", str(len(data)))
+            if retry_after is not None and status in (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE):
+                req.send_header("Retry-After", str(retry_after))
+            req.end_headers()
+            req.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            req.close_connection = True  # клиент уже ушёл по таймауту